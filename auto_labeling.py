@@ -0,0 +1,398 @@
+import os
+import json
+import queue
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import cv2
+import numpy as np
+from thumbnail_cache import THUMBNAIL_SIZE, fit_thumbnail
+from yolo_dataset import PROJECT_ROOT
+
+PREDICTION_DB = os.path.join(PROJECT_ROOT, "cache", "predictions.db")
+
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_DECODE_THREADS = 4
+MIN_CONTOUR_AREA = 100
+# The model itself runs at least this permissive; the sliders filter its output afterwards.
+# These are the YOLOv5/YOLOv8 defaults, so stored predictions serve any slider value above them.
+MODEL_CONF = 0.25
+MODEL_IOU = 0.7
+
+#####################
+# Prefetched Decoding
+#####################
+
+def iter_decoded(paths, num_threads=DEFAULT_DECODE_THREADS, prefetch=None):
+    """Yield (path, image) for every path, in order, decoding ahead on a thread pool.
+
+    cv2.imread releases the GIL, so several images decode in parallel while
+    the consumer works on the current one. Unreadable files yield None.
+    """
+    num_threads = max(1, int(num_threads))
+    prefetch = max(num_threads, int(prefetch or num_threads * 4))
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        pending = deque()
+        paths = iter(paths)
+        for path in paths:
+            pending.append((path, pool.submit(cv2.imread, path)))
+            if len(pending) >= prefetch:
+                break
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(cv2.imread, next_path)))
+            yield path, future.result()
+
+def iter_batches(decoded, batch_size):
+    """Group (path, image) pairs into lists of at most batch_size readable images."""
+    batch = []
+    for path, img in decoded:
+        if img is None:
+            print(f"Could not read {path}; skipping.")
+            continue
+        batch.append((path, img))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+#####################
+# Batched YOLO Inference
+#####################
+
+class BatchedYoloLabeler:
+    """Runs a YOLOv5 (torch.hub AutoShape) or YOLOv8 model over many images in batches.
+
+    Every image is decoded once, by the prefetch pool, and the decoded arrays
+    are handed to the model as a list. Both model wrappers letterbox the
+    whole batch to img_size and scale the boxes back to each original image,
+    so detections come out in original pixel coordinates.
+
+    Both wrappers also drop boxes below their own confidence and merge them
+    with their own NMS before we see them. The model is therefore run with
+    conf no higher than `conf_threshold` and IoU no lower than
+    `iou_threshold`, so a lower slider value really does bring back more boxes.
+    """
+
+    def __init__(self, model, model_type="YOLOv5", img_size=640, batch_size=DEFAULT_BATCH_SIZE,
+                 decode_threads=DEFAULT_DECODE_THREADS, conf_threshold=MODEL_CONF, iou_threshold=MODEL_IOU):
+        self.model = model
+        self.model_type = model_type
+        self.img_size = int(img_size)
+        self.batch_size = max(1, int(batch_size))
+        self.decode_threads = max(1, int(decode_threads))
+        self.conf = min(MODEL_CONF, float(conf_threshold))
+        self.iou = max(MODEL_IOU, float(iou_threshold))
+
+    def predict_batch(self, images):
+        """Return one (N, 6) array of x1, y1, x2, y2, confidence, class per BGR image."""
+        if self.model_type == "YOLOv8":
+            results = self.model.predict(images, imgsz=self.img_size, batch=len(images), conf=self.conf,
+                                         iou=self.iou, verbose=False)
+            return [r.boxes.data.cpu().numpy() if r.boxes is not None else np.zeros((0, 6), np.float32)
+                    for r in results]
+        # AutoShape expects RGB for numpy input.
+        rgb = [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in images]
+        self.model.conf = self.conf
+        self.model.iou = self.iou
+        results = self.model(rgb, size=self.img_size)
+        return [pred.cpu().numpy() for pred in results.xyxy]
+
+    def model_key(self, weights_path, hasher):
+        """Identify this model's predictions: weights content, model type, input size and the
+        confidence/IoU the model itself filters with."""
+        weights = hasher.content_hash(weights_path) if os.path.isfile(weights_path) else weights_path
+        return json.dumps([weights, self.model_type, self.img_size, self.conf, self.iou])
+
+    def run(self, paths, cancelled=None, store=None, model_key=None):
+        """Yield (path, image, (height, width), detections) for every readable image.
+
+        `cancelled` is an optional callable; the run stops after the current
+        batch once it returns True. With a PredictionStore, images whose
+        content was already run through the same model are answered from the
+        store first, with image None; only new or changed images are decoded
+        and inferred, in input order, and their predictions are stored.
+        """
+        hashes = {}
+        if store is not None:
+            paths = list(paths)
+            for path in paths:
+                try:
+                    hashes[path] = store.content_hash(path)
+                except OSError:
+                    continue
+            stored = store.get_many(list(hashes.values()), model_key)
+            misses = []
+            for path in paths:
+                hit = stored.get(hashes.get(path))
+                if hit is None:
+                    misses.append(path)
+                    continue
+                shape, detections = hit
+                yield path, None, shape, detections
+            print(f"Auto-label: {len(paths) - len(misses)} images answered from stored predictions, "
+                  f"{len(misses)} to run")
+            paths = misses
+        decoded = iter_decoded(paths, self.decode_threads, prefetch=self.batch_size * 2)
+        try:
+            for batch in iter_batches(decoded, self.batch_size):
+                if cancelled is not None and cancelled():
+                    break
+                images = [img for _, img in batch]
+                for (path, img), detections in zip(batch, self.predict_batch(images)):
+                    if store is not None and path in hashes:
+                        store.put(hashes[path], model_key, img.shape[:2], detections)
+                    yield path, img, img.shape[:2], detections
+        finally:
+            if store is not None:
+                store.commit()
+
+#####################
+# Incremental Prediction Store
+#####################
+
+class PredictionStore:
+    """Raw model detections keyed by image content hash and model key, in one SQLite file.
+
+    Detections are stored before confidence/NMS/area filtering, so changing
+    the sliders never needs a rerun; only a new or edited image, or
+    different weights, does. Content hashes are memoized by path, mtime and
+    size so unchanged files are not re-read. Safe to use from one thread.
+    """
+
+    def __init__(self, path=PREDICTION_DB):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, sha1 TEXT);
+            CREATE TABLE IF NOT EXISTS predictions (
+                sha1 TEXT, model_key TEXT, height INTEGER, width INTEGER, detections BLOB,
+                created REAL, PRIMARY KEY (sha1, model_key));
+        """)
+        self._db.commit()
+
+    def content_hash(self, path):
+        """SHA-1 of the file, recomputed only when its mtime or size changed."""
+        st = os.stat(path)
+        abs_path = os.path.abspath(path)
+        row = self._db.execute("SELECT sha1 FROM file_hashes WHERE path=? AND mtime_ns=? AND size=?",
+                               (abs_path, st.st_mtime_ns, st.st_size)).fetchone()
+        if row:
+            return row[0]
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        sha1 = digest.hexdigest()
+        self._db.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                         (abs_path, st.st_mtime_ns, st.st_size, sha1))
+        return sha1
+
+    def get_many(self, hashes, model_key):
+        """{sha1: ((height, width), detections)} for every hash with stored predictions."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            query = (f"SELECT sha1, height, width, detections FROM predictions "
+                     f"WHERE model_key=? AND sha1 IN ({','.join('?' * len(chunk))})")
+            for sha1, height, width, blob in self._db.execute(query, [model_key] + chunk):
+                found[sha1] = ((height, width), np.frombuffer(blob, dtype=np.float32).reshape(-1, 6))
+        return found
+
+    def put(self, sha1, model_key, shape, detections):
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+        self._db.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)",
+                         (sha1, model_key, int(shape[0]), int(shape[1]), detections.tobytes(), time.time()))
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+#####################
+# Detection Filtering
+#####################
+
+def filter_detections(detections, conf_threshold=0.25, iou_threshold=0.45, min_area=0):
+    """Keep boxes above conf_threshold and at least min_area pixels, then run NMS per class.
+
+    `detections` is an (N, 6) array of x1, y1, x2, y2, confidence, class.
+    Returns the surviving rows, highest confidence first.
+    """
+    detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+    widths = detections[:, 2] - detections[:, 0]
+    heights = detections[:, 3] - detections[:, 1]
+    detections = detections[(detections[:, 4] >= conf_threshold) & (widths * heights >= min_area)]
+    keep = []
+    for cls in np.unique(detections[:, 5]):
+        rows = np.flatnonzero(detections[:, 5] == cls)
+        boxes = [[float(x1), float(y1), float(x2 - x1), float(y2 - y1)] for x1, y1, x2, y2 in detections[rows, :4]]
+        picked = cv2.dnn.NMSBoxes(boxes, detections[rows, 4].tolist(), conf_threshold, iou_threshold)
+        keep.extend(rows[np.asarray(picked, dtype=int).flatten()])
+    kept = detections[keep]
+    return kept[np.argsort(-kept[:, 4])] if len(kept) else kept
+
+def class_name(names, class_id):
+    """Look up a model class name; names may be a list or a dict keyed by id."""
+    class_id = int(class_id)
+    if isinstance(names, dict):
+        return str(names.get(class_id, class_id))
+    if names is not None and 0 <= class_id < len(names):
+        return str(names[class_id])
+    return str(class_id)
+
+#####################
+# Parallel Canny Auto-Labeling
+#####################
+
+def canny_label_chunk(job):
+    """Process-pool worker: Canny-label a chunk of images.
+
+    Returns (number of paths, results) where each result is
+    (path, RGB thumbnail with the hull drawn, normalized edge bbox).
+    Images without a large enough contour come back as (path, None, None)
+    so the cache can remember them; unreadable images are left out.
+    """
+    paths, th1, th2, thumb_size = job
+    cv2.setNumThreads(1)  # The pool already uses every core.
+    results = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        edges = cv2.Canny(gray, th1, th2)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        largest = max(contours, key=cv2.contourArea) if contours else None
+        if largest is None or cv2.contourArea(largest) < MIN_CONTOUR_AREA:
+            results.append((path, None, None))
+            continue
+        # Draw on the thumbnail rather than the full image; only the thumbnail is shown.
+        h_img, w_img = img.shape[:2]
+        thumb = fit_thumbnail(img, thumb_size)
+        ratio = thumb.shape[1] / w_img
+        hull = (cv2.convexHull(largest).astype(np.float32) * ratio).astype(np.int32)
+        cv2.drawContours(thumb, [hull], -1, (0, 255, 255), 2)
+        x, y, w, h = cv2.boundingRect(cv2.findNonZero(edges))
+        bbox = ((x + w / 2) / w_img, (y + h / 2) / h_img, w / w_img, h / h_img)
+        results.append((path, cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB), bbox))
+    return len(paths), results
+
+class ParallelCannyLabeler:
+    """Runs canny_label_chunk over a process pool from a background thread.
+
+    Results are queued as chunks complete so the UI can drain them with
+    drain() on its own schedule. cancel() stops handing out work; chunks
+    already running finish and are discarded. With a ThumbnailCache, images
+    already labeled at the same thresholds are served from the cache and
+    only the rest go to the pool.
+    """
+
+    def __init__(self, paths, th1, th2, workers=None, chunk_size=None, thumb_size=THUMBNAIL_SIZE, cache=None):
+        self.paths = list(paths)
+        self.th1 = th1
+        self.th2 = th2
+        self.thumb_size = thumb_size
+        self.cache = cache
+        self.variant = f"canny:{th1}:{th2}:{thumb_size}"
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.chunk_size = chunk_size or max(1, min(64, len(self.paths) // (self.workers * 8) or 1))
+        self.total = len(self.paths)
+        self.processed = 0
+        self.done = False
+        self.error = None
+        self.start_time = None
+        self._results = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.start_time = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _cached(self):
+        """Queue every cached result and return the paths that still need labeling."""
+        misses = []
+        for path in self.paths:
+            if self._cancel.is_set():
+                break
+            found, thumb, meta = self.cache.get(path, self.variant)
+            if not found:
+                misses.append(path)
+                continue
+            if thumb is not None:
+                self._results.put((path, thumb, tuple(meta["bbox"])))
+            self.processed += 1
+        return misses
+
+    def _run(self):
+        executor = None
+        try:
+            paths = self._cached() if self.cache is not None else self.paths
+            chunks = [paths[i:i + self.chunk_size] for i in range(0, len(paths), self.chunk_size)]
+            if chunks and not self._cancel.is_set():
+                executor = ProcessPoolExecutor(max_workers=self.workers)
+                futures = [executor.submit(canny_label_chunk, (chunk, self.th1, self.th2, self.thumb_size))
+                           for chunk in chunks]
+            else:
+                futures = []
+            for future in as_completed(futures):
+                if self._cancel.is_set():
+                    break
+                count, results = future.result()
+                for path, thumb, bbox in results:
+                    if self.cache is not None:
+                        self.cache.put(path, thumb, self.variant, {"bbox": bbox} if bbox else None)
+                    if thumb is not None:
+                        self._results.put((path, thumb, bbox))
+                self.processed += count
+        except Exception as e:
+            self.error = e
+            print(f"Canny auto-label error: {e}")
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            if self.cache is not None:
+                self.cache.commit()
+            self.done = True
+
+    def drain(self, max_items=None):
+        """Return the results that have arrived since the last call (at most max_items)."""
+        items = []
+        while max_items is None or len(items) < max_items:
+            try:
+                items.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def pending(self):
+        return self._results.qsize()
+
+    def rate(self):
+        elapsed = time.time() - self.start_time if self.start_time else 0
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """Estimated seconds left, or None before the first chunk finishes."""
+        rate = self.rate()
+        return (self.total - self.processed) / rate if rate > 0 else None
@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import cv2
+import numpy as np
+from image_writer import imwrite_params
+from image_acquisition import (
+    augmentation_ranges, crop_roi_native, sample_augmentation_params, apply_photometric,
+    apply_fused_geometry, random_variation, apply_zoom_centered,
+    apply_translation, apply_shear, apply_flip, apply_random_rotation, parse_resolution
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+#####################
+# Benchmark Settings
+#####################
+
+DEFAULT_RESOLUTIONS = ["640x480", "1280x720", "1920x1080"]
+DISPLAY_SIZE = (640, 480)  # The display resolution the ROI is drawn at in TrainingApp.
+
+# The TrainingApp slider defaults, so results reflect a typical session.
+DEFAULT_AUG = {
+    "min_rotation": -15, "max_rotation": 15,
+    "min_beta": -20, "max_beta": 20,
+    "min_alpha": 1.0, "max_alpha": 1.0,
+    "min_zoom": 1.0, "max_zoom": 1.0,
+    "min_hue": -0.05, "max_hue": 0.05,
+    "min_saturation": 0.9, "max_saturation": 1.1,
+    "min_translate": 0.0, "max_translate": 0.1,
+    "min_shear": 0.0, "max_shear": 5.0,
+    "flip_lr": 0.5,
+}
+
+#####################
+# Frame Sources
+#####################
+
+def synthetic_frames(size, count, seed=0):
+    """Yield `count` textured BGR frames of `size`; a handful are generated and cycled."""
+    w, h = size
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+    pool = []
+    for _ in range(4):
+        noise = rng.normal(0, 40, (h, w, 3)).astype(np.float32)
+        pool.append(np.clip(gradient + noise, 0, 255).astype(np.uint8))
+    for i in range(count):
+        yield pool[i % len(pool)]
+
+def video_frames(path, size, count):
+    """Yield `count` frames from a recorded video, looping it and scaling to `size`."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {path}")
+    produced = 0
+    try:
+        while produced < count:
+            ret, frame = cap.read()
+            if not ret:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = cap.read()
+                if not ret:
+                    break
+            if (frame.shape[1], frame.shape[0]) != size:
+                frame = cv2.resize(frame, size)
+            produced += 1
+            yield frame
+    finally:
+        cap.release()
+
+#####################
+# Pipelines
+#####################
+
+def run_fused(frame, roi, ranges, rng):
+    """The current capture chain: ROI crop, LUT photometric, single-warp geometry."""
+    stages = []
+    t = time.perf_counter()
+    cropped = crop_roi_native(frame, roi, DISPLAY_SIZE)
+    stages.append(("crop", time.perf_counter() - t))
+    h, w = cropped.shape[:2]
+    params = sample_augmentation_params((w, h), ranges, rng)
+    t = time.perf_counter()
+    out = apply_photometric(cropped, params)
+    stages.append(("photometric", time.perf_counter() - t))
+    t = time.perf_counter()
+    out = apply_fused_geometry(out, params)
+    stages.append(("geometry", time.perf_counter() - t))
+    return out, stages
+
+def _legacy_hsv_adjustment(frame, hue_delta, sat_scale):
+    # apply_hsv_adjustment before it moved to lookup tables, kept so "legacy" stays the old chain.
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(np.float32)
+    hsv[:,:,0] = hsv[:,:,0] + hue_delta * 180  # OpenCV hue: 0-180.
+    hsv[:,:,1] = hsv[:,:,1] * sat_scale
+    hsv = np.clip(hsv, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+def run_legacy(frame, roi, ranges, rng):
+    """The original chain of apply_* helpers, one resample per stage."""
+    random.seed(rng.getrandbits(32))
+    stages = []
+    t = time.perf_counter()
+    cropped = crop_roi_native(frame, roi, DISPLAY_SIZE)
+    stages.append(("crop", time.perf_counter() - t))
+    t = time.perf_counter()
+    out, _, _ = random_variation(cropped, ranges["alpha"], ranges["beta"])
+    out = _legacy_hsv_adjustment(out, random.uniform(*ranges["hue"]), random.uniform(*ranges["sat"]))
+    stages.append(("photometric", time.perf_counter() - t))
+    t = time.perf_counter()
+    out = apply_zoom_centered(out, random.uniform(*ranges["zoom"]))
+    out = apply_translation(out, ranges["translate"])
+    out = apply_shear(out, random.uniform(*ranges["shear"]))
+    out = apply_flip(out, ranges["flip"])
+    out, _ = apply_random_rotation(out, ranges["rotation"])
+    stages.append(("geometry", time.perf_counter() - t))
+    return out, stages
+
+PIPELINES = {"fused": run_fused, "legacy": run_legacy}
+
+#####################
+# Measurement
+#####################
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it cannot be read."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+def percentiles(samples_sec):
+    ms = np.asarray(samples_sec) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+def process_one(pipeline, frame, roi, ranges, rng, image_ext, write_params, out_dir, index):
+    out, stages = pipeline(frame, roi, ranges, rng)
+    t = time.perf_counter()
+    ok, encoded = cv2.imencode(image_ext, out, write_params)
+    stages.append(("encode", time.perf_counter() - t))
+    if out_dir is not None and ok:
+        t = time.perf_counter()
+        with open(os.path.join(out_dir, f"bench_{index}{image_ext}"), "wb") as f:
+            f.write(encoded.tobytes())
+        stages.append(("write", time.perf_counter() - t))
+    return stages
+
+def benchmark(pipeline_name, size, frames, roi, ranges, image_ext=".jpg", out_dir=None,
+              warmup=5, alloc_samples=20, seed=0):
+    """Run one pipeline over `frames` and return a result dict."""
+    pipeline = PIPELINES[pipeline_name]
+    write_params = imwrite_params(image_ext)
+    rng = random.Random(seed)
+    frames = list(frames)
+    for i, frame in enumerate(frames[:warmup]):
+        process_one(pipeline, frame, roi, ranges, rng, image_ext, write_params, out_dir, i)
+
+    stage_times = {}
+    totals = []
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        t = time.perf_counter()
+        for name, seconds in process_one(pipeline, frame, roi, ranges, rng, image_ext, write_params, out_dir, i):
+            stage_times.setdefault(name, []).append(seconds)
+        totals.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    # Allocations are traced in a separate pass so tracemalloc does not skew the timings.
+    alloc_bytes = []
+    tracemalloc.start()
+    for i, frame in enumerate(frames[:alloc_samples]):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        process_one(pipeline, frame, roi, ranges, rng, image_ext, write_params, None, i)
+        alloc_bytes.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    return {
+        "pipeline": pipeline_name,
+        "resolution": f"{size[0]}x{size[1]}",
+        "images": len(frames),
+        "images_per_sec": len(frames) / elapsed if elapsed > 0 else 0.0,
+        "total": percentiles(totals),
+        "stages": {name: percentiles(times) for name, times in stage_times.items()},
+        "peak_alloc_kb_per_image": float(np.mean(alloc_bytes)) / 1024 if alloc_bytes else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def print_result(result):
+    total = result["total"]
+    print(f"\n{result['pipeline']} @ {result['resolution']}: {result['images_per_sec']:.1f} images/sec "
+          f"(p50 {total['p50_ms']:.2f} ms, p95 {total['p95_ms']:.2f} ms, p99 {total['p99_ms']:.2f} ms)")
+    for name, stats in result["stages"].items():
+        print(f"  {name:<12} p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms")
+    rss = result["peak_rss_mb"]
+    print(f"  peak alloc/image {result['peak_alloc_kb_per_image']:.0f} KB, "
+          f"peak RSS {'n/a' if rss is None else f'{rss:.0f} MB'}")
+
+# Run settings that change the work per image; results are only comparable when they match.
+BASELINE_SETTINGS = ("source", "format", "roi")
+
+def compare_to_baseline(results, baseline_path, tolerance, settings):
+    """Return the results whose throughput fell more than `tolerance` below the baseline run.
+
+    Raises ValueError if the baseline was run with different `settings`
+    (source, format or ROI), since its numbers would not be comparable.
+    """
+    with open(baseline_path, "r") as f:
+        data = json.load(f)
+    for key in BASELINE_SETTINGS:
+        if data.get(key) != settings[key]:
+            raise ValueError(f"Baseline {baseline_path} was run with {key}={data.get(key)!r}, "
+                             f"this run uses {key}={settings[key]!r}")
+    baseline = {(r["pipeline"], r["resolution"]): r for r in data.get("results", [])}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["pipeline"], result["resolution"]))
+        if previous and result["images_per_sec"] < previous["images_per_sec"] * (1.0 - tolerance):
+            regressions.append((result, previous))
+            print(f"REGRESSION {result['pipeline']} @ {result['resolution']}: "
+                  f"{result['images_per_sec']:.1f} images/sec vs {previous['images_per_sec']:.1f} baseline")
+    return regressions
+
+#####################
+# Main
+#####################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless throughput benchmark for the capture pipeline")
+    parser.add_argument("--video", help="recorded video to use instead of synthetic frames")
+    parser.add_argument("--resolutions", default=",".join(DEFAULT_RESOLUTIONS),
+                        help="comma-separated capture resolutions, e.g. 640x480,1920x1080")
+    parser.add_argument("--frames", type=int, default=200, help="frames per resolution")
+    parser.add_argument("--pipeline", choices=["fused", "legacy", "both"], default="fused")
+    parser.add_argument("--format", default="jpg", help="output image format (jpg or png)")
+    parser.add_argument("--roi", default="160,120,480,360",
+                        help="ROI in 640x480 display coordinates, or 'none' for the full frame")
+    parser.add_argument("--write", action="store_true", help="also write the encoded images to a temp folder")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="earlier --json output; exit non-zero if throughput regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed fractional throughput drop against --baseline")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    roi = None if args.roi.lower() == "none" else tuple(int(v) for v in args.roi.split(","))
+    ranges = augmentation_ranges(DEFAULT_AUG)
+    image_ext = "." + args.format.lower().lstrip(".")
+    pipelines = ["fused", "legacy"] if args.pipeline == "both" else [args.pipeline]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out_dir = tmp_dir if args.write else None
+        for res_str in args.resolutions.split(","):
+            size = parse_resolution(res_str.strip())
+            if args.video:
+                frames = list(video_frames(args.video, size, args.frames))
+            else:
+                frames = list(synthetic_frames(size, args.frames, args.seed))
+            for name in pipelines:
+                result = benchmark(name, size, frames, roi, ranges, image_ext, out_dir, seed=args.seed)
+                print_result(result)
+                results.append(result)
+
+    settings = {"source": args.video or "synthetic", "format": image_ext, "roi": list(roi) if roi else None}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(dict(settings, results=results), f, indent=4)
+        print(f"\nResults written to {args.json}")
+    if args.baseline:
+        try:
+            if compare_to_baseline(results, args.baseline, args.tolerance, settings):
+                return 1
+        except ValueError as e:
+            print(f"Not comparing to the baseline: {e}")
+            return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+import os
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from PIL import Image
+from yolo_dataset import DEFAULT_DATA_YAML, class_registry, format_yolo_rows
+
+INDEX_NAME = "dataset_index.db"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+SPLIT_NAMES = ("train", "val", "test")
+
+#####################
+# File Helpers
+#####################
+
+def file_sha1(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def image_size(path):
+    """(width, height) read from the image header, without decoding the pixels."""
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return None, None
+
+def read_yolo_rows(label_path):
+    """Parse a YOLO label file into (class_idx, x_center, y_center, w, h) rows."""
+    rows = []
+    with open(label_path, "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 5:
+                rows.append((int(parts[0]),) + tuple(float(v) for v in parts[1:]))
+    return rows
+
+def like_prefix(prefix):
+    """SQL LIKE pattern (with ESCAPE '\\') matching strings that start with `prefix`."""
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def split_of(path):
+    """"train"/"val"/"test" when the image sits under a folder of that name, else None."""
+    parts = os.path.normpath(path).split(os.sep)
+    return next((part for part in reversed(parts[:-1]) if part in SPLIT_NAMES), None)
+
+#####################
+# SQLite Dataset Index
+#####################
+
+class DatasetIndex:
+    """A SQLite record of every dataset image: file identity, size, labels and origin.
+
+    One row per image holds its path (relative to the folder of data.yaml),
+    size, mtime, SHA-1, dimensions, label file rows, source session and
+    split; a second table holds one row per (image, class) so class counts
+    and "unlabeled" are indexed queries. The tools record images as they
+    write them; sync_folder() reconciles a folder against the index and only
+    re-hashes files whose size or mtime changed. All methods are thread-safe.
+    """
+
+    def __init__(self, db_path, root):
+        self.db_path = db_path
+        self.root = os.path.abspath(root)
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha1 TEXT,
+                width INTEGER, height INTEGER, label_path TEXT, label_mtime_ns INTEGER,
+                labels TEXT, num_boxes INTEGER, labeled INTEGER, session TEXT, split TEXT,
+                indexed_at REAL);
+            CREATE TABLE IF NOT EXISTS image_classes (
+                path TEXT, class_id INTEGER, boxes INTEGER, PRIMARY KEY (path, class_id));
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha1 TEXT);
+            CREATE INDEX IF NOT EXISTS images_sha1 ON images (sha1);
+            CREATE INDEX IF NOT EXISTS images_labeled ON images (labeled);
+            CREATE INDEX IF NOT EXISTS images_session ON images (session);
+            CREATE INDEX IF NOT EXISTS images_split ON images (split);
+            CREATE INDEX IF NOT EXISTS images_size ON images (size);
+            CREATE INDEX IF NOT EXISTS image_classes_class ON image_classes (class_id);
+        """)
+        self._db.commit()
+
+    @classmethod
+    def for_yaml(cls, yaml_path=DEFAULT_DATA_YAML):
+        """The index that lives next to `yaml_path`."""
+        root = os.path.dirname(os.path.abspath(yaml_path))
+        return cls(os.path.join(root, INDEX_NAME), root)
+
+    def rel(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+
+    def folder_prefix(self, folder):
+        """Relative path prefix shared by every indexed file under `folder`."""
+        rel = self.rel(folder)
+        return rel.rstrip("/") + "/" if rel != "." else ""
+
+    def abs(self, rel_path):
+        return os.path.join(self.root, rel_path.replace("/", os.sep))
+
+    @contextmanager
+    def batch(self):
+        """Group many updates into one transaction."""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._db.commit()
+
+    def _commit(self):
+        if self._batch_depth == 0:
+            self._db.commit()
+
+    #####################
+    # Updates
+    #####################
+
+    def record_image(self, path, label_path=None, rows=None, session=None, split=None):
+        """Add or refresh one image; `rows` saves re-reading a label file that was just written.
+
+        The SHA-1 is only recomputed when the file's size or mtime changed.
+        """
+        st = os.stat(path)
+        rel = self.rel(path)
+        with self._lock:
+            old = self._db.execute("SELECT size, mtime_ns, sha1, width, height, session, split FROM images WHERE path=?",
+                                   (rel,)).fetchone()
+            if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                sha1, width, height = old[2], old[3], old[4]
+            else:
+                sha1 = file_sha1(path)
+                width, height = image_size(path)
+            if old:
+                session = session if session is not None else old[5]
+                split = split if split is not None else old[6]
+            self._db.execute("INSERT OR REPLACE INTO images (path, size, mtime_ns, sha1, width, height, session, split, "
+                             "indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (rel, st.st_size, st.st_mtime_ns, sha1, width, height, session,
+                              split if split is not None else split_of(rel), time.time()))
+            if rows is None and label_path is not None and os.path.exists(label_path):
+                rows = read_yolo_rows(label_path)
+            self._set_labels(rel, label_path if rows is not None else None, rows)
+            self._commit()
+
+    def record_labels(self, path, label_path, rows):
+        """Update the label rows of an indexed image after its label file was (re)written."""
+        with self._lock:
+            self._set_labels(self.rel(path), label_path, rows)
+            self._commit()
+
+    def _set_labels(self, rel, label_path, rows):
+        self._db.execute("DELETE FROM image_classes WHERE path=?", (rel,))
+        if rows is None:
+            self._db.execute("UPDATE images SET label_path=NULL, label_mtime_ns=NULL, labels=NULL, num_boxes=0, "
+                             "labeled=0 WHERE path=?", (rel,))
+            return
+        label_mtime = os.stat(label_path).st_mtime_ns if label_path and os.path.exists(label_path) else None
+        text = format_yolo_rows(rows)
+        self._db.execute("UPDATE images SET label_path=?, label_mtime_ns=?, labels=?, num_boxes=?, labeled=1 "
+                         "WHERE path=?", (self.rel(label_path) if label_path else None, label_mtime, text,
+                                          len(rows), rel))
+        counts = {}
+        for row in rows:
+            counts[int(row[0])] = counts.get(int(row[0]), 0) + 1
+        self._db.executemany("INSERT INTO image_classes VALUES (?, ?, ?)",
+                             [(rel, class_id, boxes) for class_id, boxes in counts.items()])
+
+    def remove(self, path):
+        rel = self.rel(path)
+        with self._lock:
+            self._db.execute("DELETE FROM images WHERE path=?", (rel,))
+            self._db.execute("DELETE FROM image_classes WHERE path=?", (rel,))
+            self._commit()
+
+    def sync_folder(self, folder, labels_dir=None, session=None, split=None):
+        """Bring the index in line with `folder`: add new or changed images, drop missing ones.
+
+        Label files are looked up as <labels_dir or folder>/<stem>.txt.
+        Unchanged images (same size, mtime and label mtime) cost one stat.
+        Returns (added_or_updated, removed).
+        """
+        labels_dir = labels_dir or folder
+        prefix = self.folder_prefix(folder)
+        with self.batch():
+            known = {row[0]: row[1:] for row in self._db.execute(
+                "SELECT path, size, mtime_ns, label_mtime_ns FROM images WHERE path LIKE ? ESCAPE '\\'",
+                (like_prefix(prefix),))}
+            seen = set()
+            updated = 0
+            for name in os.listdir(folder) if os.path.isdir(folder) else []:
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(folder, name)
+                rel = self.rel(path)
+                seen.add(rel)
+                label_path = os.path.join(labels_dir, os.path.splitext(name)[0] + ".txt")
+                st = os.stat(path)
+                label_mtime = os.stat(label_path).st_mtime_ns if os.path.exists(label_path) else None
+                if known.get(rel) == (st.st_size, st.st_mtime_ns, label_mtime):
+                    continue
+                self.record_image(path, label_path, session=session, split=split)
+                updated += 1
+            # Only direct children of the folder are reconciled.
+            missing = [rel for rel in known if rel not in seen and "/" not in rel[len(prefix):]]
+            for rel in missing:
+                self.remove(self.abs(rel))
+        return updated, len(missing)
+
+    #####################
+    # Queries
+    #####################
+
+    def lookup(self, path):
+        """The index row for `path` as a dict, or None."""
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM images WHERE path=?", (self.rel(path),))
+            row = cursor.fetchone()
+            return dict(zip([c[0] for c in cursor.description], row)) if row else None
+
+    def has_image(self, path):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM images WHERE path=?", (self.rel(path),)).fetchone() is not None
+
+    def is_labeled(self, path):
+        with self._lock:
+            row = self._db.execute("SELECT labeled FROM images WHERE path=?", (self.rel(path),)).fetchone()
+        return bool(row and row[0])
+
+    def find_by_hash(self, sha1):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT path FROM images WHERE sha1=?", (sha1,))]
+
+    def content_hash(self, path):
+        """SHA-1 of any file, indexed or not, recomputed only when its size or mtime changed."""
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            row = self._db.execute("SELECT sha1 FROM file_hashes WHERE path=? AND size=? AND mtime_ns=?",
+                                   (key, st.st_size, st.st_mtime_ns)).fetchone()
+        if row:
+            return row[0]
+        sha1 = file_sha1(path)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                             (key, st.st_size, st.st_mtime_ns, sha1))
+            self._commit()
+        return sha1
+
+    def dataset_copy(self, path, folder):
+        """The image in `folder` that was saved from `path`, or None.
+
+        That is an image with the same bytes under any name, or one with the
+        same file name saved from the same session folder (a cropped copy).
+        File names alone are not enough: every scan session reuses them.
+        Index rows whose file has gone from disk are dropped on the way.
+        """
+        size = os.path.getsize(path)
+        prefix = self.folder_prefix(folder)
+        with self._lock:
+            same_size = self._db.execute("SELECT 1 FROM images WHERE size=? AND path LIKE ? ESCAPE '\\' LIMIT 1",
+                                         (size, like_prefix(prefix))).fetchone()
+        # Identical bytes imply the same size, so most files are never hashed.
+        candidates = []
+        if same_size:
+            candidates = [rel for rel in self.find_by_hash(self.content_hash(path)) if rel.startswith(prefix)]
+        entry = self.lookup(os.path.join(folder, os.path.basename(path)))
+        if entry is not None and entry["session"] == self.rel(os.path.dirname(path)):
+            candidates.append(entry["path"])
+        for rel in candidates:
+            if os.path.exists(self.abs(rel)):
+                return self.abs(rel)
+            self.remove(self.abs(rel))
+        return None
+
+    def unlabeled(self, session=None):
+        with self._lock:
+            if session is None:
+                rows = self._db.execute("SELECT path FROM images WHERE labeled=0 ORDER BY path")
+            else:
+                rows = self._db.execute("SELECT path FROM images WHERE labeled=0 AND session=? ORDER BY path",
+                                        (session,))
+            return [row[0] for row in rows]
+
+    def class_counts(self):
+        """{class_id: (images, boxes)} over the whole index."""
+        with self._lock:
+            return {class_id: (images, boxes) for class_id, images, boxes in self._db.execute(
+                "SELECT class_id, COUNT(*), SUM(boxes) FROM image_classes GROUP BY class_id ORDER BY class_id")}
+
+    def summary(self):
+        with self._lock:
+            total, labeled = self._db.execute("SELECT COUNT(*), COALESCE(SUM(labeled), 0) FROM images").fetchone()
+            splits = dict(self._db.execute("SELECT COALESCE(split, ''), COUNT(*) FROM images GROUP BY split"))
+        return {"images": total, "labeled": labeled, "unlabeled": total - labeled, "splits": splits}
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+def open_dataset_index(yaml_path=DEFAULT_DATA_YAML):
+    """Open the index next to `yaml_path`, building it from yolo_training_data the first time."""
+    root = os.path.dirname(os.path.abspath(yaml_path))
+    existed = os.path.exists(os.path.join(root, INDEX_NAME))
+    index = DatasetIndex.for_yaml(yaml_path)
+    if not existed:
+        dataset = os.path.join(root, "yolo_training_data")
+        updated, _ = index.sync_folder(os.path.join(dataset, "images"), os.path.join(dataset, "labels"))
+        print(f"Built dataset index with {updated} images")
+    return index
+
+def describe_dataset(yaml_path=DEFAULT_DATA_YAML):
+    """One-line summary of the indexed dataset with per-class box counts."""
+    index = DatasetIndex.for_yaml(yaml_path)
+    try:
+        summary = index.summary()
+        names = class_registry(yaml_path).names
+        counts = ", ".join(f"{names[c] if c < len(names) else c}: {boxes}"
+                           for c, (_, boxes) in index.class_counts().items())
+    finally:
+        index.close()
+    return (f"{summary['images']} images ({summary['labeled']} labeled, {summary['unlabeled']} unlabeled)"
+            + (f"; boxes per class: {counts}" if counts else ""))
+
+#####################
+# Command Line
+#####################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dataset index for yolo_training_data")
+    parser.add_argument("--yaml", default=DEFAULT_DATA_YAML, help="data.yaml the index sits next to")
+    parser.add_argument("--sync", action="store_true", help="reconcile the index with yolo_training_data on disk")
+    parser.add_argument("--unlabeled", action="store_true", help="list images without a label file")
+    args = parser.parse_args()
+    if args.sync:
+        index = DatasetIndex.for_yaml(args.yaml)
+        dataset = os.path.join(index.root, "yolo_training_data")
+        start = time.time()
+        updated, removed = index.sync_folder(os.path.join(dataset, "images"), os.path.join(dataset, "labels"))
+        print(f"Indexed {updated} new or changed images, removed {removed} in {time.time() - start:.1f} sec")
+        index.close()
+    if args.unlabeled:
+        index = DatasetIndex.for_yaml(args.yaml)
+        for path in index.unlabeled():
+            print(path)
+        index.close()
+    print(describe_dataset(args.yaml))
@@ -0,0 +1,192 @@
+import threading
+import time
+import cv2
+
+#####################
+# Capture Device Helpers
+#####################
+
+def negotiate_resolution(cap, width, height):
+    """Request a capture resolution and return what the device actually delivers.
+
+    Letting the camera produce the working resolution avoids resampling
+    every frame in software. Backends that ignore the request simply keep
+    their native mode.
+    """
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    actual_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or width
+    actual_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or height
+    return actual_w, actual_h
+
+#####################
+# Threaded Frame Grabber
+#####################
+
+class FrameGrabber:
+    """Reads frames from a capture device on a dedicated thread.
+
+    Every frame is stored with its capture timestamp in a small ring buffer
+    whose slots are allocated once and reused, so consumers (display, ROI
+    drawing, augmentation capture) take the newest frame without ever
+    blocking on the device.
+    """
+
+    def __init__(self, cap, buffer_size=4):
+        self.cap = cap
+        self.buffer_size = max(2, int(buffer_size))
+        self._slots = [None] * self.buffer_size
+        self._timestamps = [0.0] * self.buffer_size
+        self._sequence = 0  # Number of frames published so far.
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._grab_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def release(self):
+        """Stop the grabber thread and release the underlying device."""
+        self.stop()
+        if self.cap is not None:
+            self.cap.release()
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def sequence(self):
+        """Sequence number of the newest published frame (0 if none yet)."""
+        with self._cond:
+            return self._sequence
+
+    def _grab_loop(self):
+        while self._running:
+            slot = self._sequence % self.buffer_size
+            # The slot being filled is the oldest one; readers only ever copy
+            # the newest slot, so it can be written outside the lock.
+            ret, frame = self.cap.read(self._slots[slot])
+            timestamp = time.time()
+            if not ret or frame is None:
+                time.sleep(0.01)
+                continue
+            with self._cond:
+                self._slots[slot] = frame
+                self._timestamps[slot] = timestamp
+                self._sequence += 1
+                self._cond.notify_all()
+
+    def read_latest(self):
+        """Return (frame, timestamp, sequence) for the newest frame.
+
+        The frame is a private copy, so the caller may keep or modify it.
+        Returns (None, 0.0, 0) if no frame has been captured yet.
+        """
+        with self._cond:
+            return self._copy_newest()
+
+    def read(self):
+        """Drop-in replacement for cv2.VideoCapture.read() that never blocks."""
+        frame, _, _ = self.read_latest()
+        return frame is not None, frame
+
+    def wait_for_frame(self, after_sequence=0, timeout=1.0):
+        """Block until a frame newer than `after_sequence` is available.
+
+        Returns (frame, timestamp, sequence); frame is None on timeout or
+        when the grabber has been stopped.
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._running and self._sequence <= after_sequence:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._sequence <= after_sequence:
+                return None, 0.0, self._sequence
+            return self._copy_newest()
+
+    def _copy_newest(self):
+        if self._sequence == 0:
+            return None, 0.0, 0
+        slot = (self._sequence - 1) % self.buffer_size
+        return self._slots[slot].copy(), self._timestamps[slot], self._sequence
+
+    def wait_until(self, timestamp, timeout=0.05):
+        """Block until a frame captured at or after `timestamp` is published, or until timeout."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._running and (self._sequence == 0 or
+                                     self._timestamps[(self._sequence - 1) % self.buffer_size] < timestamp):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+    def read_nearest(self, timestamp):
+        """Return (frame, timestamp, sequence) for the buffered frame captured closest to `timestamp`."""
+        with self._cond:
+            if self._sequence == 0:
+                return None, 0.0, 0
+            # The oldest slot may be mid-overwrite by the grab thread, so it is skipped.
+            first = max(1, self._sequence - self.buffer_size + 2)
+            best = min(range(first, self._sequence + 1),
+                       key=lambda n: abs(self._timestamps[(n - 1) % self.buffer_size] - timestamp))
+            slot = (best - 1) % self.buffer_size
+            return self._slots[slot].copy(), self._timestamps[slot], best
+
+#####################
+# Multi-Camera Synchronization
+#####################
+
+class SynchronizedGrabbers:
+    """Builds timestamp-aligned frame sets from several FrameGrabbers.
+
+    The first grabber is the reference: each set starts from its next
+    frame, and every other camera contributes the buffered frame captured
+    closest in time. Sets whose spread exceeds `max_skew` seconds are
+    dropped and counted in `dropped_sets`.
+    """
+
+    def __init__(self, grabbers, max_skew=0.02):
+        self.grabbers = list(grabbers)
+        self.max_skew = max_skew
+        self.dropped_sets = 0
+
+    def wait_for_set(self, after_sequence=0, timeout=1.0):
+        """Return (frames, skew, sequence); frames is None on timeout or when the set is out of sync.
+
+        `sequence` is the reference camera's and is passed back as
+        `after_sequence` on the next call.
+        """
+        frame, timestamp, sequence = self.grabbers[0].wait_for_frame(after_sequence, timeout)
+        if frame is None:
+            return None, 0.0, sequence
+        frames = [frame]
+        skew = 0.0
+        for grabber in self.grabbers[1:]:
+            grabber.wait_until(timestamp, self.max_skew)
+            other, other_ts, _ = grabber.read_nearest(timestamp)
+            if other is None:
+                return None, 0.0, sequence
+            frames.append(other)
+            skew = max(skew, abs(other_ts - timestamp))
+        if skew > self.max_skew:
+            self.dropped_sets += 1
+            return None, skew, sequence
+        return frames, skew, sequence
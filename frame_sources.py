@@ -0,0 +1,265 @@
+import os
+import queue
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+# Recorded and synthetic sources opened for a GUI are paced to this rate unless
+# camera_settings.source_fps says otherwise; unpaced they would spin a core.
+DEFAULT_SOURCE_FPS = 30
+
+#####################
+# Prefetching Frame Source Base
+#####################
+
+class PrefetchingSource(ABC):
+    """A cv2.VideoCapture look-alike fed by a background decode thread.
+
+    Subclasses implement _frames(), a generator of BGR frames. Decoded frames
+    wait in a bounded queue, so read() normally returns without touching the
+    disk. With fps=None frames are delivered as fast as they decode; with an
+    fps they are paced like a live camera. Only read(), isOpened(), release(),
+    get() and set() are provided, which is all the capture code uses.
+    """
+
+    def __init__(self, fps=None, prefetch=8, loop=False):
+        self.fps = fps
+        self.loop = loop
+        self.width = 0
+        self.height = 0
+        self.frame_count = -1
+        self._queue = queue.Queue(maxsize=max(1, prefetch))
+        self._opened = True
+        self._finished = False
+        self._next_time = None
+        self._thread = None
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._decode_loop, daemon=True)
+        self._thread.start()
+
+    @abstractmethod
+    def _frames(self):
+        """Yield BGR frames; called again for every pass when looping."""
+
+    def _decode_loop(self):
+        try:
+            while self._opened:
+                produced = False
+                for frame in self._frames():
+                    if not self._opened:
+                        return
+                    produced = True
+                    self._put(frame)
+                if not self.loop or not produced:
+                    break
+        except Exception as e:
+            print(f"Frame source error: {e}")
+        finally:
+            self._put(None)
+
+    def _put(self, item):
+        while self._opened:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read(self, image=None):
+        """Return (ret, frame) like cv2.VideoCapture.read(); `image` is accepted and ignored."""
+        if self._finished or not self._opened:
+            return False, None
+        while True:
+            try:
+                frame = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if not self._opened:
+                    return False, None
+        if frame is None:
+            self._finished = True
+            return False, None
+        if self.fps:
+            now = time.time()
+            if self._next_time is None:
+                self._next_time = now
+            elif self._next_time > now:
+                time.sleep(self._next_time - now)
+            self._next_time = max(self._next_time, now) + 1.0 / self.fps
+        return True, frame
+
+    def isOpened(self):
+        return self._opened and not self._finished
+
+    def release(self):
+        self._opened = False
+        # Unblock a decode thread waiting on a full queue.
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps or 0
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+        return 0
+
+    def set(self, prop, value):
+        # Recorded sources keep their native resolution.
+        return False
+
+#####################
+# Recorded and Synthetic Sources
+#####################
+
+class VideoFileSource(PrefetchingSource):
+    """Frames from a recorded video file, decoded ahead on a background thread."""
+
+    def __init__(self, path, fps=None, prefetch=8, loop=False):
+        super().__init__(fps, prefetch, loop)
+        self.path = path
+        probe = cv2.VideoCapture(path)
+        if not probe.isOpened():
+            self._opened = False
+            return
+        self.width = int(probe.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(probe.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.native_fps = probe.get(cv2.CAP_PROP_FPS)
+        probe.release()
+        self._start()
+
+    def _frames(self):
+        cap = cv2.VideoCapture(self.path)
+        try:
+            while self._opened:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame
+        finally:
+            cap.release()
+
+class ImageFolderSource(PrefetchingSource):
+    """Frames from the images in a folder (sorted by name), decoded by a small thread pool."""
+
+    def __init__(self, folder, fps=None, prefetch=8, loop=False, decode_threads=2):
+        super().__init__(fps, prefetch, loop)
+        self.folder = folder
+        self.decode_threads = max(1, decode_threads)
+        self.files = sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                            if f.lower().endswith(IMAGE_EXTENSIONS)) if os.path.isdir(folder) else []
+        if not self.files:
+            self._opened = False
+            return
+        self.frame_count = len(self.files)
+        first = cv2.imread(self.files[0])
+        if first is not None:
+            self.height, self.width = first.shape[:2]
+        self._start()
+
+    def _frames(self):
+        # Keep a bounded window of decodes in flight; cv2.imread releases the GIL.
+        with ThreadPoolExecutor(max_workers=self.decode_threads) as pool:
+            pending = deque()
+            files = iter(self.files)
+            for path in files:
+                pending.append((path, pool.submit(cv2.imread, path)))
+                if len(pending) >= self.decode_threads * 2:
+                    break
+            while pending and self._opened:
+                path, future = pending.popleft()
+                next_path = next(files, None)
+                if next_path is not None:
+                    pending.append((next_path, pool.submit(cv2.imread, next_path)))
+                frame = future.result()
+                if frame is None:
+                    print(f"Could not read {path}; skipping.")
+                    continue
+                yield frame
+
+class SyntheticSource(PrefetchingSource):
+    """A moving test pattern, for running the pipelines with no camera or footage."""
+
+    def __init__(self, width=640, height=480, fps=None, prefetch=4, num_frames=None, seed=0):
+        super().__init__(fps, prefetch, loop=False)
+        self.width = width
+        self.height = height
+        self.frame_count = num_frames if num_frames is not None else -1
+        rng = np.random.default_rng(seed)
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 30, (height, width, 3)).astype(np.float32)
+        self._background = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        self._start()
+
+    def _frames(self):
+        index = 0
+        size = max(8, min(self.width, self.height) // 4)
+        while self._opened and (self.frame_count < 0 or index < self.frame_count):
+            frame = self._background.copy()
+            # A bright square drifting across the frame gives motion and edges to detect.
+            x = (index * 4) % max(1, self.width - size)
+            y = (self.height - size) // 2
+            cv2.rectangle(frame, (x, y), (x + size, y + size), (0, 200, 255), -1)
+            cv2.putText(frame, str(index), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+            index += 1
+            yield frame
+
+#####################
+# Source Selection
+#####################
+
+def open_frame_source(spec, fps=None, loop=False):
+    """Open a frame source from a spec string or camera index.
+
+    Accepted specs: a camera index (0, "1"), "synthetic" or "synthetic:WxH",
+    a folder of images, or a video file path. Recorded sources run as fast as
+    they decode unless `fps` is given.
+    """
+    if isinstance(spec, int):
+        return cv2.VideoCapture(spec)
+    spec = str(spec).strip()
+    if spec.isdigit():
+        return cv2.VideoCapture(int(spec))
+    if spec.lower().startswith("synthetic"):
+        width, height = 640, 480
+        if ":" in spec:
+            try:
+                width, height = map(int, spec.split(":", 1)[1].lower().split("x"))
+            except ValueError:
+                print(f"Bad synthetic size in '{spec}'; using {width}x{height}.")
+        return SyntheticSource(width, height, fps=fps)
+    if os.path.isdir(spec):
+        return ImageFolderSource(spec, fps=fps, loop=loop)
+    return VideoFileSource(spec, fps=fps, loop=loop)
+
+def configured_source_fps(camera_settings):
+    """camera_settings.source_fps, or DEFAULT_SOURCE_FPS; 0 delivers frames unpaced."""
+    return camera_settings.get("source_fps", DEFAULT_SOURCE_FPS) or None
+
+def open_configured_source(config, override=None):
+    """Open the source named by `override`, camera_settings.source, or the selected camera.
+
+    camera_settings.source_fps paces recorded sources (DEFAULT_SOURCE_FPS if
+    unset) and camera_settings.source_loop repeats them; both are optional.
+    """
+    camera_settings = config.get("camera_settings", {})
+    spec = override if override is not None else camera_settings.get("source", camera_settings.get("selected_camera", 0))
+    return open_frame_source(spec, fps=configured_source_fps(camera_settings),
+                             loop=camera_settings.get("source_loop", False))
@@ -0,0 +1,242 @@
+import queue
+import threading
+from collections import OrderedDict
+import tkinter as tk
+from tkinter import ttk
+from PIL import Image, ImageTk
+from thumbnail_cache import THUMBNAIL_SIZE
+
+#####################
+# Virtualized Thumbnail Gallery
+#####################
+
+class VirtualGallery(ttk.Frame):
+    """A scrolling thumbnail grid that only builds widgets for the visible rows.
+
+    A fixed pool of cells (frame, label, checkbox) is rebound to whichever
+    items are in view as the user scrolls, so the widget count does not grow
+    with the number of items. Thumbnails are loaded lazily from the
+    ThumbnailCache on a background thread for the visible rows plus
+    `prefetch_rows` above and below, and only a bounded number of PhotoImages
+    is kept. Selection lives in a bytearray, one byte per item.
+
+    Each item is a dict with at least "path"; "variant" names the cached
+    thumbnail to show (an overlay drawn by auto-labeling) and falls back to
+    a plain thumbnail of the image when that entry is missing. An optional
+    "caption" replaces the checkbox text for that item.
+    """
+
+    def __init__(self, master, cache, columns=3, thumb_size=THUMBNAIL_SIZE, prefetch_rows=2, on_open=None,
+                 check_text="Save"):
+        super().__init__(master)
+        self.check_text = check_text
+        self.cache = cache
+        self.columns = columns
+        self.thumb_size = thumb_size
+        self.prefetch_rows = prefetch_rows
+        self.on_open = on_open
+        self.items = []
+        self.selected = bytearray()
+        self.top_row = 0
+        self.visible_rows = 1
+        self.cell_height = thumb_size + 40
+        self.cells = []
+        self._photos = OrderedDict()  # item index -> PhotoImage, least recently shown first
+        self._requested = set()
+        self._window = (0, 0)
+        self._requests = queue.Queue()
+        self._loaded = queue.Queue()
+        self._closed = threading.Event()
+        self._placeholder = ImageTk.PhotoImage(Image.new("RGB", (thumb_size, thumb_size), (64, 64, 64)))
+
+        self.grid_frame = ttk.Frame(self)
+        self.grid_frame.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.bind("<Configure>", self.on_resize)
+        self.bind("<Destroy>", self.on_destroy)
+        for widget in (self.grid_frame, self):
+            widget.bind("<MouseWheel>", self.on_mouse_wheel)
+            widget.bind("<Button-4>", self.on_mouse_wheel)
+            widget.bind("<Button-5>", self.on_mouse_wheel)
+
+        threading.Thread(target=self._load_thumbnails, daemon=True).start()
+        self.after(30, self._poll_loaded)
+
+    #####################
+    # Items and Selection
+    #####################
+
+    def add_items(self, items, selected=True):
+        """Append items to the gallery; only rows that are in view get drawn.
+
+        `selected` is one flag for all the new items or a list with one per item.
+        """
+        self.items.extend(items)
+        if isinstance(selected, (list, tuple)):
+            self.selected.extend(1 if flag else 0 for flag in selected)
+        else:
+            self.selected.extend(b"\x01" * len(items) if selected else bytes(len(items)))
+        self.refresh()
+
+    def selected_items(self):
+        return [item for item, flag in zip(self.items, self.selected) if flag]
+
+    def total_rows(self):
+        return (len(self.items) + self.columns - 1) // self.columns
+
+    #####################
+    # Cell Pool and Scrolling
+    #####################
+
+    def on_resize(self, event):
+        rows = max(1, event.height // self.cell_height + 1)
+        if rows != self.visible_rows or not self.cells:
+            self.visible_rows = rows
+            self._build_cells()
+            self.refresh()
+
+    def _build_cells(self):
+        for frame, _, _, _ in self.cells:
+            frame.destroy()
+        self.cells = []
+        for slot in range(self.visible_rows * self.columns):
+            frame = ttk.Frame(self.grid_frame, relief="ridge", borderwidth=2)
+            label = ttk.Label(frame, image=self._placeholder)
+            label.pack()
+            var = tk.BooleanVar(value=False)
+            chk = ttk.Checkbutton(frame, text=self.check_text, variable=var, command=lambda s=slot: self._toggle(s))
+            chk.pack()
+            label.bind("<Double-Button-1>", lambda e, s=slot: self._open(s))
+            for widget in (frame, label, chk):
+                widget.bind("<MouseWheel>", self.on_mouse_wheel)
+                widget.bind("<Button-4>", self.on_mouse_wheel)
+                widget.bind("<Button-5>", self.on_mouse_wheel)
+            frame.grid(row=slot // self.columns, column=slot % self.columns, padx=5, pady=5)
+            frame.item_index = None
+            self.cells.append((frame, label, chk, var))
+
+    def on_scroll(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(round(float(args[1]) * self.total_rows())))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self.visible_rows if args[2] == "pages" else 1)
+            self.scroll_to(self.top_row + step)
+
+    def on_mouse_wheel(self, event):
+        if getattr(event, "num", None) in (4, 5):
+            step = -1 if event.num == 4 else 1
+        else:
+            step = -1 if event.delta > 0 else 1
+        self.scroll_to(self.top_row + step)
+        return "break"
+
+    def scroll_to(self, row):
+        row = max(0, min(row, self.total_rows() - self.visible_rows + 1))
+        if row != self.top_row:
+            self.top_row = row
+            self.refresh()
+
+    def refresh(self):
+        """Rebind the cell pool to the rows in view and queue their thumbnails."""
+        total_rows = max(1, self.total_rows())
+        self.scrollbar.set(self.top_row / total_rows, min(1.0, (self.top_row + self.visible_rows) / total_rows))
+        first = self.top_row * self.columns
+        for slot, (frame, label, chk, var) in enumerate(self.cells):
+            index = first + slot
+            if index >= len(self.items):
+                frame.item_index = None
+                frame.grid_remove()
+                continue
+            frame.grid()
+            frame.item_index = index
+            var.set(bool(self.selected[index]))
+            chk.configure(text=self.items[index].get("caption", self.check_text))
+            photo = self._photos.get(index)
+            if photo is not None:
+                self._photos.move_to_end(index)
+            label.configure(image=photo if photo is not None else self._placeholder)
+        self._request_window()
+
+    def _toggle(self, slot):
+        frame, _, _, var = self.cells[slot]
+        if frame.item_index is not None:
+            self.selected[frame.item_index] = 1 if var.get() else 0
+
+    def _open(self, slot):
+        frame = self.cells[slot][0]
+        if frame.item_index is not None and self.on_open is not None:
+            self.on_open(self.items[frame.item_index]["path"])
+
+    #####################
+    # Lazy Thumbnail Loading
+    #####################
+
+    def _capacity(self):
+        return (self.visible_rows + 2 * self.prefetch_rows) * self.columns
+
+    def _request_window(self):
+        lo = max(0, (self.top_row - self.prefetch_rows) * self.columns)
+        hi = min(len(self.items), (self.top_row + self.visible_rows + self.prefetch_rows) * self.columns)
+        self._window = (lo, hi)
+        # Visible items first, then the prefetch margin below and above.
+        first = self.top_row * self.columns
+        order = list(range(first, hi)) + list(range(first - 1, lo - 1, -1))
+        for index in order:
+            if index not in self._photos and index not in self._requested:
+                self._requested.add(index)
+                self._requests.put((index, self.items[index]))
+
+    def _load_thumbnails(self):
+        while not self._closed.is_set():
+            try:
+                index, item = self._requests.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            lo, hi = self._window
+            if not lo <= index < hi:
+                # Scrolled past before its turn came.
+                self._loaded.put((index, None))
+                continue
+            try:
+                thumb = None
+                variant = item.get("variant")
+                if variant:
+                    _, thumb, _ = self.cache.get(item["path"], variant)
+                if thumb is None:
+                    thumb = self.cache.thumbnail(item["path"], self.thumb_size)
+            except Exception as e:
+                print(f"Thumbnail error for {item['path']}: {e}")
+                thumb = None
+            self._loaded.put((index, thumb))
+
+    def _poll_loaded(self):
+        if self._closed.is_set():
+            return
+        while True:
+            try:
+                index, thumb = self._loaded.get_nowait()
+            except queue.Empty:
+                break
+            self._requested.discard(index)
+            if thumb is None:
+                continue
+            self._photos[index] = ImageTk.PhotoImage(Image.fromarray(thumb))
+            self._evict_photos()
+            for frame, label, _, _ in self.cells:
+                if frame.item_index == index:
+                    label.configure(image=self._photos[index])
+        self.after(30, self._poll_loaded)
+
+    def _evict_photos(self):
+        # Drop the least recently shown images outside the requested window; cells may still show those inside it.
+        lo, hi = self._window
+        for index in list(self._photos):
+            if len(self._photos) <= self._capacity():
+                break
+            if not lo <= index < hi:
+                del self._photos[index]
+
+    def on_destroy(self, event):
+        if event.widget is self:
+            self._closed.set()
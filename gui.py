@@ -7,6 +7,8 @@ import ctypes  # For loading the font on Windows
 from PIL import Image, ImageTk
 import json
 import serial.tools.list_ports  # For COM port listing
+from dataset_index import INDEX_NAME, describe_dataset
+from yolo_dataset import DEFAULT_DATA_YAML
 
 # Utility function to load a TTF font at runtime on Windows
 def load_custom_font(font_path):
@@ -417,7 +419,7 @@ class TrainingSettingsWindow(tk.Toplevel):
     def __init__(self, master=None):
         super().__init__(master)
         self.title("Training Settings")
-        self.geometry("600x350")
+        self.geometry("600x400")
         self.configure(bg="#1e1e1e")
         self.custom_weights_filepath = None
         self.config_data = load_maintenance_config("maintenance.json")
@@ -469,6 +471,9 @@ class TrainingSettingsWindow(tk.Toplevel):
         self.data_config_entry.insert(0, default_data_config)
         btn_data = tk.Button(frame_data, text="Browse", font=("Helvetica", 12), command=self.browse_data_config)
         btn_data.pack(side="left", padx=5)
+        # Dataset summary, answered by the dataset index rather than a directory walk
+        tk.Label(self, text=self.dataset_summary(), bg="#1e1e1e", fg="gray", font=("Helvetica", 10),
+                 wraplength=560, justify="left").pack(padx=10, fill="x")
         # Project Folder with Browse
         frame_proj = tk.Frame(self, bg="#1e1e1e")
         frame_proj.pack(pady=5, padx=10, fill="x")
@@ -500,6 +505,14 @@ class TrainingSettingsWindow(tk.Toplevel):
         btn_save = tk.Button(self, text="Save Settings", font=("Helvetica", 14), command=self.save_settings)
         btn_save.pack(pady=20)
 
+    def dataset_summary(self):
+        if not os.path.exists(os.path.join(os.path.dirname(DEFAULT_DATA_YAML), INDEX_NAME)):
+            return "Dataset: no index yet (it is built on the first save from Image Labeling)."
+        try:
+            return "Dataset: " + describe_dataset(DEFAULT_DATA_YAML)
+        except Exception as e:
+            return f"Dataset: could not read the index ({e})"
+
     def on_model_weights_selected(self, event):
         # When "Custom" is selected, open a file dialog filtering for .pt files.
         if self.model_weights_var.get() == "Custom":
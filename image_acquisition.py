@@ -2,15 +2,26 @@ import cv2
 import tkinter as tk
 from tkinter import ttk
 from tkinter import font as tkFont
-from PIL import Image, ImageTk
 import os
 import datetime
 import random
 import json
+import csv
+import argparse
 import threading
 import time
 import math
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from frame_grabber import FrameGrabber, SynchronizedGrabbers, negotiate_resolution
+from frame_sources import configured_source_fps, open_configured_source, open_frame_source
+from preview_renderer import PreviewRenderer
+from image_writer import ImageWriter, imwrite_params, load_output_settings
+from image_hashing import dhash, hamming
+from dataset_index import open_dataset_index
+from yolo_dataset import (DEFAULT_DATA_YAML, box_label_rows, format_yolo_rows, register_training_folder,
+                          transform_box, update_yaml_file, write_yolo_label)
 
 #####################
 # Constants and Config Helpers
@@ -54,11 +65,8 @@ def random_variation(frame, alpha_range=(1.0, 1.0), beta_range=(-20, 20)):
     return modified, alpha, beta
 
 def apply_hsv_adjustment(frame, hue_delta, sat_scale):
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(np.float32)
-    hsv[:,:,0] = hsv[:,:,0] + hue_delta * 180  # OpenCV hue: 0-180.
-    hsv[:,:,1] = hsv[:,:,1] * sat_scale
-    hsv = np.clip(hsv, 0, 255).astype(np.uint8)
-    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    _, lut_hue, lut_sat = build_photometric_luts(1.0, 0, hue_delta, sat_scale)
+    return apply_hsv_luts(frame, lut_hue, lut_sat)
 
 def apply_translation(frame, translate_range):
     h, w = frame.shape[:2]
@@ -111,6 +119,484 @@ def apply_random_rotation(frame, rotation_range):
                              borderMode=cv2.BORDER_CONSTANT, borderValue=(0,0,0))
     return rotated, angle
 
+#####################
+# Lookup-Table Photometric Augmentation
+#####################
+
+def sample_photometric_params(alpha_range, beta_range, hue_range, sat_range, rng=random):
+    """Draw contrast (alpha), brightness (beta), hue shift and saturation scale."""
+    return {
+        "alpha": rng.uniform(*alpha_range),
+        "beta": rng.uniform(*beta_range),
+        "hue": rng.uniform(*hue_range),
+        "sat": rng.uniform(*sat_range),
+    }
+
+def build_photometric_luts(alpha, beta, hue_delta, sat_scale):
+    """Build 256-entry uint8 tables for contrast/brightness, hue and saturation.
+
+    Same idea as YOLOv5's augment_hsv: the arithmetic runs on 256 values
+    instead of every pixel, and the image itself never leaves uint8.
+    """
+    x = np.arange(256, dtype=np.float32)
+    # Matches cv2.convertScaleAbs(frame, alpha=alpha, beta=int(beta)).
+    lut_bc = np.clip(np.rint(np.abs(alpha * x + int(beta))), 0, 255).astype(np.uint8)
+    # OpenCV 8-bit hue spans 0-179, so the shift wraps around the color wheel.
+    lut_hue = (np.rint(x + hue_delta * 180) % 180).astype(np.uint8)
+    lut_sat = np.clip(x * sat_scale, 0, 255).astype(np.uint8)
+    return lut_bc, lut_hue, lut_sat
+
+def apply_hsv_luts(frame, lut_hue, lut_sat, dst=None):
+    hue, sat, val = cv2.split(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV))
+    hsv = cv2.merge((cv2.LUT(hue, lut_hue), cv2.LUT(sat, lut_sat), val))
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=dst)
+
+def apply_photometric(frame, params):
+    """Apply brightness/contrast, hue and saturation from `params` using cv2.LUT."""
+    lut_bc, lut_hue, lut_sat = build_photometric_luts(params["alpha"], params["beta"],
+                                                      params["hue"], params["sat"])
+    adjusted = cv2.LUT(frame, lut_bc)
+    if params["hue"] != 0 or params["sat"] != 1:
+        apply_hsv_luts(adjusted, lut_hue, lut_sat, dst=adjusted)
+    return adjusted
+
+#####################
+# Fused Geometric Augmentation
+#####################
+
+def sample_geometry_params(size, zoom_range, translate_range, shear_range, flip_prob, rotation_range, rng=random):
+    """Draw zoom, translation, shear, flip and rotation for one output image.
+
+    The distributions match the individual apply_* helpers above.
+    """
+    w, h = size
+    return {
+        "zoom": rng.uniform(*zoom_range),
+        "translate": (int(rng.uniform(*translate_range) * w), int(rng.uniform(*translate_range) * h)),
+        "shear": rng.uniform(*shear_range),
+        "flip": rng.random() < flip_prob,
+        "angle": rng.uniform(*rotation_range),
+    }
+
+def build_augmentation_matrix(size, zoom=0.0, translate=(0, 0), shear=0.0, flip=False, angle=0.0):
+    """Compose zoom -> translate -> shear -> flip -> rotate into one 2x3 affine matrix.
+
+    Each stage reproduces the geometry of the matching apply_* helper
+    (including the crop clamping of apply_zoom_centered and the resize back
+    after apply_shear), so the parameter distributions and the geometry of
+    the image content are the same as with the chained calls, with a single
+    resampling. Border content can differ: the chained calls fill borders
+    after the zoom crop, while the fused warp still sees pixels outside it.
+    """
+    w, h = size
+    M = np.eye(3)
+
+    # Zoom: centered crop resized back to (w, h). Factors below 1 crop the
+    # whole frame and therefore leave it unchanged, exactly as before.
+    if zoom >= 0.001:
+        new_w = int(w / zoom)
+        new_h = int(h / zoom)
+        cx, cy = w // 2, h // 2
+        x1 = max(cx - new_w // 2, 0)
+        y1 = max(cy - new_h // 2, 0)
+        x2 = min(cx + new_w // 2, w)
+        y2 = min(cy + new_h // 2, h)
+        if x2 > x1 and y2 > y1:
+            sx = w / (x2 - x1)
+            sy = h / (y2 - y1)
+            # cv2.resize samples at pixel centers, hence the half-pixel terms.
+            Z = np.array([[sx, 0, -x1 * sx + 0.5 * (sx - 1)],
+                          [0, sy, -y1 * sy + 0.5 * (sy - 1)],
+                          [0, 0, 1]])
+            M = Z @ M
+
+    tx, ty = translate
+    T = np.array([[1, 0, tx], [0, 1, ty], [0, 0, 1]], dtype=np.float64)
+    M = T @ M
+
+    # Shear onto a wider canvas, then squeeze back to the original width.
+    shear_tan = math.tan(math.radians(shear))
+    nW = w + int(h * shear_tan)
+    if nW > 0:
+        sx = w / nW
+        S = np.array([[sx, sx * shear_tan, 0.5 * (sx - 1)],
+                      [0, 1, 0],
+                      [0, 0, 1]])
+        M = S @ M
+
+    if flip:
+        F = np.array([[-1, 0, w - 1], [0, 1, 0], [0, 0, 1]], dtype=np.float64)
+        M = F @ M
+
+    R = np.vstack([cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0), [0, 0, 1]])
+    M = R @ M
+    return M[:2]
+
+def apply_fused_geometry(frame, params, interpolation=cv2.INTER_LINEAR):
+    """Apply all geometric augmentations in `params` with a single warpAffine."""
+    h, w = frame.shape[:2]
+    M = build_augmentation_matrix((w, h), params["zoom"], params["translate"],
+                                  params["shear"], params["flip"], params["angle"])
+    return cv2.warpAffine(frame, M, (w, h), flags=interpolation,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+
+#####################
+# Augmentation Pipeline
+#####################
+
+def augmentation_ranges(aug):
+    """Collect the augmentation slider values into the ranges used by augment_frame."""
+    return {
+        "rotation": (aug["min_rotation"], aug["max_rotation"]),
+        "beta": (aug["min_beta"], aug["max_beta"]),
+        "alpha": (aug["min_alpha"], aug["max_alpha"]),
+        "zoom": (aug["min_zoom"], aug["max_zoom"]),
+        "hue": (aug["min_hue"], aug["max_hue"]),
+        "sat": (aug["min_saturation"], aug["max_saturation"]),
+        "translate": (aug["min_translate"], aug["max_translate"]),
+        "shear": (aug["min_shear"], aug["max_shear"]),
+        "flip": aug["flip_lr"],
+    }
+
+def crop_to_roi(frame, roi):
+    if not roi:
+        return frame
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = roi
+    return frame[max(0, y1):min(h, y2), max(0, x1):min(w, x2)]
+
+def expand_roi(roi, margin, frame_size):
+    """Grow the ROI by `margin` (a fraction of its size) on every side for context.
+
+    Returns the crop rectangle and the original ROI relative to that crop,
+    which is the object box carried through augmentation for labels.
+    """
+    w, h = frame_size
+    x1, y1, x2, y2 = max(0, roi[0]), max(0, roi[1]), min(w, roi[2]), min(h, roi[3])
+    pad_x = int((x2 - x1) * margin)
+    pad_y = int((y2 - y1) * margin)
+    cx1, cy1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+    cx2, cy2 = min(w, x2 + pad_x), min(h, y2 + pad_y)
+    return (cx1, cy1, cx2, cy2), (x1 - cx1, y1 - cy1, x2 - cx1, y2 - cy1)
+
+def yolo_label_rows(params, size, object_box, class_idx):
+    """Transform the object box with the sampled geometry and return YOLO label rows."""
+    M = build_augmentation_matrix(size, params["zoom"], params["translate"], params["shear"],
+                                  params["flip"], params["angle"])
+    box = transform_box(object_box, M, size)
+    return [(class_idx,) + tuple(box)] if box is not None else []
+
+def scale_roi(roi, src_size, dst_size):
+    """Map an ROI between two resolutions of the same camera view."""
+    sx = dst_size[0] / src_size[0]
+    sy = dst_size[1] / src_size[1]
+    x1, y1, x2, y2 = roi
+    return (int(round(x1 * sx)), int(round(y1 * sy)), int(round(x2 * sx)), int(round(y2 * sy)))
+
+def crop_roi_native(frame, roi, display_size):
+    """Crop an ROI given in display coordinates straight from a native-resolution frame.
+
+    Only the ROI is resampled, to the size it has at display resolution, so
+    the output matches resize-then-crop without touching the rest of the frame.
+    """
+    h, w = frame.shape[:2]
+    dw, dh = display_size
+    if (w, h) == (dw, dh):
+        return crop_to_roi(frame, roi)
+    if not roi:
+        return cv2.resize(frame, (dw, dh), interpolation=cv2.INTER_AREA if w > dw else cv2.INTER_LINEAR)
+    x1, y1, x2, y2 = max(0, roi[0]), max(0, roi[1]), min(dw, roi[2]), min(dh, roi[3])
+    if x2 <= x1 or y2 <= y1:
+        return frame[0:0, 0:0]
+    nx1, ny1, nx2, ny2 = scale_roi((x1, y1, x2, y2), (dw, dh), (w, h))
+    cropped = frame[ny1:max(ny2, ny1 + 1), nx1:max(nx2, nx1 + 1)]
+    interpolation = cv2.INTER_AREA if cropped.shape[1] > x2 - x1 else cv2.INTER_LINEAR
+    return cv2.resize(cropped, (x2 - x1, y2 - y1), interpolation=interpolation)
+
+def sample_augmentation_params(size, ranges, rng=random):
+    """Sample every photometric and geometric parameter for one output image."""
+    params = sample_photometric_params(ranges["alpha"], ranges["beta"], ranges["hue"], ranges["sat"], rng)
+    params.update(sample_geometry_params(size, ranges["zoom"], ranges["translate"], ranges["shear"],
+                                         ranges["flip"], ranges["rotation"], rng))
+    return params
+
+def render_augmentation(frame, params):
+    """Apply previously sampled parameters; the same frame and params always give the same image."""
+    return apply_fused_geometry(apply_photometric(frame, params), params)
+
+def augment_frame(frame, ranges, rng=random):
+    """Augment one ROI frame; returns the image and the parameters that were sampled."""
+    h, w = frame.shape[:2]
+    params = sample_augmentation_params((w, h), ranges, rng)
+    return render_augmentation(frame, params), params
+
+#####################
+# Augmentation Manifest and Replay
+#####################
+
+MANIFEST_NAME = "manifest.jsonl"
+RAW_FOLDER = "raw"
+
+def new_session_seed(configured_seed=None):
+    """Use the configured seed if there is one, otherwise draw a fresh one."""
+    if configured_seed is not None:
+        return int(configured_seed)
+    return random.SystemRandom().getrandbits(32)
+
+def manifest_record(filename, seed, params, raw=None):
+    record = {"file": filename, "raw": raw, "seed": seed}
+    record.update(params)
+    return record
+
+class AugmentationManifest:
+    """Append-only JSONL log of the parameters behind every output image.
+
+    The first line is a session header (seed, ranges, label box); each
+    following line is one image: its file name, the raw frame it came
+    from and the sampled alpha, beta, hue, sat, zoom, translate, shear,
+    flip and angle. Together with the raw frames this is enough to
+    regenerate any image with replay_manifest().
+
+    Raw frames are only kept by "Raw + Manifest Only" and batch captures.
+    A regular serial capture saves just the augmented images, one unique
+    frame each, to avoid writing every frame twice; its records have
+    "raw": null and the header says "replayable": false. Those manifests
+    document the parameters but cannot be replayed.
+    """
+
+    def __init__(self, folder, header):
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "w")
+        self._write(header)
+
+    def append(self, record):
+        self._write(record)
+
+    def _write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def load_manifest(manifest_path):
+    with open(manifest_path, "r") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if not entries:
+        return {}, []
+    return entries[0], entries[1:]
+
+def replay_manifest(manifest_path, output_dir=None, jpeg_quality=95, png_compression=3):
+    """Regenerate augmented images (and their labels) from raw frames plus a manifest.
+
+    Only sessions captured with raw frames ("Raw + Manifest Only" or batch
+    mode) can be replayed. Returns the number of images written; records
+    without a raw frame are skipped.
+    """
+    header, records = load_manifest(manifest_path)
+    if header.get("replayable") is False:
+        print(f"{manifest_path} is from a capture without raw frames; only raw + manifest and batch "
+              f"sessions can be replayed.")
+        return 0
+    session_dir = os.path.dirname(os.path.abspath(manifest_path))
+    output_dir = output_dir or session_dir
+    os.makedirs(output_dir, exist_ok=True)
+    label_box = header.get("label_box")
+    raw_cache = {}
+    count = 0
+    for record in records:
+        raw_name = record.get("raw")
+        if not raw_name:
+            print(f"No raw frame recorded for {record.get('file')}; skipping.")
+            continue
+        raw = raw_cache.get(raw_name)
+        if raw is None:
+            raw = cv2.imread(os.path.join(session_dir, raw_name))
+            if raw is None:
+                print(f"Could not read raw frame {raw_name}; skipping.")
+                continue
+            if len(raw_cache) >= 64:
+                raw_cache.clear()
+            raw_cache[raw_name] = raw
+        filename = os.path.join(output_dir, record["file"])
+        cv2.imwrite(filename, render_augmentation(raw, record),
+                    imwrite_params(filename, jpeg_quality, png_compression))
+        if label_box is not None:
+            h, w = raw.shape[:2]
+            write_yolo_label(os.path.splitext(filename)[0] + ".txt",
+                             yolo_label_rows(record, (w, h), label_box, header.get("class_idx")))
+        count += 1
+    return count
+
+#####################
+# Capture Quality Gate
+#####################
+
+# With the gate on, a capture gives up after this many rejected frames per requested image.
+MAX_ATTEMPTS_PER_IMAGE = 20
+
+def sharpness_score(gray):
+    """Variance of the Laplacian; low values mean little edge detail (blur or defocus)."""
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+class FrameQualityGate:
+    """Rejects blurry frames and near-duplicates of recently kept frames.
+
+    Both checks run on a grayscale copy downscaled to `max_side`, so the
+    cost is a fraction of a millisecond per frame. Frames whose difference
+    hash is within `max_hash_distance` bits of any of the last `history`
+    kept frames count as duplicates.
+    """
+
+    def __init__(self, min_sharpness=100.0, max_hash_distance=5, history=8, max_side=256):
+        self.min_sharpness = min_sharpness
+        self.max_hash_distance = max_hash_distance
+        self.max_side = max_side
+        self.recent = deque(maxlen=max(1, history))
+        self.counts = {"kept": 0, "blurry": 0, "duplicate": 0}
+
+    def check(self, frame):
+        """Return (accepted, reason); reason describes why a frame was rejected."""
+        if frame is None or frame.size == 0:
+            return False, "empty frame"
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        h, w = gray.shape[:2]
+        scale = self.max_side / max(h, w)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+        score = sharpness_score(gray)
+        if score < self.min_sharpness:
+            self.counts["blurry"] += 1
+            return False, f"blurry (sharpness {score:.1f} < {self.min_sharpness})"
+        frame_hash = dhash(gray)
+        for previous in self.recent:
+            distance = hamming(frame_hash, previous)
+            if distance <= self.max_hash_distance:
+                self.counts["duplicate"] += 1
+                return False, f"near-duplicate (hash distance {distance})"
+        self.recent.append(frame_hash)
+        self.counts["kept"] += 1
+        return True, None
+
+    def summary(self):
+        return (f"kept {self.counts['kept']}, rejected {self.counts['blurry']} blurry and "
+                f"{self.counts['duplicate']} near-duplicate frames")
+
+#####################
+# Process-Pool Batch Augmentation
+#####################
+
+_batch_frames = None
+
+def _init_batch_worker(frames):
+    global _batch_frames
+    _batch_frames = frames
+    # Parallelism comes from the pool; keep OpenCV from oversubscribing the cores.
+    cv2.setNumThreads(1)
+
+def _batch_augment_worker(job):
+    frame_index, seed, ranges, filename, write_params, label_box, class_idx = job
+    raw_frame = _batch_frames[frame_index]
+    proc_frame, params = augment_frame(raw_frame, ranges, random.Random(seed))
+    cv2.imwrite(filename, proc_frame, write_params)
+    if label_box is not None:
+        h, w = raw_frame.shape[:2]
+        write_yolo_label(os.path.splitext(filename)[0] + ".txt",
+                         yolo_label_rows(params, (w, h), label_box, class_idx))
+    return params
+
+def batch_worker_count():
+    # Leave one core for the camera grabber and the Tk loop.
+    return max(1, (os.cpu_count() or 2) - 1)
+
+#####################
+# Gantry Scan Poses
+#####################
+
+def axis_values(spec):
+    """[start, stop, count] -> evenly spaced values; a single value or [value] is one position."""
+    if isinstance(spec, (int, float)):
+        return [float(spec)]
+    if len(spec) == 3:
+        return [float(v) for v in np.linspace(spec[0], spec[1], max(1, int(spec[2])))]
+    return [float(v) for v in spec]
+
+def grid_poses(x=(0,), y=(0,), z=(0,)):
+    """Build a serpentine X/Y grid per Z level so consecutive poses are neighbours."""
+    poses = []
+    xs, ys = axis_values(x), axis_values(y)
+    for z_value in axis_values(z):
+        for row, y_value in enumerate(ys):
+            for x_value in (xs if row % 2 == 0 else xs[::-1]):
+                poses.append({"X": x_value, "Y": y_value, "Z": z_value})
+    return poses
+
+def load_poses(path):
+    """Read poses from a JSON list of {"X", "Y", "Z"} objects or a CSV file with x,y,z columns."""
+    if path.lower().endswith(".csv"):
+        with open(path, "r", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, "r") as f:
+            rows = json.load(f)
+    poses = []
+    for row in rows:
+        pose = {axis: float(row[key]) for axis in ("X", "Y", "Z")
+                for key in (axis, axis.lower()) if key in row and row[key] not in ("", None)}
+        poses.append(pose)
+    return poses
+
+# A scan pose gets this many frame waits of about a second before it is skipped.
+SETTLE_ATTEMPTS = 3
+
+def scan_poses(config):
+    """The poses for a scan: scan_settings.poses_file if set, else the scan_settings.grid."""
+    settings = config.get("scan_settings", {})
+    if settings.get("poses_file"):
+        return load_poses(settings["poses_file"])
+    grid = settings.get("grid", {})
+    return grid_poses(grid.get("x", [0]), grid.get("y", [0]), grid.get("z", [0]))
+
+#####################
+# Capture Streams
+#####################
+
+class CaptureStream:
+    """One camera's share of a capture session: where its crops come from and where they go.
+
+    `roi` is given in `display_size` coordinates; `label_box` is the object
+    box inside the cropped ROI, or None when no labels are written.
+    """
+
+    def __init__(self, name, folder, roi, display_size, label_box=None, class_idx=None, manifest=None):
+        self.name = name
+        self.folder = folder
+        self.roi = roi
+        self.display_size = display_size
+        self.label_box = label_box
+        self.class_idx = class_idx
+        self.manifest = manifest
+
+def load_extra_cameras(config):
+    """Additional synchronized cameras from camera_settings.extra_cameras.
+
+    Each entry may give "name", "source" (camera index, video file, image
+    folder or "synthetic"), "resolution" ("WxH") and "roi" in that camera's
+    pixel coordinates.
+    """
+    cameras = []
+    for index, entry in enumerate(config.get("camera_settings", {}).get("extra_cameras", [])):
+        cameras.append({
+            "name": str(entry.get("name", f"cam{index + 1}")),
+            "source": entry.get("source", index + 1),
+            "resolution": entry.get("resolution"),
+            "roi": entry.get("roi"),
+        })
+    return cameras
+
 def create_folder_structure(base_dir, category, label):
     category_folder = os.path.join(base_dir, category)
     if not os.path.exists(category_folder):
@@ -128,7 +614,7 @@ def create_folder_structure(base_dir, category, label):
 #####################
 
 class TrainingApp(tk.Tk):
-    def __init__(self, config_file="maintenance.json"):
+    def __init__(self, config_file="maintenance.json", source=None):
         super().__init__()
         # Set dark background and maximize window
         self.configure(bg="#1e1e1e")
@@ -162,12 +648,26 @@ class TrainingApp(tk.Tk):
         self.current_roi = None
         self.training_center = None
 
-        # Open camera using the selected index from JSON
-        selected_camera = self.config_data.get("camera_settings", {}).get("selected_camera", 0)
-        self.cap = cv2.VideoCapture(selected_camera)
+        # Open the frame source: the selected camera, or a video file, image folder or
+        # "synthetic" given by --source or camera_settings.source.
+        self.cap = open_configured_source(self.config_data, source)
         if not self.cap.isOpened():
             print("Warning: Camera could not be opened. Using fallback blank image.")
             self.cap = None
+        else:
+            # Ask the camera for the configured resolution so frames need no resampling.
+            native_size = negotiate_resolution(self.cap, self.video_width, self.video_height)
+            if native_size != (self.video_width, self.video_height):
+                print(f"Camera delivers {native_size[0]}x{native_size[1]}; ROI crops are rescaled.")
+        # A single grabber thread owns the device; every consumer reads from its ring buffer.
+        self.grabber = FrameGrabber(self.cap).start() if self.cap is not None else None
+        self.camera_name = str(self.config_data.get("camera_settings", {}).get("name", "cam0"))
+        self.extra_cameras = self.open_extra_cameras()
+
+        # Captured images are encoded and written off the capture thread.
+        self.output_settings = load_output_settings(self.config_data)
+        self.image_ext = "." + self.output_settings["image_format"]
+        self.writer = ImageWriter.from_config(self.config_data)
 
         # ROI variables
         self.roi = None
@@ -227,6 +727,10 @@ class TrainingApp(tk.Tk):
         row_counter = 0
         aug_params = [
             ("num_pictures", "", "num_pictures", "", 1, 1000, 25, 25),
+            ("raw_frames", "Raw Frames (Batch)", "raw_frames", "Raw Frames (Batch)", 1, 100, 10, 10),
+            ("context_margin", "Label Context Margin", "context_margin", "Label Context Margin", 0.0, 1.0, 0.25, 0.25),
+            ("min_sharpness", "Min Sharpness (Gate)", "min_sharpness", "Min Sharpness (Gate)", 0, 1000, 100, 100),
+            ("max_hash_distance", "Duplicate Distance (Gate)", "max_hash_distance", "Duplicate Distance (Gate)", 0, 32, 5, 5),
             ("min_rotation", "Min Rotation (deg)", "max_rotation", "Max Rotation (deg)", -65, 65, -15, 15),
             ("min_beta", "Min Brightness Offset", "max_beta", "Max Brightness Offset", -100, 100, -20, 20),
             ("min_alpha", "Min Alpha", "max_alpha", "Max Alpha", 0.1, 3.0, 1.0, 1.0),
@@ -290,14 +794,43 @@ class TrainingApp(tk.Tk):
         self.save_button = tk.Button(button_frame, text="Save Training Settings", command=self.save_training_settings,
                                      font=self.custom_font_button, bg="#333333", fg="white")
         self.save_button.grid(row=0, column=1, padx=10, pady=10)
+        self.scan_button = tk.Button(button_frame, text="Scan Capture", command=self.start_scan,
+                                     font=self.custom_font_button, bg="#333333", fg="white")
+        self.scan_button.grid(row=1, column=0, padx=10, pady=10)
+        self.batch_mode_var = tk.BooleanVar(self, value=training_defaults.get("batch_mode", False))
+        self.batch_check = tk.Checkbutton(button_frame, text="Batch Mode", variable=self.batch_mode_var,
+                                          font=self.custom_font_button, bg="#1e1e1e", fg="white",
+                                          selectcolor="#333333", activebackground="#1e1e1e")
+        self.batch_check.grid(row=0, column=2, padx=10, pady=10)
+        self.write_labels_var = tk.BooleanVar(self, value=training_defaults.get("write_labels", True))
+        self.labels_check = tk.Checkbutton(button_frame, text="Write YOLO Labels", variable=self.write_labels_var,
+                                           font=self.custom_font_button, bg="#1e1e1e", fg="white",
+                                           selectcolor="#333333", activebackground="#1e1e1e")
+        self.labels_check.grid(row=0, column=3, padx=10, pady=10)
+        self.manifest_only_var = tk.BooleanVar(self, value=training_defaults.get("manifest_only", False))
+        self.manifest_only_check = tk.Checkbutton(button_frame, text="Raw + Manifest Only", variable=self.manifest_only_var,
+                                                  font=self.custom_font_button, bg="#1e1e1e", fg="white",
+                                                  selectcolor="#333333", activebackground="#1e1e1e")
+        self.manifest_only_check.grid(row=0, column=4, padx=10, pady=10)
+        self.quality_gate_var = tk.BooleanVar(self, value=training_defaults.get("quality_gate", False))
+        self.quality_gate_check = tk.Checkbutton(button_frame, text="Quality Gate", variable=self.quality_gate_var,
+                                                 font=self.custom_font_button, bg="#1e1e1e", fg="white",
+                                                 selectcolor="#333333", activebackground="#1e1e1e")
+        self.quality_gate_check.grid(row=0, column=5, padx=10, pady=10)
         self.status_label = tk.Label(button_frame, text="Status: Waiting", bg="#1e1e1e", fg="white", font=self.custom_font_button)
-        self.status_label.grid(row=0, column=2, padx=10, pady=10)
+        self.status_label.grid(row=0, column=6, padx=10, pady=10)
 
         # Bind ROI mouse events on the raw feed panel.
         self.raw_label.bind("<ButtonPress-1>", self.on_mouse_down)
         self.raw_label.bind("<B1-Motion>", self.on_mouse_move)
         self.raw_label.bind("<ButtonRelease-1>", self.on_mouse_up)
 
+        # Frames are handed to the Tk thread and drawn at a capped rate, independent of capture.
+        display_fps = self.config_data.get("camera_settings", {}).get("display_fps", 30)
+        self.raw_preview = PreviewRenderer(self.raw_label, (self.video_width, self.video_height), display_fps)
+        self.proc_preview = PreviewRenderer(self.proc_label, (self.video_width, self.video_height), display_fps)
+        self.shown_sequence = -1
+
         self.delay = 15
         self.after(self.delay, self.update_raw_feed)
 
@@ -321,6 +854,29 @@ class TrainingApp(tk.Tk):
         else:
             self.label_var.set("")
 
+    def open_extra_cameras(self):
+        """Open and start a grabber for every configured extra camera."""
+        camera_settings = self.config_data.get("camera_settings", {})
+        cameras = []
+        for camera in load_extra_cameras(self.config_data):
+            cap = open_frame_source(camera["source"], fps=configured_source_fps(camera_settings),
+                                    loop=camera_settings.get("source_loop", False))
+            if not cap.isOpened():
+                print(f"Warning: Extra camera {camera['name']} ({camera['source']}) could not be opened; skipping.")
+                continue
+            if camera["resolution"]:
+                camera["size"] = negotiate_resolution(cap, *parse_resolution(camera["resolution"]))
+            else:
+                camera["size"] = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            camera["grabber"] = FrameGrabber(cap).start()
+            cameras.append(camera)
+            print(f"Extra camera {camera['name']} opened at {camera['size'][0]}x{camera['size'][1]}")
+        return cameras
+
+    def set_status(self, text):
+        """Update the status label from any thread."""
+        self.after(0, lambda: self.status_label.config(text=text))
+
     def get_aug_params(self):
         params = {}
         for key, slider in self.aug_sliders.items():
@@ -328,41 +884,26 @@ class TrainingApp(tk.Tk):
         return params
 
     # --- ROI Mouse Handlers ---
+    def roi_point(self, event):
+        """Label coordinates -> video_width x video_height ROI coordinates.
+
+        The preview is fitted to the label with its aspect ratio kept, so when
+        the camera delivers a different aspect ratio it is letterboxed; map
+        through the shown frame rather than the whole label.
+        """
+        fraction = self.raw_preview.to_fraction(event.x, event.y)
+        if fraction is None:
+            return event.x, event.y
+        return int(fraction[0] * self.video_width), int(fraction[1] * self.video_height)
+
     def on_mouse_down(self, event):
-        # Get label dimensions to calculate scaling
-        label_width = self.raw_label.winfo_width()
-        label_height = self.raw_label.winfo_height()
-        
-        # Adjust coordinates based on the actual displayed image size
-        if label_width > 1 and label_height > 1:
-            scale_x = self.video_width / label_width
-            scale_y = self.video_height / label_height
-            self.start_x = int(event.x * scale_x)
-            self.start_y = int(event.y * scale_y)
-        else:
-            self.start_x = event.x
-            self.start_y = event.y
-        
+        self.start_x, self.start_y = self.roi_point(event)
         self.roi = None
 
     def on_mouse_move(self, event):
         if self.start_x is None or self.start_y is None:
             return
-            
-        # Get label dimensions to calculate scaling
-        label_width = self.raw_label.winfo_width()
-        label_height = self.raw_label.winfo_height()
-        
-        # Adjust coordinates based on the actual displayed image size
-        if label_width > 1 and label_height > 1:
-            scale_x = self.video_width / label_width
-            scale_y = self.video_height / label_height
-            current_x = int(event.x * scale_x)
-            current_y = int(event.y * scale_y)
-        else:
-            current_x = event.x
-            current_y = event.y
-            
+        current_x, current_y = self.roi_point(event)
         self.roi = (min(self.start_x, current_x), min(self.start_y, current_y),
                    max(self.start_x, current_x), max(self.start_y, current_y))
         self.update_display()
@@ -370,21 +911,7 @@ class TrainingApp(tk.Tk):
     def on_mouse_up(self, event):
         if self.start_x is None or self.start_y is None:
             return
-            
-        # Get label dimensions to calculate scaling
-        label_width = self.raw_label.winfo_width()
-        label_height = self.raw_label.winfo_height()
-        
-        # Adjust coordinates based on the actual displayed image size
-        if label_width > 1 and label_height > 1:
-            scale_x = self.video_width / label_width
-            scale_y = self.video_height / label_height
-            current_x = int(event.x * scale_x)
-            current_y = int(event.y * scale_y)
-        else:
-            current_x = event.x
-            current_y = event.y
-            
+        current_x, current_y = self.roi_point(event)
         self.roi = (min(self.start_x, current_x), min(self.start_y, current_y),
                    max(self.start_x, current_x), max(self.start_y, current_y))
                    
@@ -395,214 +922,468 @@ class TrainingApp(tk.Tk):
         print("ROI set to:", self.roi, "Center:", self.training_center)
         self.update_display()
 
+    def read_frame(self):
+        """Return the newest camera frame from the grabber without blocking."""
+        if self.grabber is None:
+            return False, None
+        return self.grabber.read()
+
     def update_display(self):
         """Update the display with ROI and crosshair."""
-        ret, frame = (self.cap.read() if self.cap is not None else (False, None))
+        ret, frame = self.read_frame()
         if not ret:
             return
+        self.show_raw_frame(frame)
+
+    def update_raw_feed(self):
+        if not self.running:
+            return
+        # Only redraw when the grabber has published a new frame.
+        sequence = self.grabber.sequence if self.grabber is not None else 0
+        if sequence != self.shown_sequence:
+            self.shown_sequence = sequence
+            ret, frame = self.read_frame()
+            if ret:
+                self.show_raw_frame(frame)
+            else:
+                blank = 255 * np.ones((self.video_height, self.video_width, 3), dtype="uint8")
+                self.raw_preview.submit(blank)
         
-        # Create a copy of the frame to draw on
-        display_frame = frame.copy()
-        display_frame = cv2.resize(display_frame, (self.video_width, self.video_height))
+        self.after(self.delay, self.update_raw_feed)
+
+    def show_raw_frame(self, frame):
+        # Draw on the native frame (a private copy from the grabber); the preview
+        # renderer does the one resize down to the label.
+        display_frame = frame
+        h, w = frame.shape[:2]
+        scale = w / self.video_width
+        thickness = max(1, int(round(2 * scale)))
         
-        # Draw ROI rectangle if it exists
+        # Draw ROI and crosshair if they exist
         if self.roi:
-            x1, y1, x2, y2 = self.roi
-            cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+            x1, y1, x2, y2 = scale_roi(self.roi, (self.video_width, self.video_height), (w, h))
+            cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 0, 255), thickness)
             
             # Draw green crosshair at center of ROI
             center_x = (x1 + x2) // 2
             center_y = (y1 + y2) // 2
-            cross_size = 15
+            cross_size = int(15 * scale)
             cross_color = (0, 255, 0)  # Green
-            cv2.line(display_frame, (center_x - cross_size, center_y), (center_x + cross_size, center_y), cross_color, 2)
-            cv2.line(display_frame, (center_x, center_y - cross_size), (center_x, center_y + cross_size), cross_color, 2)
+            cv2.line(display_frame, (center_x - cross_size, center_y), (center_x + cross_size, center_y), cross_color, thickness)
+            cv2.line(display_frame, (center_x, center_y - cross_size), (center_x, center_y + cross_size), cross_color, thickness)
         
-        # Convert to RGB and update the display
-        display_rgb = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-        self.update_image(self.raw_label, display_rgb, (self.video_width, self.video_height))
+        self.raw_preview.submit(display_frame)
 
-    def update_raw_feed(self):
-        if not self.running:
+    def start_training(self):
+        if self.training_thread and self.training_thread.is_alive():
+            self.status_label.config(text="Status: Capture already running.")
             return
-        ret, frame = (self.cap.read() if self.cap is not None else (False, None))
-        if ret:
-            # Resize the frame to the fixed display dimensions
-            frame_resized = cv2.resize(frame, (self.video_width, self.video_height))
-            display_frame = frame_resized.copy()
-            
-            # Draw ROI and crosshair if they exist
-            if self.roi:
-                x1, y1, x2, y2 = self.roi
-                cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                
-                # Draw green crosshair at center of ROI
-                center_x = (x1 + x2) // 2
-                center_y = (y1 + y2) // 2
-                cross_size = 15
-                cross_color = (0, 255, 0)  # Green
-                cv2.line(display_frame, (center_x - cross_size, center_y), (center_x + cross_size, center_y), cross_color, 2)
-                cv2.line(display_frame, (center_x, center_y - cross_size), (center_x, center_y + cross_size), cross_color, 2)
-            
-            # Convert to RGB for display
-            video_rgb = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-            
-            # Use fixed dimensions for display
-            self.update_image(self.raw_label, video_rgb, (self.video_width, self.video_height))
-        else:
-            blank = 255 * np.ones((self.video_height, self.video_width, 3), dtype="uint8")
-            self.update_image(self.raw_label, blank, (self.video_width, self.video_height))
-        
-        self.after(self.delay, self.update_raw_feed)
+        self.training_thread = threading.Thread(target=self.training_capture_loop, daemon=True)
+        self.training_thread.start()
 
-    def update_image(self, label, cv_img, size):
-        if cv_img.size == 0:
-            cv_img = 255 * np.ones((size[1], size[0], 3), dtype="uint8")
-        # Maintain aspect ratio when resizing
-        h, w = cv_img.shape[:2]
-        target_w, target_h = size
-        
-        # Calculate scaling to fit within the target size while preserving aspect ratio
-        scale = min(target_w / w, target_h / h)
-        new_w, new_h = int(w * scale), int(h * scale)
-        
-        # Resize the image to fit within the label while maintaining aspect ratio
-        img = Image.fromarray(cv_img).resize((new_w, new_h), Image.LANCZOS)
-        imgtk = ImageTk.PhotoImage(image=img)
-        label.imgtk = imgtk
-        label.configure(image=imgtk)
+    def start_scan(self):
+        if self.training_thread and self.training_thread.is_alive():
+            self.status_label.config(text="Status: Capture already running.")
+            return
+        self.training_thread = threading.Thread(target=self.scan_capture_loop, daemon=True)
+        self.training_thread.start()
 
-    def start_training(self):
-        # Use model weights from json
-        model_weights = self.model_var.get()
-        data_config = self.data_config_var.get().strip()
-        img_size = self.img_size_var.get().strip()
-        batch = self.batch_var.get().strip()
-        epochs = self.epochs_var.get().strip()
-        project = self.project_var.get().strip()
-        
-        if not data_config or not os.path.exists(data_config):
-            messagebox.showerror("Input Error", "Please select a valid data config file.")
+    def scan_capture_loop(self):
+        """Step the gantry through the scan poses and save one ROI frame per pose.
+
+        Each pose is reached with G1 + M400, then the first frame captured at
+        least `settle_ms` after the acknowledgement is cropped and handed to
+        the writer, so encoding and writing overlap with the next move; a
+        pose with no such frame after a few tries is skipped. Poses and timing
+        go to poses.jsonl in the session folder.
+
+        Poses are machine coordinates after homing. scan_settings.axis_sign
+        and axis_offset ({"X": 1, ...}) map them per axis, as
+        sign * pose + offset, for rigs whose pose frame differs.
+        """
+        # pyserial is only needed for scanning.
+        from training_hardware import open_gantry, send_and_wait, move_to_pose
+
+        current_config = load_config(self.config_file)
+        hardware = current_config.get("hardware_settings", {})
+        settings = current_config.get("scan_settings", {})
+        if self.grabber is None:
+            self.set_status("Status: Scan needs a camera.")
             return
-        
-        command = ["python", TRAIN_SCRIPT,
-                "--img", img_size,
-                "--batch", batch,
-                "--epochs", epochs,
-                "--data", data_config,
-                "--weights", model_weights,
-                "--project", project]
-        
-        self.output_text.insert(tk.END, f"Executing command:\n{' '.join(command)}\n\n")
-        self.output_text.see(tk.END)
-        
         try:
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            for line in process.stdout:
-                self.output_text.insert(tk.END, line)
-                self.output_text.see(tk.END)
-                self.update()
-            process.wait()
-            self.output_text.insert(tk.END, "\nTraining process completed.\n")
-            # After training, update the metrics from the last run.
-            self.update_last_metrics()
+            poses = scan_poses(current_config)
+        except (OSError, ValueError, KeyError) as e:
+            self.set_status(f"Status: Could not load scan poses: {e}")
+            return
+        if not poses:
+            self.set_status("Status: No scan poses configured.")
+            return
+
+        label_name = self.label_var.get()
+        target_folder = create_folder_structure("training_data", self.category_var.get(), label_name)
+        roi = current_config.get("current_roi", None)
+        feed = settings.get("feed_rate", 3000)
+        settle = settings.get("settle_ms", 50) / 1000.0
+        try:
+            connection = open_gantry(hardware.get("com_port", "COM9"), hardware.get("baud_rate", 115200))
+        except Exception as e:
+            self.set_status(f"Status: Could not open gantry: {e}")
+            return
+
+        print(f"Scanning {len(poses)} poses into {target_folder}")
+        start_time = time.time()
+        captured = 0
+        error = None
+        try:
+            with open(os.path.join(target_folder, "poses.jsonl"), "w") as pose_log:
+                if settings.get("home_first", True):
+                    send_and_wait(connection, "G28", timeout=120.0)
+                send_and_wait(connection, "G90")
+                for index, pose in enumerate(poses):
+                    if not self.running:
+                        break
+                    move_start = time.time()
+                    move_to_pose(connection, pose, feed, axis_sign=settings.get("axis_sign"),
+                                 axis_offset=settings.get("axis_offset"))
+                    arrived = time.time()
+                    # Only use a frame exposed after the gantry stopped and settled.
+                    frame, frame_ts = None, 0.0
+                    for _ in range(SETTLE_ATTEMPTS):
+                        self.grabber.wait_until(arrived + settle, timeout=1.0 + settle)
+                        frame, frame_ts, _ = self.grabber.read_latest()
+                        if frame is not None and frame_ts >= arrived + settle:
+                            break
+                    if frame is None or frame_ts < arrived + settle:
+                        print(f"Pose {index}: no frame after the gantry settled; skipping.")
+                        continue
+                    cropped = crop_roi_native(frame, roi, (self.video_width, self.video_height))
+                    filename = f"{label_name}_pose{index:04d}{self.image_ext}"
+                    self.writer.submit(os.path.join(target_folder, filename), cropped)
+                    self.proc_preview.submit(cropped)
+                    pose_log.write(json.dumps({"file": filename, "pose": pose, "move_sec": round(arrived - move_start, 4),
+                                               "frame_delay_sec": round(frame_ts - arrived, 4)}) + "\n")
+                    captured += 1
+                    self.set_status(f"Status: Scanned pose {index + 1}/{len(poses)}")
         except Exception as e:
-            messagebox.showerror("Execution Error", f"An error occurred:\n{e}")
+            error = e
+            print(f"Scan aborted: {e}")
+        finally:
+            connection.close()
+        self.writer.flush()
+        self.index_session([target_folder], target_folder)
+        elapsed = time.time() - start_time
+        print(f"Scan captured {captured} poses in {elapsed:.1f} sec")
+        if error is not None:
+            self.set_status(f"Status: Scan aborted after {captured} poses: {error}")
+        else:
+            self.set_status(f"Status: Scan complete ({captured}/{len(poses)} poses in {elapsed:.1f} sec).")
 
     def training_capture_loop(self):
         print("Starting training capture loop...")
-        self.status_label.config(text="Status: Capturing images...")
+        self.set_status("Status: Capturing images...")
         category = self.category_var.get()
         label_name = self.label_var.get()
         base_dir = "training_data"
         target_folder = create_folder_structure(base_dir, category, label_name)
-        self.status_label.config(text=f"Saving to {target_folder}")
+        self.set_status(f"Saving to {target_folder}")
 
         aug = self.get_aug_params()
         num_captures = int(aug["num_pictures"])
-        rotation_range = (aug["min_rotation"], aug["max_rotation"])
-        beta_range = (aug["min_beta"], aug["max_beta"])
-        alpha_range = (aug["min_alpha"], aug["max_alpha"])
-        zoom_range = (aug["min_zoom"], aug["max_zoom"])
-        frame_rate = aug["frame_rate"]
-        hue_range = (aug["min_hue"], aug["max_hue"])
-        sat_range = (aug["min_saturation"], aug["max_saturation"])
-        translate_range = (aug["min_translate"], aug["max_translate"])
-        shear_range = (aug["min_shear"], aug["max_shear"])
-        flip_prob = aug["flip_lr"]
-        interval = frame_rate / 1000.0
+        ranges = augmentation_ranges(aug)
+        interval = aug["frame_rate"] / 1000.0
 
         current_config = load_config(self.config_file)
         current_roi = current_config.get("current_roi", None)
+        batch_mode = self.batch_mode_var.get()
 
-        for i in range(num_captures):
+        # Extra cameras are captured as synchronized sets, each into its own camera-tagged folder.
+        cameras = [(self.camera_name, self.grabber, current_roi, (self.video_width, self.video_height))]
+        if self.extra_cameras:
+            if batch_mode:
+                print("Batch mode captures from the primary camera only.")
+            else:
+                cameras += [(cam["name"], cam["grabber"], cam["roi"], cam["size"]) for cam in self.extra_cameras]
+        multi_camera = len(cameras) > 1
+
+        # Every session gets its own seeded RNG and a manifest of the sampled parameters,
+        # so any output can be regenerated later from its raw frame.
+        seed = new_session_seed(current_config.get("training_settings", {}).get("seed"))
+        session_rng = random.Random(seed)
+        manifest_only = self.manifest_only_var.get()
+        print(f"Capture session seed: {seed}")
+
+        # The ROI doubles as the object box: it is carried through the same
+        # geometric transforms and written as a YOLO label next to each image.
+        # A labeled session is registered in data.yaml so it trains as is.
+        class_idx = None
+        write_labels = self.write_labels_var.get() and any(roi for _, _, roi, _ in cameras)
+        if write_labels and aug["context_margin"] <= 0:
+            # Without context the box is the whole crop, which teaches the model nothing.
+            print("Label Context Margin is 0; capturing without YOLO labels.")
+            self.set_status("Status: Label Context Margin is 0, so no YOLO labels are written.")
+            write_labels = False
+        if write_labels:
+            try:
+                class_idx = update_yaml_file(label_name, yaml_path=DEFAULT_DATA_YAML)
+                register_training_folder(target_folder, yaml_path=DEFAULT_DATA_YAML)
+            except Exception as e:
+                self.set_status(f"Status: Could not update {DEFAULT_DATA_YAML}: {e}")
+                return
+        streams = []
+        for name, _, roi, display_size in cameras:
+            folder = os.path.join(target_folder, name) if multi_camera else target_folder
+            os.makedirs(folder, exist_ok=True)
+            if manifest_only or batch_mode:
+                os.makedirs(os.path.join(folder, RAW_FOLDER), exist_ok=True)
+            # Only labeled captures are widened for context; plain captures crop the exact ROI.
+            crop_roi, label_box = roi, None
+            if roi and class_idx is not None:
+                crop_roi, label_box = expand_roi(roi, aug["context_margin"], display_size)
+            manifest = AugmentationManifest(folder, {
+                "seed": seed,
+                "camera": name,
+                "label": label_name,
+                "label_box": label_box,
+                "class_idx": class_idx,
+                "ranges": ranges,
+                "replayable": bool(manifest_only or batch_mode),
+                "created": datetime.datetime.now().isoformat(),
+            })
+            streams.append(CaptureStream(name, folder, crop_roi, display_size, label_box, class_idx, manifest))
+
+        # Optionally drop blurry frames and near-duplicates before they are augmented and saved.
+        gate = None
+        if self.quality_gate_var.get():
+            gate = FrameQualityGate(aug["min_sharpness"], int(aug["max_hash_distance"]))
+
+        sync = None
+        if all(grabber is not None for _, grabber, _, _ in cameras):
+            tolerance = current_config.get("camera_settings", {}).get("sync_tolerance_ms", 20) / 1000.0
+            sync = SynchronizedGrabbers([grabber for _, grabber, _, _ in cameras], max_skew=tolerance)
+
+        try:
+            if batch_mode:
+                stream = streams[0]
+                self.batch_capture_loop(stream.folder, label_name, num_captures, int(aug["raw_frames"]),
+                                        ranges, interval, stream.roi, stream.label_box, stream.class_idx,
+                                        session_rng, stream.manifest, manifest_only, gate)
+            else:
+                self.serial_capture_loop(streams, sync, label_name, num_captures, ranges, interval,
+                                         session_rng, manifest_only, gate)
+        finally:
+            for stream in streams:
+                stream.manifest.close()
+        if gate is not None:
+            print(f"Quality gate: {gate.summary()}")
+        if sync is not None and multi_camera:
+            print(f"Dropped {sync.dropped_sets} frame sets outside the {sync.max_skew * 1000:.0f} ms sync tolerance")
+        self.index_session([stream.folder for stream in streams], target_folder)
+        print("Training capture loop complete.")
+
+    def index_session(self, folders, session_folder):
+        """Record a finished session's images and labels in the dataset index."""
+        try:
+            index = open_dataset_index(DEFAULT_DATA_YAML)
+            session = index.rel(session_folder)
+            added = sum(index.sync_folder(folder, session=session)[0] for folder in folders)
+            index.close()
+            print(f"Indexed {added} images from session {session}")
+        except Exception as e:
+            print(f"Could not update the dataset index: {e}")
+
+    def serial_capture_loop(self, streams, sync, label_name, num_captures, ranges, interval,
+                            session_rng, manifest_only, gate=None):
+        """Capture, augment and queue one image per camera frame set, paced by the frame rate.
+
+        With several cameras each stream is augmented and queued on its own
+        thread; the quality gate judges the set by the primary camera's crop.
+        """
+        written_before = self.writer.stats()["written"]
+        last_sequence = 0
+        i = 0
+        max_attempts = num_captures * MAX_ATTEMPTS_PER_IMAGE if gate is not None else num_captures
+        pool = ThreadPoolExecutor(max_workers=len(streams)) if len(streams) > 1 else None
+        try:
+            for _ in range(max_attempts):
+                if not self.running or i >= num_captures:
+                    break
+                start_time = time.time()
+                # Wait for a frame set newer than the last one used so no image is saved twice.
+                if sync is not None:
+                    frames, skew, last_sequence = sync.wait_for_set(last_sequence, timeout=1.0)
+                else:
+                    frames, skew = None, 0.0
+                if frames is None:
+                    print("Frame read failed at iteration", i)
+                    continue
+                print(f"Iteration {i}: Frame captured in {time.time()-start_time:.3f} sec"
+                      + (f" (camera skew {skew * 1000:.1f} ms)" if len(frames) > 1 else ""))
+
+                # 1. Crop to ROI (plus context margin) in sensor coordinates; only the crop is resampled.
+                crops = [crop_roi_native(frame, stream.roi, stream.display_size)
+                         for frame, stream in zip(frames, streams)]
+                if gate is not None:
+                    accepted, reason = gate.check(crops[0])
+                    if not accepted:
+                        # Rejected frames are not paced; the next camera frame is tried right away.
+                        print(f"Iteration {i}: Frame rejected, {reason}")
+                        self.set_status(f"Status: {gate.summary()}")
+                        continue
+
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+                base_name = f"{label_name}_{i}_{timestamp}"
+                # Seeds are drawn in stream order so the session stays reproducible.
+                jobs = [(stream, cropped, session_rng.getrandbits(32)) for stream, cropped in zip(streams, crops)]
+                if pool is not None:
+                    outputs = list(pool.map(lambda job: self.emit_capture(*job, base_name, ranges, manifest_only), jobs))
+                else:
+                    outputs = [self.emit_capture(*jobs[0], base_name, ranges, manifest_only)]
+                self.proc_preview.submit(outputs[0])
+                elapsed = time.time() - start_time
+                print(f"Iteration {i} took {elapsed:.3f} sec")
+                i += 1
+                time.sleep(max(0, interval - elapsed))
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+        self.writer.flush()
+        stats = self.writer.stats()
+        status = f"Status: Training capture complete ({stats['written'] - written_before} images"
+        if gate is not None:
+            status += f"; {gate.summary()}"
+        self.set_status(status + ").")
+        print(f"Writer: {stats['written']} written, {stats['failed']} failed, "
+              f"{stats['blocked_submits']} blocked submits ({stats['blocked_seconds']:.3f} sec), "
+              f"max queue depth {stats['max_depth']}")
+
+    def emit_capture(self, stream, cropped, image_seed, base_name, ranges, manifest_only):
+        """Augment one ROI crop for `stream` and queue the image, label and manifest line.
+
+        Returns the frame to preview. Safe to call from several threads at once.
+        """
+        crop_h, crop_w = cropped.shape[:2]
+        # 2. Sample this image's parameters from its own seed so it can be replayed.
+        params = sample_augmentation_params((crop_w, crop_h), ranges, random.Random(image_seed))
+        raw_name = None
+        if manifest_only:
+            # Keep only the lossless raw crop; augmented images are materialized by replay.
+            raw_name = os.path.join(RAW_FOLDER, base_name + ".png")
+            self.writer.submit(os.path.join(stream.folder, raw_name), cropped)
+            if stream.label_box is not None:
+                # Raw frames sit inside the registered session folder, so they need labels too.
+                rows = box_label_rows(stream.label_box, (crop_w, crop_h), stream.class_idx)
+                self.writer.submit_text(os.path.splitext(os.path.join(stream.folder, raw_name))[0] + ".txt",
+                                        format_yolo_rows(rows))
+            output = cropped
+        else:
+            # 3. Photometric LUTs, then zoom/translate/shear/flip/rotate in a single warp.
+            output = render_augmentation(cropped, params)
+            filename = os.path.join(stream.folder, base_name + self.image_ext)
+            self.writer.submit(filename, output)
+            if stream.label_box is not None:
+                rows = yolo_label_rows(params, (crop_w, crop_h), stream.label_box, stream.class_idx)
+                self.writer.submit_text(os.path.splitext(filename)[0] + ".txt", format_yolo_rows(rows))
+        stream.manifest.append(manifest_record(base_name + self.image_ext, image_seed, params, raw_name))
+        print(f"Queued {stream.name} image {base_name} ({crop_w}x{crop_h}, zoom {params['zoom']:.2f}, "
+              f"rotation {params['angle']:.2f}°)")
+        return output
+
+    def batch_capture_loop(self, target_folder, label_name, num_captures, num_raw, ranges, interval, roi,
+                           label_box, class_idx, session_rng, manifest, manifest_only, gate=None):
+        """Grab a few raw ROI frames, then augment and encode all outputs on a process pool."""
+        raw_frames = []
+        last_sequence = 0
+        num_raw = min(num_raw, num_captures)
+        max_attempts = num_raw * MAX_ATTEMPTS_PER_IMAGE if gate is not None else num_raw
+        for k in range(max_attempts):
             if not self.running:
+                return
+            if len(raw_frames) >= num_raw:
                 break
             start_time = time.time()
-            ret, frame = (self.cap.read() if self.cap is not None else (False, None))
-            if not ret:
-                print("Frame read failed at iteration", i)
-                continue
-            frame = cv2.resize(frame, (self.video_width, self.video_height))
-            print(f"Iteration {i}: Frame captured in {time.time()-start_time:.3f} sec")
-
-            # 1. Crop to ROI if defined; otherwise use full frame.
-            if current_roi:
-                x1, y1, x2, y2 = current_roi
-                x1 = max(0, x1)
-                y1 = max(0, y1)
-                x2 = min(self.video_width, x2)
-                y2 = min(self.video_height, y2)
-                cropped = frame[y1:y2, x1:x2]
+            if self.grabber is not None:
+                frame, _, last_sequence = self.grabber.wait_for_frame(last_sequence, timeout=1.0)
             else:
-                cropped = frame
+                frame = None
+            if frame is None:
+                print("Frame read failed at raw frame", k)
+                continue
+            cropped = crop_roi_native(frame, roi, (self.video_width, self.video_height))
+            if gate is not None:
+                accepted, reason = gate.check(cropped)
+                if not accepted:
+                    print(f"Raw frame rejected, {reason}")
+                    continue
+            raw_frames.append(np.ascontiguousarray(cropped))
+            self.set_status(f"Status: Grabbed raw frame {len(raw_frames)}/{num_raw}")
+            time.sleep(max(0, interval - (time.time() - start_time)))
+        if not raw_frames:
+            self.set_status("Status: No frames captured.")
+            return
 
-            # 2. Apply zoom on the cropped image.
-            zoom_factor = random.uniform(*zoom_range)
-            if zoom_factor < 0.001:
-                zoomed = cropped
-            else:
-                crop_h, crop_w = cropped.shape[:2]
-                center = (crop_w // 2, crop_h // 2)
-                zoomed = apply_zoom_centered(cropped, zoom_factor, center=center)
-                print(f"Iteration {i}: Cropped ROI size ({crop_w}x{crop_h}), Zoom factor: {zoom_factor:.2f}")
-
-            # 3. Brightness/contrast adjustment.
-            varied, used_alpha, used_beta = random_variation(zoomed, alpha_range=alpha_range, beta_range=beta_range)
-            # 4. Hue and saturation adjustment.
-            hue_shift = random.uniform(*hue_range)
-            sat_scale = random.uniform(*sat_range)
-            hsv_adjusted = apply_hsv_adjustment(varied, hue_shift, sat_scale)
-            # 5. Translation.
-            translated = apply_translation(hsv_adjusted, translate_range)
-            # 6. Shear.
-            shear_val = random.uniform(*shear_range)
-            sheared = apply_shear(translated, shear_val)
-            # 7. Horizontal flip.
-            flipped = apply_flip(sheared, flip_prob)
-            # 8. Rotation.
-            rotated, used_angle = apply_random_rotation(flipped, rotation_range)
-            proc_frame = rotated
-
-            proc_disp = cv2.resize(proc_frame, (self.video_width, self.video_height))
-            proc_rgb = cv2.cvtColor(proc_disp, cv2.COLOR_BGR2RGB)
-            self.update_image(self.proc_label, proc_rgb, (self.video_width, self.video_height))
-
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = os.path.join(target_folder, f"{label_name}_{i}_{timestamp}.jpg")
-            cv2.imwrite(filename, proc_frame)
-            print(f"Saved image {i} to {filename} (Rotation: {used_angle:.2f}°)")
-            elapsed = time.time() - start_time
-            print(f"Iteration {i} took {elapsed:.3f} sec")
-            time.sleep(max(0, interval - elapsed))
-
-        self.status_label.config(text="Status: Training capture complete.")
-        print("Training capture loop complete.")
+        self.proc_preview.submit(raw_frames[-1])
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        # The raw frames are few and lossless, so they are always kept for replay.
+        raw_names = []
+        for k, raw_frame in enumerate(raw_frames):
+            raw_names.append(os.path.join(RAW_FOLDER, f"{label_name}_raw{k}_{timestamp}.png"))
+            self.writer.submit(os.path.join(target_folder, raw_names[-1]), raw_frame)
+            if label_box is not None:
+                h, w = raw_frame.shape[:2]
+                self.writer.submit_text(os.path.splitext(os.path.join(target_folder, raw_names[-1]))[0] + ".txt",
+                                        format_yolo_rows(box_label_rows(label_box, (w, h), class_idx)))
+
+        write_params = imwrite_params(self.image_ext, self.output_settings["jpeg_quality"],
+                                      self.output_settings["png_compression"])
+        jobs = [(i % len(raw_frames), session_rng.getrandbits(32), ranges,
+                 os.path.join(target_folder, f"{label_name}_{i}_{timestamp}{self.image_ext}"), write_params,
+                 label_box, class_idx)
+                for i in range(num_captures)]
+
+        if manifest_only:
+            for frame_index, seed, _, filename, _, _, _ in jobs:
+                h, w = raw_frames[frame_index].shape[:2]
+                params = sample_augmentation_params((w, h), ranges, random.Random(seed))
+                manifest.append(manifest_record(os.path.basename(filename), seed, params, raw_names[frame_index]))
+            self.writer.flush()
+            self.set_status(f"Status: Manifest written for {len(jobs)} images.")
+            return
+
+        workers = batch_worker_count()
+        chunksize = max(1, len(jobs) // (workers * 8))
+        report_every = max(1, len(jobs) // 100)
+        print(f"Augmenting {len(jobs)} images from {len(raw_frames)} raw frames on {workers} workers")
+
+        start_time = time.time()
+        done = 0
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                       initargs=(raw_frames,))
+        try:
+            for job, params in zip(jobs, executor.map(_batch_augment_worker, jobs, chunksize=chunksize)):
+                frame_index, seed, _, filename = job[:4]
+                manifest.append(manifest_record(os.path.basename(filename), seed, params, raw_names[frame_index]))
+                done += 1
+                if not self.running:
+                    break
+                if done % report_every == 0 or done == len(jobs):
+                    rate = done / max(time.time() - start_time, 1e-6)
+                    self.set_status(f"Status: Augmented {done}/{len(jobs)} ({rate:.0f} img/s)")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self.writer.flush()
+        print(f"Batch augmentation wrote {done} images in {time.time() - start_time:.2f} sec")
+        self.set_status(f"Status: Training capture complete ({done} images).")
 
     def save_training_settings(self):
         aug_params = {}
         for key, slider in self.aug_sliders.items():
             aug_params[key] = slider.get()
+        aug_params["batch_mode"] = self.batch_mode_var.get()
+        aug_params["write_labels"] = self.write_labels_var.get()
+        aug_params["manifest_only"] = self.manifest_only_var.get()
+        aug_params["quality_gate"] = self.quality_gate_var.get()
         self.config_data["training_settings"] = aug_params
         save_config(self.config_data, self.config_file)
         self.status_label.config(text="Status: Training settings saved.")
@@ -611,13 +1392,35 @@ class TrainingApp(tk.Tk):
     def on_close(self):
         print("Closing application...")
         self.running = False
+        self.raw_preview.stop()
+        self.proc_preview.stop()
         if self.training_thread and self.training_thread.is_alive():
             self.training_thread.join(timeout=2)
-        if self.cap is not None:
+        # Flush queued images before tearing down. A capture thread still running after
+        # the join timeout has its remaining submits dropped instead of failing.
+        self.writer.close()
+        if self.grabber is not None:
+            self.grabber.release()
+        elif self.cap is not None:
             self.cap.release()
+        for camera in self.extra_cameras:
+            camera["grabber"].release()
         self.destroy()
 
 if __name__ == "__main__":
-    app = TrainingApp(config_file="maintenance.json")
-    app.protocol("WM_DELETE_WINDOW", app.on_close)
-    app.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Training image capture")
+    parser.add_argument("--replay", metavar="MANIFEST",
+                        help="regenerate augmented images from a capture manifest and exit")
+    parser.add_argument("--out", help="output folder for --replay (default: the manifest's folder)")
+    parser.add_argument("--source", help="camera index, video file, image folder or 'synthetic[:WxH]' "
+                                         "(default: camera_settings in maintenance.json)")
+    args = parser.parse_args()
+    if args.replay:
+        output_settings = load_output_settings(load_config("maintenance.json"))
+        count = replay_manifest(args.replay, args.out, output_settings["jpeg_quality"],
+                                output_settings["png_compression"])
+        print(f"Replayed {count} images from {args.replay}")
+    else:
+        app = TrainingApp(config_file="maintenance.json", source=args.source)
+        app.protocol("WM_DELETE_WINDOW", app.on_close)
+        app.mainloop()
\ No newline at end of file
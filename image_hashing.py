@@ -0,0 +1,159 @@
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+#####################
+# Perceptual Hashes
+#####################
+
+def to_gray(image):
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+def dhash(image, hash_size=8):
+    """Difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale copy.
+
+    Returns an int of hash_size * hash_size bits. Small changes in lighting,
+    noise or compression flip only a few bits, so near-identical images have
+    a small Hamming distance.
+    """
+    small = cv2.resize(to_gray(image), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+def hamming(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+def phash(image, hash_size=8, highfreq_factor=4):
+    """Perceptual hash: signs of the lowest DCT frequencies of a small grayscale copy.
+
+    More robust than dhash to rescaling, blur and mild contrast changes,
+    which is what augmentation produces. Returns an int of
+    hash_size * hash_size bits.
+    """
+    size = hash_size * highfreq_factor
+    small = cv2.resize(to_gray(image), (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size]
+    bits = low > np.median(low)
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+def file_hashes(path):
+    """(dhash, phash) of an image file, or None if it cannot be read.
+
+    The image is decoded at a quarter of its size in grayscale; both hashes
+    look at 32x32 pixels or fewer, so full resolution is wasted work.
+    """
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    return dhash(image), phash(image)
+
+def hash_files(paths, num_threads=4, cache=None):
+    """Return {path: (dhash, phash)} for every readable image, hashing on a thread pool.
+
+    With a ThumbnailCache the hashes are kept as "hashes" entries, so an
+    unchanged folder is hashed only once.
+    """
+    def lookup(path):
+        if cache is not None:
+            found, _, meta = cache.get(path, "hashes")
+            if found and meta:
+                return path, (meta["dhash"], meta["phash"])
+        hashes = file_hashes(path)
+        if hashes is not None and cache is not None:
+            cache.put(path, None, "hashes", {"dhash": hashes[0], "phash": hashes[1]})
+        return path, hashes
+
+    with ThreadPoolExecutor(max_workers=max(1, int(num_threads))) as pool:
+        results = dict(pool.map(lookup, paths))
+    if cache is not None:
+        cache.commit()
+    return {path: hashes for path, hashes in results.items() if hashes is not None}
+
+#####################
+# Near-Duplicate Search
+#####################
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance.
+
+    Each child edge is labeled with its distance to the parent, so a radius
+    search only descends into children whose label is within the radius of
+    the query's distance to the parent (triangle inequality). Lookups cost a
+    small fraction of a linear scan for tight radii.
+    """
+
+    def __init__(self):
+        self.root = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """Return [(distance, item)] for every item within max_distance of value."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+def find_duplicate_clusters(hashes, max_distance=8):
+    """Group keys of `hashes` ({key: hash}) whose hashes are within max_distance bits.
+
+    Near-duplicate links are found through a BK-tree and joined with
+    union-find, so a chain of small differences ends up in one cluster.
+    Returns clusters of two or more keys, largest first, each in key order.
+    """
+    tree = BKTree()
+    for key, value in hashes.items():
+        tree.add(value, key)
+    parent = {key: key for key in hashes}
+
+    def root(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for key, value in hashes.items():
+        for _, other in tree.search(value, max_distance):
+            a, b = root(key), root(other)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+    clusters = {}
+    for key in hashes:
+        clusters.setdefault(root(key), []).append(key)
+    groups = [sorted(group) for group in clusters.values() if len(group) > 1]
+    return sorted(groups, key=lambda group: (-len(group), group[0]))
+
+def removal_flags(cluster, hashes, max_distance=8):
+    """One flag per key of `cluster`: True if it is a near-duplicate of the first (kept) key.
+
+    Clusters are chained, so their far end may differ from the kept image by
+    much more than max_distance; only keys within max_distance of it are flagged.
+    """
+    keep = hashes[cluster[0]]
+    return [position > 0 and hamming(hashes[key], keep) <= max_distance for position, key in enumerate(cluster)]
@@ -2,20 +2,28 @@ import os
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from tkinter import font as tkFont
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image, ImageTk
 import cv2
 import numpy as np
-import yaml
 import shutil
 import json
-import torch  # For YOLOv5
 import warnings
 import threading
+import time
+from yolo_dataset import class_registry, write_yolo_label
+from dataset_index import open_dataset_index
+from auto_labeling import (BatchedYoloLabeler, DEFAULT_BATCH_SIZE, DEFAULT_DECODE_THREADS, ParallelCannyLabeler,
+                           PredictionStore, class_name, filter_detections)
+from thumbnail_cache import ThumbnailCache, fit_thumbnail
+from gallery_view import VirtualGallery
+from image_hashing import find_duplicate_clusters, hash_files, removal_flags
+from image_viewport import MAX_ZOOM, ImagePrefetcher
 
 warnings.filterwarnings("ignore", category=FutureWarning)  # Suppress AMP deprecation warning temporarily
 
 # Determine the project root directory (where this script is located)
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+YOLO_VARIANT = "yolo"  # Thumbnail cache entry holding the latest YOLO overlay of an image
 
 def load_labeling_settings(config_file=os.path.join(PROJECT_ROOT, "maintenance.json")):
     try:
@@ -26,49 +34,6 @@ def load_labeling_settings(config_file=os.path.join(PROJECT_ROOT, "maintenance.j
         print("Error loading settings:", e)
         return {}, {}
 
-def update_yaml_file(new_label, yaml_path="data.yaml"):
-    """Update YAML file with new label and return label index.
-    Creates the file if it doesn't exist.
-    """
-    # Default data structure with relative paths
-    data = {
-        "train": "yolo_training_data/images",
-        "val": "yolo_training_data/images", 
-        "nc": 0,
-        "names": []
-    }
-    
-    # Load existing YAML file if it exists
-    if os.path.exists(yaml_path):
-        try:
-            with open(yaml_path, "r") as f:
-                loaded_data = yaml.safe_load(f)
-                if loaded_data:  # Check if data was actually loaded
-                    data = loaded_data
-        except Exception as e:
-            print(f"Error loading YAML file: {e}")
-    
-    # Ensure names list exists
-    if "names" not in data:
-        data["names"] = []
-    
-    # Add new label if it doesn't exist
-    if new_label not in data["names"]:
-        data["names"].append(new_label)
-        # Update number of classes
-        data["nc"] = len(data["names"])
-        
-        # Write updated data back to file
-        try:
-            with open(yaml_path, "w") as f:
-                yaml.dump(data, f, default_flow_style=False)
-            print(f"Updated YAML file with label: {new_label}")
-        except Exception as e:
-            print(f"Error writing YAML file: {e}")
-    
-    # Return index of the label
-    return data["names"].index(new_label)
-
 class ImageLabelingApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -92,7 +57,13 @@ class ImageLabelingApp(tk.Tk):
         self.image_path = None
         self.original_image = None
         self.display_image = None
+        self.pyramid = None
         self.zoom_factor = 1.0
+        # Image point shown at the canvas center; the ROI, hulls and points are kept in image coordinates.
+        self.view_center = (0.0, 0.0)
+        self.image_offset_x = 0
+        self.image_offset_y = 0
+        self.pan_start = None
         self.roi = None
         self.hull_points = []
         self.points = []
@@ -106,8 +77,14 @@ class ImageLabelingApp(tk.Tk):
         self.padding_factor = tk.DoubleVar(value=0.1)  # Default padding factor of 10%
         self.model = None  # Will store the loaded YOLO model
         
-        # This will hold gallery results (each item: dict with keys "path", "thumbnail", "bbox")
+        # This will hold gallery results (each item: dict with keys "path", "variant", "bbox")
+        # The thumbnails themselves stay in the thumbnail cache under "variant".
         self.gallery_results = []
+        self.canny_job = None  # Background Canny auto-label run, if any
+        # On-disk thumbnails shared by the auto-label galleries and the folder preview
+        self.thumbnail_cache = ThumbnailCache.from_settings(self.labeling_settings)
+        self.prefetcher = ImagePrefetcher.from_settings(self.labeling_settings)
+        self.dataset_index = None  # Opened on first save
         
         self.create_widgets()
         # Preload the YOLO model in the background.
@@ -152,6 +129,17 @@ class ImageLabelingApp(tk.Tk):
         self.padding_slider.pack(side=tk.LEFT, padx=5)
         tk.Label(padding_frame, text="Adjust padding for YOLO bounding boxes", bg="gray", fg="white", font=self.custom_font).pack(side=tk.LEFT, padx=5)
         
+        detection_frame = tk.Frame(self, bg="gray")
+        detection_frame.pack(side=tk.TOP, pady=5)
+        tk.Label(detection_frame, text="YOLO Min Confidence:", bg="gray", fg="white", font=self.custom_font).pack(side=tk.LEFT, padx=5)
+        self.conf_slider = tk.Scale(detection_frame, from_=0.0, to=1.0, orient=tk.HORIZONTAL, resolution=0.01, font=self.custom_font)
+        self.conf_slider.set(self.labeling_settings.get("yolo_conf_threshold", 0.25))
+        self.conf_slider.pack(side=tk.LEFT, padx=5)
+        tk.Label(detection_frame, text="NMS IoU:", bg="gray", fg="white", font=self.custom_font).pack(side=tk.LEFT, padx=5)
+        self.iou_slider = tk.Scale(detection_frame, from_=0.0, to=1.0, orient=tk.HORIZONTAL, resolution=0.01, font=self.custom_font)
+        self.iou_slider.set(self.labeling_settings.get("yolo_iou_threshold", 0.45))
+        self.iou_slider.pack(side=tk.LEFT, padx=5)
+        
         bbox_frame = tk.Frame(self, bg="gray")
         bbox_frame.pack(side=tk.TOP, pady=5)
         tk.Label(bbox_frame, text="Min Bounding Box Area:", bg="gray", fg="white", font=self.custom_font).pack(side=tk.LEFT, padx=5)
@@ -162,6 +150,11 @@ class ImageLabelingApp(tk.Tk):
         extra_btn_frame = tk.Frame(self, bg="gray")
         extra_btn_frame.pack(side=tk.TOP, pady=5)
         tk.Button(extra_btn_frame, text="Save Domino Edge Data", command=self.save_domino_edge_data, font=self.custom_font).pack(side=tk.LEFT, padx=5)
+        tk.Button(extra_btn_frame, text="Find Duplicates", command=self.find_duplicates, font=self.custom_font).pack(side=tk.LEFT, padx=5)
+        # Auto-labeling leaves out images that already have a label in yolo_training_data.
+        self.skip_labeled_var = tk.BooleanVar(value=self.labeling_settings.get("skip_labeled", True))
+        tk.Checkbutton(extra_btn_frame, text="Only Unlabeled Images", variable=self.skip_labeled_var, bg="gray",
+                       font=self.custom_font).pack(side=tk.LEFT, padx=5)
         
         self.canvas = tk.Canvas(self, bg="black")
         self.canvas.pack(fill=tk.BOTH, expand=True)
@@ -171,8 +164,15 @@ class ImageLabelingApp(tk.Tk):
         self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
         self.canvas.bind("<Button-4>", self.on_mouse_wheel)
         self.canvas.bind("<Button-5>", self.on_mouse_wheel)
-        
-        tk.Button(self, text="Preview Gallery", command=lambda: self.show_gallery(gallery_only=True, title="Gallery"),
+        # Right or middle drag pans the view.
+        for button in (2, 3):
+            self.canvas.bind(f"<ButtonPress-{button}>", self.on_pan_start)
+            self.canvas.bind(f"<B{button}-Motion>", self.on_pan_drag)
+        self.canvas.bind("<Configure>", lambda e: self.update_display())
+        self.bind("<Left>", lambda e: self.on_arrow_key(e, self.prev_image))
+        self.bind("<Right>", lambda e: self.on_arrow_key(e, self.next_image))
+        
+        tk.Button(self, text="Preview Gallery", command=self.preview_gallery,
                   font=self.custom_font).pack(side=tk.BOTTOM, pady=5)
         
     def preload_yolo(self):
@@ -181,6 +181,7 @@ class ImageLabelingApp(tk.Tk):
             self.custom_weights_path = self.training_settings.get("model_weights", "yolov5s.pt")
             
             if self.model_type == "YOLOv5":
+                import torch  # Deferred so spawned pool workers do not load torch
                 self.model = torch.hub.load('ultralytics/yolov5', 'custom',
                                         path=self.custom_weights_path,
                                         force_reload=False)  # Prevent redownloading
@@ -197,6 +198,7 @@ class ImageLabelingApp(tk.Tk):
     def load_yolo_model(self, weights_path):
         try:
             if self.model_type == "YOLOv5":
+                import torch
                 self.model = torch.hub.load('ultralytics/yolov5', 'custom',
                                              path=weights_path,
                                              force_reload=True)
@@ -239,40 +241,75 @@ class ImageLabelingApp(tk.Tk):
             self.current_index += 1
             self.load_image(self.image_paths[self.current_index])
         
+    def on_arrow_key(self, event, step):
+        # Leave arrow keys to text fields.
+        if not isinstance(event.widget, (tk.Entry, ttk.Entry, ttk.Combobox)):
+            step()
+        
     def load_image(self, path):
         self.image_path = path
-        self.original_image = cv2.imread(path)
-        if self.original_image is None:
+        canvas_w, canvas_h = self.canvas_size()
+        self.prefetcher.set_fit_size(canvas_w, canvas_h)
+        try:
+            # Usually already decoded by the prefetcher; every zoom and pan renders from this pyramid.
+            pyramid = self.prefetcher.get(path)
+        except OSError:
+            pyramid = None
+        if pyramid is None:
             messagebox.showerror("Error", "Failed to load image.")
             return
-        self.zoom_factor = 1.0
+        self.pyramid = pyramid
+        # A reduced decode is enough to browse; the full image is read when it is analyzed or saved.
+        self.original_image = None if pyramid.reduced else pyramid.levels[0]
         self.roi = None
         self.hull_points = []
         self.points = []
-        h, w = self.original_image.shape[:2]
-        new_w = int(w * self.zoom_factor)
-        new_h = int(h * self.zoom_factor)
-        self.display_image = cv2.resize(self.original_image, (new_w, new_h))
+        w, h = pyramid.width, pyramid.height
+        self.zoom_factor = min(1.0, canvas_w / w, canvas_h / h)
+        self.view_center = (w / 2, h / 2)
         self.update_display()
+        if 0 <= self.current_index < len(self.image_paths) and self.image_paths[self.current_index] == path:
+            self.prefetcher.prefetch(self.image_paths, self.current_index)
         
-    def update_display(self):
-        if self.display_image is None:
-            return
-        image_rgb = cv2.cvtColor(self.display_image, cv2.COLOR_BGR2RGB)
-        self.photo = ImageTk.PhotoImage(Image.fromarray(image_rgb))
-        self.canvas.delete("all")
+    def full_image(self):
+        if self.original_image is None and self.image_path is not None:
+            self.original_image = cv2.imread(self.image_path)
+        return self.original_image
+        
+    def canvas_size(self):
         canvas_w = self.canvas.winfo_width()
         canvas_h = self.canvas.winfo_height()
         if canvas_w < 50 or canvas_h < 50:
             canvas_w, canvas_h = 800, 600
-        center_x = canvas_w // 2
-        center_y = canvas_h // 2
-        self.image_offset_x = center_x - self.display_image.shape[1] // 2
-        self.image_offset_y = center_y - self.display_image.shape[0] // 2
-        self.canvas.create_image(center_x, center_y, image=self.photo, anchor="center")
+        return canvas_w, canvas_h
+        
+    def image_to_canvas(self, x, y):
+        return x * self.zoom_factor + self.image_offset_x, y * self.zoom_factor + self.image_offset_y
+        
+    def canvas_to_image(self, cx, cy):
+        w, h = self.pyramid.width, self.pyramid.height
+        x = (cx - self.image_offset_x) / self.zoom_factor
+        y = (cy - self.image_offset_y) / self.zoom_factor
+        return min(max(x, 0.0), w), min(max(y, 0.0), h)
+        
+    def update_display(self):
+        if self.pyramid is None:
+            return
+        canvas_w, canvas_h = self.canvas_size()
+        self.image_offset_x = canvas_w / 2 - self.view_center[0] * self.zoom_factor
+        self.image_offset_y = canvas_h / 2 - self.view_center[1] * self.zoom_factor
+        self.canvas.delete("all")
+        # Only the part of the image inside the canvas is resampled and converted.
+        rendered = self.pyramid.render(self.zoom_factor, self.image_offset_x, self.image_offset_y, canvas_w, canvas_h)
+        if rendered is not None:
+            self.display_image, tile_x, tile_y = rendered
+            image_rgb = cv2.cvtColor(self.display_image, cv2.COLOR_BGR2RGB)
+            self.photo = ImageTk.PhotoImage(Image.fromarray(image_rgb))
+            self.canvas.create_image(tile_x, tile_y, image=self.photo, anchor="nw")
         if self.roi:
-            self.canvas.create_rectangle(*self.roi, outline="red", width=2)
-            rx1, ry1, rx2, ry2 = self.roi
+            rx1, ry1 = self.image_to_canvas(*self.roi[:2])
+            rx2, ry2 = self.image_to_canvas(*self.roi[2:])
+            self.canvas.create_rectangle(rx1, ry1, rx2, ry2, outline="red", width=2)
             cx = (rx1 + rx2) // 2
             cy = (ry1 + ry2) // 2
             self.canvas.create_line(cx-10, cy-10, cx+10, cy+10, fill="red", width=3)
@@ -280,22 +317,44 @@ class ImageLabelingApp(tk.Tk):
         for hull in self.hull_points:
             if len(hull) > 1:
                 flat = []
-                for pt in hull:
-                    flat.extend(pt)
-                flat.extend(hull[0])
+                for pt in hull + [hull[0]]:
+                    flat.extend(self.image_to_canvas(*pt))
                 self.canvas.create_line(*flat, fill="yellow", width=2)
         for pt in self.points:
-            self.canvas.create_oval(pt[0]-3, pt[1]-3, pt[0]+3, pt[1]+3, fill="blue")
+            px, py = self.image_to_canvas(*pt)
+            self.canvas.create_oval(px-3, py-3, px+3, py+3, fill="blue")
         
     def on_mouse_wheel(self, event):
-        if hasattr(event, 'delta'):
-            self.zoom_factor *= 1.1 if event.delta > 0 else 0.9
+        if self.pyramid is None:
+            return
+        if hasattr(event, 'delta') and event.delta:
+            factor = 1.1 if event.delta > 0 else 0.9
         else:
-            self.zoom_factor *= 1.1 if event.num == 4 else 0.9
-        h, w = self.original_image.shape[:2]
-        new_w = int(w * self.zoom_factor)
-        new_h = int(h * self.zoom_factor)
-        self.display_image = cv2.resize(self.original_image, (new_w, new_h))
+            factor = 1.1 if event.num == 4 else 0.9
+        # Zoom about the cursor: the image point under it stays put.
+        w, h = self.pyramid.width, self.pyramid.height
+        canvas_w, canvas_h = self.canvas_size()
+        min_zoom = min(1.0, 0.5 * canvas_w / w, 0.5 * canvas_h / h)
+        x = (event.x - self.image_offset_x) / self.zoom_factor
+        y = (event.y - self.image_offset_y) / self.zoom_factor
+        self.zoom_factor = min(MAX_ZOOM, max(min_zoom, self.zoom_factor * factor))
+        self.view_center = (x - (event.x - canvas_w / 2) / self.zoom_factor,
+                            y - (event.y - canvas_h / 2) / self.zoom_factor)
+        self.update_display()
+        
+    def on_pan_start(self, event):
+        self.pan_start = (event.x, event.y)
+        
+    def on_pan_drag(self, event):
+        if self.pyramid is None or self.pan_start is None:
+            return
+        dx = event.x - self.pan_start[0]
+        dy = event.y - self.pan_start[1]
+        self.pan_start = (event.x, event.y)
+        w, h = self.pyramid.width, self.pyramid.height
+        cx = min(max(self.view_center[0] - dx / self.zoom_factor, 0.0), w)
+        cy = min(max(self.view_center[1] - dy / self.zoom_factor, 0.0), h)
+        self.view_center = (cx, cy)
         self.update_display()
         
     def on_button_press(self, event):
@@ -314,10 +373,10 @@ class ImageLabelingApp(tk.Tk):
         self.rect_id = self.canvas.create_rectangle(self.start_x, self.start_y, event.x, event.y, outline="red", width=2)
         
     def on_button_release(self, event):
-        if self.start_x is None or self.start_y is None:
+        if self.start_x is None or self.start_y is None or self.pyramid is None:
             return
-        x1, y1 = self.start_x, self.start_y
-        x2, y2 = event.x, event.y
+        x1, y1 = self.canvas_to_image(self.start_x, self.start_y)
+        x2, y2 = self.canvas_to_image(event.x, event.y)
         self.roi = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
         self.update_display()
         
@@ -325,15 +384,19 @@ class ImageLabelingApp(tk.Tk):
         if self.roi is None:
             messagebox.showwarning("Warning", "Please select an ROI by clicking and dragging on the image.")
             return
-        x1, y1, x2, y2 = self.roi
-        img_x1 = int(max(0, min(x1 - self.image_offset_x, self.display_image.shape[1])))
-        img_y1 = int(max(0, min(y1 - self.image_offset_y, self.display_image.shape[0])))
-        img_x2 = int(max(0, min(x2 - self.image_offset_x, self.display_image.shape[1])))
-        img_y2 = int(max(0, min(y2 - self.image_offset_y, self.display_image.shape[0])))
+        img_x1, img_y1, img_x2, img_y2 = (int(v) for v in self.roi)
         if img_x2 - img_x1 <= 0 or img_y2 - img_y1 <= 0:
             messagebox.showerror("Error", "ROI is invalid after conversion to image coordinates.")
             return
-        roi_image = self.display_image[img_y1:img_y2, img_x1:img_x2]
+        # Edges are found at the on-screen scale, as before, but only the ROI is resampled.
+        image = self.full_image()
+        if image is None:
+            messagebox.showerror("Error", "Failed to load image.")
+            return
+        roi_image = image[img_y1:img_y2, img_x1:img_x2]
+        zoom = self.zoom_factor
+        if zoom != 1.0:
+            roi_image = cv2.resize(roi_image, (max(1, int(roi_image.shape[1] * zoom)), max(1, int(roi_image.shape[0] * zoom))))
         th1 = self.canny_th1.get()
         th2 = self.canny_th2.get()
         gray = cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY)
@@ -346,9 +409,7 @@ class ImageLabelingApp(tk.Tk):
             hull_list = []
             for point in hull:
                 px, py = point[0]
-                canvas_x = int(px + img_x1 + self.image_offset_x)
-                canvas_y = int(py + img_y1 + self.image_offset_y)
-                hull_list.append((canvas_x, canvas_y))
+                hull_list.append((img_x1 + px / zoom, img_y1 + py / zoom))
             if hull_list:
                 self.hull_points.append(hull_list)
         self.update_display()
@@ -361,6 +422,7 @@ class ImageLabelingApp(tk.Tk):
         if confirm:
             try:
                 os.remove(self.image_path)
+                self.prefetcher.discard(self.image_path)
                 self.image_paths.remove(self.image_path)
                 if self.image_paths:
                     self.current_index = 0
@@ -368,6 +430,7 @@ class ImageLabelingApp(tk.Tk):
                 else:
                     self.original_image = None
                     self.display_image = None
+                    self.pyramid = None
                     self.canvas.delete("all")
                 messagebox.showinfo("Deleted", f"Deleted {self.image_path}")
             except Exception as e:
@@ -377,15 +440,19 @@ class ImageLabelingApp(tk.Tk):
         if self.image_path is None or self.roi is None:
             messagebox.showwarning("Warning", "No image loaded or ROI selected.")
             return
-        x1, y1, x2, y2 = self.roi
-        orig_x1 = int(max(0, (x1 - self.image_offset_x) / self.zoom_factor))
-        orig_y1 = int(max(0, (y1 - self.image_offset_y) / self.zoom_factor))
-        orig_x2 = int(min(self.original_image.shape[1], (x2 - self.image_offset_x) / self.zoom_factor))
-        orig_y2 = int(min(self.original_image.shape[0], (y2 - self.image_offset_y) / self.zoom_factor))
+        label = self.label_var.get().strip()
+        if not label:
+            messagebox.showwarning("Warning", "Enter a label for the image.")
+            return
+        orig_x1, orig_y1, orig_x2, orig_y2 = (int(v) for v in self.roi)
         if orig_x2 - orig_x1 <= 0 or orig_y2 - orig_y1 <= 0:
             messagebox.showerror("Error", "Invalid ROI for saving.")
             return
-        crop_img = self.original_image[orig_y1:orig_y2, orig_x1:orig_x2]
+        image = self.full_image()
+        if image is None:
+            messagebox.showerror("Error", "Failed to load image.")
+            return
+        crop_img = image[orig_y1:orig_y2, orig_x1:orig_x2]
         base_name = os.path.basename(self.image_path)
         gray_crop = cv2.cvtColor(crop_img, cv2.COLOR_BGR2GRAY)
         th1 = self.canny_th1.get()
@@ -411,43 +478,89 @@ class ImageLabelingApp(tk.Tk):
         labels_dir = os.path.join(save_folder, "labels")
         os.makedirs(images_dir, exist_ok=True)
         os.makedirs(labels_dir, exist_ok=True)
-        dest_img_path = os.path.join(images_dir, base_name)
+        yaml_path = os.path.join(PROJECT_ROOT, "data.yaml")
+        index = self.get_dataset_index(yaml_path)
+        dest_img_path = self.dataset_destination(index, self.image_path, images_dir)
+        base_name = os.path.basename(dest_img_path)
+        session = index.rel(os.path.dirname(self.image_path))
+        entry = index.lookup(dest_img_path)
         if not os.path.exists(dest_img_path):
+            if entry is not None:
+                index.remove(dest_img_path)
+                entry = None
             cv2.imwrite(dest_img_path, crop_img)
-        label_idx = update_yaml_file(self.label_var.get().strip(), yaml_path=os.path.join(PROJECT_ROOT, "data.yaml"))
         base_filename, _ = os.path.splitext(base_name)
         dest_txt_path = os.path.join(labels_dir, base_filename + ".txt")
-        if not os.path.exists(dest_txt_path):
-            with open(dest_txt_path, "w") as f:
-                f.write(f"{label_idx} {x_center_norm:.6f} {y_center_norm:.6f} {w_norm:.6f} {h_norm:.6f}\n")
+        if os.path.exists(dest_txt_path):
+            # Never overwrite a label file; index it if it was added by hand
+            if entry is None or not entry["labeled"]:
+                index.record_image(dest_img_path, dest_txt_path, session=session)
+            messagebox.showinfo("Already Saved", f"Training data already exists.\nImage: {dest_img_path}\n"
+                                                 f"Annotation: {dest_txt_path}")
+            return
+        try:
+            label_idx = class_registry(yaml_path).index(label)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not update {yaml_path}: {e}")
+            return
+        rows = [(label_idx, x_center_norm, y_center_norm, w_norm, h_norm)]
+        write_yolo_label(dest_txt_path, rows)
+        index.record_image(dest_img_path, dest_txt_path, rows, session=session)
         messagebox.showinfo("Saved", f"Training data saved.\nImage: {dest_img_path}\nAnnotation: {dest_txt_path}")
         
     def auto_label_folder(self):
         if not self.image_paths:
             messagebox.showwarning("Warning", "No images in the folder.")
             return
-        self.gallery_results = []
-        for path in self.image_paths:
-            img = cv2.imread(path)
-            if img is None:
-                continue
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            edges = cv2.Canny(gray, self.canny_th1.get(), self.canny_th2.get())
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if not contours:
-                continue
-            largest = max(contours, key=cv2.contourArea)
-            if cv2.contourArea(largest) < 100:
-                continue
-            overlay = img.copy()
-            hull = cv2.convexHull(largest)
-            cv2.drawContours(overlay, [hull], -1, (0, 255, 255), 2)
-            ratio = 200 / overlay.shape[1]
-            thumb = cv2.resize(overlay, (200, int(overlay.shape[0] * ratio)))
-            thumb_rgb = cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)
-            thumb_pil = Image.fromarray(thumb_rgb)
-            self.gallery_results.append({"path": path, "thumbnail": thumb_pil, "bbox": None})
-        self.show_gallery(gallery_only=True, title="Auto Label Report (Canny)")
+        if self.canny_job is not None and not self.canny_job.done:
+            messagebox.showinfo("Busy", "Canny auto-labeling is already running.")
+            return
+        paths = self.paths_to_label()
+        if not paths:
+            messagebox.showinfo("Up to date", "Every image in the folder is already labeled.")
+            return
+        results = self.gallery_results = []
+        # The folder is processed in chunks on a process pool; results stream into the gallery.
+        job = ParallelCannyLabeler(paths, self.canny_th1.get(), self.canny_th2.get(),
+                                   cache=self.thumbnail_cache)
+        self.canny_job = job
+        gallery_window = self.show_gallery(gallery_only=True, title="Auto Label Report (Canny)")
+        # Bound to this window's gallery and result list; opening another gallery must not redirect them.
+        gallery = gallery_window.gallery
+        progress_frame = ttk.Frame(gallery_window)
+        progress_frame.pack(side="top", fill="x", before=gallery_window.winfo_children()[0])
+        progress = ttk.Progressbar(progress_frame, mode="determinate", maximum=max(1, job.total))
+        progress.pack(side="left", fill="x", expand=True, padx=5, pady=5)
+        status_label = ttk.Label(progress_frame, text=f"0/{job.total}")
+        status_label.pack(side="left", padx=5)
+        cancel_button = ttk.Button(progress_frame, text="Cancel", command=job.cancel)
+        cancel_button.pack(side="left", padx=5)
+        job.start()
+        self.after(100, lambda: self.poll_canny_job(job, gallery_window, gallery, results, progress, status_label,
+                                                    cancel_button))
+        
+    def poll_canny_job(self, job, gallery_window, gallery, results, progress, status_label, cancel_button):
+        if not gallery_window.winfo_exists():
+            job.cancel()
+            return
+        # The job has already stored each overlay in the thumbnail cache; the gallery loads them on demand.
+        items = [{"path": path, "variant": job.variant, "bbox": bbox} for path, _, bbox in job.drain(max_items=500)]
+        if items:
+            results.extend(items)
+            gallery.add_items(items)
+        progress["value"] = job.processed
+        if job.done and job.pending() == 0:
+            state = "Cancelled" if job.cancelled else "Done"
+            elapsed = time.time() - job.start_time
+            status_label.config(text=f"{state}: {job.processed}/{job.total} images, "
+                                     f"{len(results)} labeled in {elapsed:.1f} s")
+            cancel_button.config(state="disabled")
+            return
+        eta = job.eta()
+        eta_text = f"ETA {int(eta) // 60}:{int(eta) % 60:02d}" if eta is not None else "ETA --:--"
+        status_label.config(text=f"{job.processed}/{job.total} ({job.rate():.0f} img/s, {eta_text})")
+        self.after(100, lambda: self.poll_canny_job(job, gallery_window, gallery, results, progress, status_label,
+                                                    cancel_button))
         
     def auto_label_with_yolo(self):
         if not self.image_paths:
@@ -471,6 +584,7 @@ class ImageLabelingApp(tk.Tk):
         if self.model is None:
             try:
                 if self.model_type == "YOLOv5":
+                    import torch
                     self.model = torch.hub.load('ultralytics/yolov5', 'custom',
                                             path=self.custom_weights_path,
                                             force_reload=False)  # Don't force reload
@@ -481,6 +595,11 @@ class ImageLabelingApp(tk.Tk):
                 messagebox.showerror("Error", f"Failed to load YOLO model: {e}")
                 return
 
+        paths = self.paths_to_label()
+        if not paths:
+            messagebox.showinfo("Up to date", "Every image in the folder is already labeled.")
+            return
+        
         self.auto_label_button.config(state="disabled")
         
         loading_window = tk.Toplevel(self)
@@ -490,29 +609,60 @@ class ImageLabelingApp(tk.Tk):
         progress.pack(padx=20, pady=20, fill="x")
         progress.start()
         
+        # Read the Tk settings here; the analysis thread must not touch widgets.
+        weights_path = self.custom_weights_path
+        conf_threshold = self.conf_slider.get()
+        iou_threshold = self.iou_slider.get()
+        
+        # Images are decoded once on a prefetch pool and run through the model in batches.
+        labeler = BatchedYoloLabeler(self.model, self.model_type,
+                                     img_size=self.training_settings.get("img_size", 640),
+                                     batch_size=self.labeling_settings.get("yolo_batch_size", DEFAULT_BATCH_SIZE),
+                                     decode_threads=self.labeling_settings.get("decode_threads", DEFAULT_DECODE_THREADS),
+                                     conf_threshold=conf_threshold, iou_threshold=iou_threshold)
+        min_area = self.min_bbox_area_slider.get()
+        padding = self.padding_factor.get()
+        names = getattr(self.model, "names", None)
+        
         def run_analysis():
             gallery_results = []
-            for path in self.image_paths:
-                img = cv2.imread(path)
-                if img is None:
-                    continue
-                if self.model_type == "YOLOv5":
-                    predictions = self.model(path)
-                    overlay = img.copy()
-                    if len(predictions.xyxy[0]) > 0:
-                        box = predictions.xyxy[0][0]
-                        x1, y1, x2, y2 = map(int, box[:4])
-                        if (x2 - x1) * (y2 - y1) < self.min_bbox_area_slider.get():
+            # Raw predictions are stored per image content and model, so only new or changed images are inferred.
+            store = PredictionStore()
+            try:
+                model_key = labeler.model_key(weights_path, store)
+                for path, img, shape, detections in labeler.run(paths, store=store, model_key=model_key):
+                    # Every box above the confidence threshold survives, after per-class NMS.
+                    kept = filter_detections(detections, conf_threshold, iou_threshold, min_area)
+                    if len(kept) == 0:
+                        continue
+                    # Boxes are drawn on the thumbnail only; full-size overlays are never kept.
+                    if img is not None:
+                        overlay = cv2.cvtColor(fit_thumbnail(img), cv2.COLOR_BGR2RGB)
+                    else:
+                        overlay = self.thumbnail_cache.thumbnail(path)
+                        if overlay is None:
                             continue
-                        bbox = self.compute_padded_bbox(img, x1, y1, x2, y2, self.padding_factor.get())
-                        cv2.rectangle(overlay, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(overlay, self.label_var.get(), (x1, y1-10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-                        gallery_results.append({
-                            "path": path,
-                            "thumbnail": Image.fromarray(cv2.cvtColor(overlay, cv2.COLOR_BGR2RGB)),
-                            "bbox": bbox
-                        })
+                    scale = overlay.shape[1] / shape[1]
+                    boxes = []
+                    for x1, y1, x2, y2, conf, cls in kept:
+                        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+                        name = class_name(names, cls)
+                        boxes.append((name, self.compute_padded_bbox(shape, x1, y1, x2, y2, padding)))
+                        tx1, ty1, tx2, ty2 = (int(v * scale) for v in (x1, y1, x2, y2))
+                        cv2.rectangle(overlay, (tx1, ty1), (tx2, ty2), (0, 255, 0), 1)
+                        cv2.putText(overlay, f"{name} {conf:.2f}", (tx1, max(10, ty1 - 3)),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.35, (0, 255, 0), 1)
+                    self.thumbnail_cache.put(path, overlay, YOLO_VARIANT)
+                    gallery_results.append({
+                        "path": path,
+                        "variant": YOLO_VARIANT,
+                        "bbox": boxes[0][1],
+                        "boxes": boxes
+                    })
+            except Exception as e:
+                print(f"YOLO auto-label error: {e}")
+            store.close()
+            self.thumbnail_cache.commit()
             self.gallery_results = gallery_results
             self.after(0, lambda: self.finish_yolo_analysis(loading_window))
         
@@ -523,8 +673,8 @@ class ImageLabelingApp(tk.Tk):
         self.auto_label_button.config(state="normal")
         self.show_gallery(gallery_only=True, title="Auto Label Report (YOLO)")
         
-    def compute_padded_bbox(self, img, x1, y1, x2, y2, padding_factor):
-        h_img, w_img = img.shape[:2]
+    def compute_padded_bbox(self, shape, x1, y1, x2, y2, padding_factor):
+        h_img, w_img = shape[:2]
         w = x2 - x1
         h = y2 - y1
         pad_w = int(w * padding_factor)
@@ -539,43 +689,36 @@ class ImageLabelingApp(tk.Tk):
         h_norm = (y2 - y1) / h_img
         return x_center_norm, y_center_norm, w_norm, h_norm
         
-    def show_gallery(self, gallery_only=False, title="Gallery"):
+    def show_gallery(self, gallery_only=False, title="Gallery", items=None, selected=True):
         gallery_window = tk.Toplevel(self)
         gallery_window.title(title)
         gallery_window.geometry("800x600")
-        container = ttk.Frame(gallery_window)
-        container.pack(fill="both", expand=True)
-        canvas = tk.Canvas(container)
-        scrollbar = ttk.Scrollbar(container, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-        
-        self.gallery_vars = []
-        for idx, item in enumerate(self.gallery_results):
-            frame = ttk.Frame(scrollable_frame, relief="ridge", borderwidth=2)
-            frame.grid(row=idx // 3, column=idx % 3, padx=5, pady=5)
-            thumb = item["thumbnail"].resize((200, 200))
-            photo = ImageTk.PhotoImage(thumb)
-            lbl = ttk.Label(frame, image=photo)
-            lbl.image = photo
-            lbl.pack()
-            var = tk.BooleanVar(value=True)
-            chk = ttk.Checkbutton(frame, text="Save", variable=var)
-            chk.pack()
-            self.gallery_vars.append((var, item))
+        # Only the rows in view have widgets; thumbnails load from the cache as they scroll in.
+        gallery = VirtualGallery(gallery_window, self.thumbnail_cache, on_open=self.open_from_gallery)
+        gallery.pack(fill="both", expand=True)
+        gallery.add_items(self.gallery_results if items is None else items, selected=selected)
+        # Each window keeps its own gallery; self.gallery_view is only the most recent one.
+        gallery_window.gallery = self.gallery_view = gallery
         
         save_btn = ttk.Button(gallery_window, text="Save Selected",
-                              command=lambda: self.save_selected_from_gallery(gallery_window))
+                              command=lambda: self.save_selected_from_gallery(gallery_window, gallery))
         save_btn.pack(pady=10)
+        return gallery_window
+        
+    def preview_gallery(self):
+        if self.gallery_results or not self.image_paths:
+            self.show_gallery(gallery_only=True, title="Gallery")
+            return
+        # No auto-label results yet: browse the folder itself, unselected, with plain thumbnails.
+        self.show_gallery(gallery_only=True, title=f"Gallery - {self.image_folder}",
+                          items=[{"path": path, "bbox": None} for path in self.image_paths], selected=False)
+        
+    def open_from_gallery(self, path):
+        if path in self.image_paths:
+            self.current_index = self.image_paths.index(path)
+            self.load_image(path)
         
-    def save_selected_from_gallery(self, gallery_window):
+    def save_selected_from_gallery(self, gallery_window, gallery):
         save_folder = os.path.join(PROJECT_ROOT, "yolo_training_data")
         images_dir = os.path.join(save_folder, "images")
         labels_dir = os.path.join(save_folder, "labels")
@@ -585,49 +728,221 @@ class ImageLabelingApp(tk.Tk):
         # Make sure the data.yaml file exists
         yaml_path = os.path.join(PROJECT_ROOT, "data.yaml")
         
+        # The predicted classes are registered in one data.yaml write; lookups are then in memory.
+        # The Label field only names images without YOLO boxes, and is registered when one is saved.
+        selected = gallery.selected_items()
+        registry = class_registry(yaml_path)
+        label = self.label_var.get().strip()
+        if not label and any(not item.get("boxes") for item in selected):
+            messagebox.showwarning("Warning", "Enter a label for the selected images.")
+            return
+        try:
+            registry.add([name for item in selected for name, _ in item.get("boxes") or []])
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not update {yaml_path}: {e}")
+            return
+        
+        # The dataset index records what was saved; the disk has the last word, and existing files are never overwritten.
+        index = self.get_dataset_index(yaml_path)
         saved = 0
-        for var, item in self.gallery_vars:
-            if var.get():
+        skipped = 0
+        with index.batch():
+            for item in selected:
                 path = item["path"]
-                base_name = os.path.basename(path)
-                dest_img_path = os.path.join(images_dir, base_name)
+                dest_img_path = self.dataset_destination(index, path, images_dir)
+                base_name = os.path.basename(dest_img_path)
+                entry = index.lookup(dest_img_path)
                 if not os.path.exists(dest_img_path):
+                    if entry is not None:
+                        # Deleted by hand since it was indexed
+                        index.remove(dest_img_path)
+                        entry = None
                     shutil.copy2(path, dest_img_path)
                 
-                # Determine bounding box
-                if item["bbox"]:
-                    x_center_norm, y_center_norm, w_norm, h_norm = item["bbox"]
-                else:
-                    img = cv2.imread(path)
-                    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                    th1 = self.canny_th1.get()
-                    th2 = self.canny_th2.get()
-                    edges = cv2.Canny(gray, th1, th2)
-                    nonzero = cv2.findNonZero(edges)
-                    if nonzero is None:
-                        continue
-                    x, y, w, h = cv2.boundingRect(nonzero)
-                    h_img, w_img = img.shape[:2]
-                    x_center_norm = (x + w/2) / w_img
-                    y_center_norm = (y + h/2) / h_img
-                    w_norm = w / w_img
-                    h_norm = h / h_img
+                base_filename, _ = os.path.splitext(base_name)
+                dest_txt_path = os.path.join(labels_dir, base_filename + ".txt")
+                session = index.rel(os.path.dirname(path))
+                if os.path.exists(dest_txt_path):
+                    # Already labeled; index label files that were added by hand
+                    if entry is None or not entry["labeled"]:
+                        index.record_image(dest_img_path, dest_txt_path, session=session)
+                    skipped += 1
+                    continue
                 
-                # Update YAML and get label index - ensure this runs for each saved image
-                label_idx = update_yaml_file(self.label_var.get().strip(), 
-                                            yaml_path=yaml_path)
+                # YOLO results carry every detected object with its predicted class
+                if item.get("boxes"):
+                    rows = [(registry.index(name),) + tuple(bbox) for name, bbox in item["boxes"]]
+                else:
+                    # Determine bounding box
+                    if item["bbox"]:
+                        x_center_norm, y_center_norm, w_norm, h_norm = item["bbox"]
+                    else:
+                        img = cv2.imread(path)
+                        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+                        th1 = self.canny_th1.get()
+                        th2 = self.canny_th2.get()
+                        edges = cv2.Canny(gray, th1, th2)
+                        nonzero = cv2.findNonZero(edges)
+                        if nonzero is None:
+                            index.record_image(dest_img_path, session=session)
+                            continue
+                        x, y, w, h = cv2.boundingRect(nonzero)
+                        h_img, w_img = img.shape[:2]
+                        x_center_norm = (x + w/2) / w_img
+                        y_center_norm = (y + h/2) / h_img
+                        w_norm = w / w_img
+                        h_norm = h / h_img
+                    try:
+                        label_idx = registry.index(label)
+                    except Exception as e:
+                        messagebox.showerror("Error", f"Could not update {yaml_path}: {e}")
+                        break
+                    rows = [(label_idx, x_center_norm, y_center_norm, w_norm, h_norm)]
                 
                 # Save annotation
-                base_filename, _ = os.path.splitext(base_name)
-                dest_txt_path = os.path.join(labels_dir, base_filename + ".txt")
-                if not os.path.exists(dest_txt_path):
-                    with open(dest_txt_path, "w") as f:
-                        f.write(f"{label_idx} {x_center_norm:.6f} {y_center_norm:.6f} {w_norm:.6f} {h_norm:.6f}\n")
+                write_yolo_label(dest_txt_path, rows)
+                index.record_image(dest_img_path, dest_txt_path, rows, session=session)
                 saved += 1
         
-        messagebox.showinfo("Saved", f"Saved {saved} images and annotations.\nYAML file updated at {yaml_path}")
+        messagebox.showinfo("Saved", f"Saved {saved} images and annotations"
+                                     + (f", skipped {skipped} already labeled" if skipped else "")
+                                     + f".\nYAML file updated at {yaml_path}")
         gallery_window.destroy()
+        
+    def find_duplicates(self):
+        if not self.image_paths:
+            messagebox.showwarning("Warning", "No images in the folder.")
+            return
+        paths = list(self.image_paths)
+        max_distance = self.labeling_settings.get("dedup_max_distance", 8)
+        num_threads = self.labeling_settings.get("decode_threads", DEFAULT_DECODE_THREADS)
+        
+        loading_window = tk.Toplevel(self)
+        loading_window.title("Finding Duplicates")
+        tk.Label(loading_window, text=f"Hashing {len(paths)} images...").pack(pady=10)
+        progress = ttk.Progressbar(loading_window, mode="indeterminate")
+        progress.pack(padx=20, pady=20, fill="x")
+        progress.start()
+        
+        def run_search():
+            clusters = []
+            phashes = {}
+            try:
+                start = time.time()
+                # pHash per image (cached with the thumbnails), then a BK-tree radius search per hash.
+                hashes = hash_files(paths, num_threads, cache=self.thumbnail_cache)
+                phashes = {path: h[1] for path, h in hashes.items()}
+                clusters = find_duplicate_clusters(phashes, max_distance)
+                print(f"Found {len(clusters)} near-duplicate clusters among {len(hashes)} images "
+                      f"in {time.time() - start:.1f} s")
+            except Exception as e:
+                print(f"Duplicate search error: {e}")
+            self.after(0, lambda: self.show_duplicates(clusters, phashes, max_distance, loading_window))
+        
+        threading.Thread(target=run_search, daemon=True).start()
+        
+    def show_duplicates(self, clusters, phashes, max_distance, loading_window):
+        loading_window.destroy()
+        if not clusters:
+            messagebox.showinfo("Duplicates", "No near-duplicate images found.")
+            return
+        window = tk.Toplevel(self)
+        window.title(f"Near-Duplicates ({len(clusters)} clusters)")
+        window.geometry("800x600")
+        # Clusters are listed one after another; images close to the first of each are checked for removal.
+        gallery = VirtualGallery(window, self.thumbnail_cache, on_open=self.open_from_gallery)
+        gallery.pack(fill="both", expand=True)
+        items = []
+        flags = []
+        for number, cluster in enumerate(clusters, 1):
+            items.extend({"path": path, "caption": f"Cluster {number}: Remove"} for path in cluster)
+            flags.extend(removal_flags(cluster, phashes, max_distance))
+        gallery.add_items(items, flags)
+        ttk.Button(window, text="Move Checked to duplicates/",
+                   command=lambda: self.prune_duplicates(gallery, window)).pack(pady=10)
+        
+    def prune_duplicates(self, gallery, window):
+        selected = gallery.selected_items()
+        if not selected:
+            return
+        if not messagebox.askyesno("Confirm", f"Move {len(selected)} images into a duplicates folder?"):
+            return
+        moved = 0
+        for item in selected:
+            path = item["path"]
+            dest_dir = os.path.join(os.path.dirname(path), "duplicates")
+            try:
+                os.makedirs(dest_dir, exist_ok=True)
+                shutil.move(path, os.path.join(dest_dir, os.path.basename(path)))
+                self.prefetcher.discard(path)
+            except OSError as e:
+                print(f"Could not move {path}: {e}")
+                continue
+            if path in self.image_paths:
+                self.image_paths.remove(path)
+            moved += 1
+        if self.image_path is not None and not os.path.exists(self.image_path):
+            if self.image_paths:
+                self.current_index = min(self.current_index, len(self.image_paths) - 1)
+                self.load_image(self.image_paths[self.current_index])
+            else:
+                self.original_image = None
+                self.display_image = None
+                self.pyramid = None
+                self.canvas.delete("all")
+        messagebox.showinfo("Duplicates", f"Moved {moved} images into duplicates folders.")
+        window.destroy()
+        
+    def paths_to_label(self):
+        """The folder's images, minus those already labeled in the dataset when "Only Unlabeled Images" is on."""
+        if not self.skip_labeled_var.get():
+            return list(self.image_paths)
+        index = self.get_dataset_index(os.path.join(PROJECT_ROOT, "data.yaml"))
+        images_dir = os.path.join(PROJECT_ROOT, "yolo_training_data", "images")
+        paths = []
+        with index.batch():
+            for path in self.image_paths:
+                # Matched by content, not name: scan sessions reuse the same file names
+                copy = index.dataset_copy(path, images_dir)
+                if copy is None or not index.is_labeled(copy):
+                    paths.append(path)
+        print(f"Auto-label: skipping {len(self.image_paths) - len(paths)} already labeled images")
+        return paths
+        
+    def dataset_destination(self, index, path, images_dir):
+        """Where `path` goes in the dataset: its existing copy, else its own name, else a name tagged with its hash."""
+        copy = index.dataset_copy(path, images_dir)
+        if copy is not None:
+            return copy
+        base_name = os.path.basename(path)
+        dest = os.path.join(images_dir, base_name)
+        if not os.path.exists(dest) or index.content_hash(dest) == index.content_hash(path):
+            return dest
+        # Same name from another session, e.g. {label}_pose0001.jpg of an earlier scan
+        stem, ext = os.path.splitext(base_name)
+        tag = index.content_hash(path)[:8]
+        dest = os.path.join(images_dir, f"{stem}_{tag}{ext}")
+        n = 2
+        while os.path.exists(dest):
+            dest = os.path.join(images_dir, f"{stem}_{tag}_{n}{ext}")
+            n += 1
+        return dest
+        
+    def get_dataset_index(self, yaml_path):
+        if self.dataset_index is None:
+            self.dataset_index = open_dataset_index(yaml_path)
+        return self.dataset_index
+        
+    def on_closing(self):
+        if self.canny_job is not None:
+            self.canny_job.cancel()
+        self.thumbnail_cache.close()
+        self.prefetcher.close()
+        if self.dataset_index is not None:
+            self.dataset_index.close()
+        self.destroy()
 
 if __name__ == "__main__":
     app = ImageLabelingApp()
+    app.protocol("WM_DELETE_WINDOW", app.on_closing)
     app.mainloop()
@@ -0,0 +1,260 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+import cv2
+from PIL import Image
+from thumbnail_cache import file_key
+
+MIN_LEVEL_SIDE = 256
+MAX_ZOOM = 32.0
+
+#####################
+# Image Pyramid and Viewport Rendering
+#####################
+
+class ImagePyramid:
+    """Half-resolution levels of one image, built once, for rendering any zoom cheaply.
+
+    render() picks the smallest level that still has at least one pixel per
+    screen pixel, crops just the part that falls inside the viewport and
+    resizes that crop, so the work per frame is bounded by the canvas size
+    rather than the image size or zoom factor.
+
+    `full_size` is the (width, height) of the source image when `image` was
+    decoded at reduced size; zoom and offsets are always in source pixels.
+    """
+
+    def __init__(self, image, min_side=MIN_LEVEL_SIDE, full_size=None):
+        self.height, self.width = image.shape[:2]
+        if full_size is not None:
+            self.width, self.height = full_size
+        self.levels = [image]
+        while min(self.levels[-1].shape[:2]) >= 2 * min_side:
+            self.levels.append(cv2.pyrDown(self.levels[-1]))
+        self.nbytes = sum(level.nbytes for level in self.levels)
+        self.reduction = 1 if full_size is None else max(1, round(self.width / image.shape[1]))
+
+    @property
+    def reduced(self):
+        return self.levels[0].shape[1] != self.width
+
+    def level_for(self, zoom):
+        level = 0
+        while level + 1 < len(self.levels) and zoom <= self.levels[level + 1].shape[1] / self.width:
+            level += 1
+        return level
+
+    def render(self, zoom, offset_x, offset_y, view_w, view_h):
+        """Render the visible part of the image for a viewport.
+
+        The image is drawn at `zoom` screen pixels per image pixel with its
+        top-left corner at (offset_x, offset_y) in viewport coordinates.
+        Returns (tile, x, y) with the tile's viewport position, or None when
+        no part of the image is visible.
+        """
+        x0 = max(0.0, -offset_x / zoom)
+        y0 = max(0.0, -offset_y / zoom)
+        x1 = min(float(self.width), (view_w - offset_x) / zoom)
+        y1 = min(float(self.height), (view_h - offset_y) / zoom)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        level = self.levels[self.level_for(zoom)]
+        sx = level.shape[1] / self.width
+        sy = level.shape[0] / self.height
+        lx0, ly0 = int(math.floor(x0 * sx)), int(math.floor(y0 * sy))
+        lx1 = min(level.shape[1], int(math.ceil(x1 * sx)))
+        ly1 = min(level.shape[0], int(math.ceil(y1 * sy)))
+        crop = level[ly0:ly1, lx0:lx1]
+        scale_x, scale_y = zoom / sx, zoom / sy
+        out_w = max(1, int(round((lx1 - lx0) * scale_x)))
+        out_h = max(1, int(round((ly1 - ly0) * scale_y)))
+        if scale_x < 1.0:
+            interpolation = cv2.INTER_AREA
+        elif scale_x >= 4.0:
+            interpolation = cv2.INTER_NEAREST  # Show individual pixels when zoomed far in
+        else:
+            interpolation = cv2.INTER_LINEAR
+        tile = cv2.resize(crop, (out_w, out_h), interpolation=interpolation)
+        return tile, int(round(lx0 / sx * zoom + offset_x)), int(round(ly0 / sy * zoom + offset_y))
+
+#####################
+# Prefetching Image Loader
+#####################
+
+# cv2 can decode JPEGs at 1/2, 1/4 or 1/8 size for much less than a full decode.
+REDUCED_COLOR_FLAGS = [(8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)]
+EXIF_ORIENTATION = 0x0112
+
+def oriented_size(path):
+    """(width, height) of the image as cv2.imread returns it, read from the header only.
+
+    cv2 applies the EXIF orientation while decoding; orientations 5 to 8
+    rotate by 90 degrees and swap the axes relative to the stored size.
+    """
+    with Image.open(path) as header:
+        width, height = header.size
+        orientation = header.getexif().get(EXIF_ORIENTATION, 1)
+    return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+
+def reduction_for(path, fit_size):
+    """Largest IMREAD_REDUCED_* factor whose output still covers fit_size, or 1 for a full decode."""
+    if fit_size is None:
+        return 1
+    full_w, full_h = oriented_size(path)
+    for factor, _ in REDUCED_COLOR_FLAGS:
+        if full_w // factor >= fit_size[0] and full_h // factor >= fit_size[1]:
+            return factor
+    return 1
+
+def decode_image(path, factor=1):
+    """Decode an image at 1/factor size (1, 2, 4 or 8).
+
+    Returns (image, (full_w, full_h)); image is None if the file can't be read.
+    """
+    if factor == 1:
+        image = cv2.imread(path)
+        return image, (image.shape[1], image.shape[0]) if image is not None else (0, 0)
+    return cv2.imread(path, dict(REDUCED_COLOR_FLAGS)[factor]), oriented_size(path)
+
+class ImagePrefetcher:
+    """Decodes images around the current one on a background thread into a byte-bounded LRU.
+
+    Entries are ImagePyramids keyed by (path, mtime, size), so a replaced file
+    is decoded again. With `reduced` set, images are decoded with
+    IMREAD_REDUCED_* down to the size set by set_fit_size() and the pyramid
+    keeps the full image size, so coordinates stay in full-resolution pixels.
+    An entry decoded at a coarser reduction than the canvas now needs is
+    decoded again.
+
+    The cache stays within `max_bytes`: older entries go first, then the
+    neighbours farthest from the current image, so on large images fewer
+    neighbours are prefetched. Only the current image is always kept.
+    """
+
+    def __init__(self, radius=3, max_bytes=512 * 1024 * 1024, reduced=False):
+        self.radius = radius
+        self.max_bytes = max_bytes
+        self.reduced = reduced
+        self.fit_size = None
+        self._entries = OrderedDict()  # file key -> ImagePyramid, least recently used first
+        self._bytes = 0
+        self._window = []  # file keys around the current image, current first, then nearest neighbours
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pending = []
+        self._generation = 0  # bumped by every prefetch() call
+        self._closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    @classmethod
+    def from_settings(cls, labeling_settings):
+        return cls(radius=int(labeling_settings.get("prefetch_radius", 3)),
+                   max_bytes=int(labeling_settings.get("prefetch_cache_mb", 512)) * 1024 * 1024,
+                   reduced=bool(labeling_settings.get("prefetch_reduced", False)))
+
+    def set_fit_size(self, width, height):
+        self.fit_size = (width, height) if self.reduced else None
+
+    def get(self, path):
+        """Pyramid for path, decoding it on the calling thread if it hasn't been prefetched."""
+        key = file_key(path)
+        factor = reduction_for(path, self.fit_size)
+        with self._lock:
+            pyramid = self._entries.get(key)
+            if pyramid is not None and pyramid.reduction <= factor:
+                self._entries.move_to_end(key)
+                return pyramid
+        pyramid = self._decode(path, factor)
+        if pyramid is not None:
+            self._store(key, pyramid)
+        return pyramid
+
+    def prefetch(self, paths, index):
+        """Queue the neighbours of paths[index], nearest first, and drop stale requests."""
+        order = []
+        for step in range(1, self.radius + 1):
+            for i in (index + step, index - step):
+                if 0 <= i < len(paths):
+                    order.append(paths[i])
+        window = []
+        for path in [paths[index]] + order:
+            try:
+                window.append(file_key(path))
+            except OSError:
+                pass
+        with self._wake:
+            self._window = window
+            self._pending = order
+            self._generation += 1
+            self._wake.notify()
+
+    def discard(self, path):
+        key = os.path.abspath(path)
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == key]:
+                self._bytes -= self._entries.pop(entry_key).nbytes
+
+    def close(self):
+        with self._wake:
+            self._closed = True
+            self._entries.clear()
+            self._bytes = 0
+            self._wake.notify()
+
+    def _decode(self, path, factor):
+        try:
+            image, full_size = decode_image(path, factor)
+        except Exception as e:
+            print(f"Prefetch error for {path}: {e}")
+            return None
+        if image is None:
+            return None
+        return ImagePyramid(image, full_size=full_size)
+
+    def _store(self, key, pyramid):
+        """Insert an entry and evict down to max_bytes; returns False if the entry itself did not fit."""
+        with self._lock:
+            if self._closed:
+                return False
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = pyramid
+            self._bytes += pyramid.nbytes
+            window = set(self._window)
+            current = self._window[0] if self._window else key
+            # Least recently used entries outside the window first, then the farthest neighbours.
+            victims = [k for k in self._entries if k not in window]
+            victims += [k for k in reversed(self._window) if k in self._entries]
+            for victim in victims:
+                if self._bytes <= self.max_bytes:
+                    break
+                if victim != current:
+                    self._bytes -= self._entries.pop(victim).nbytes
+            return key in self._entries
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._pending and not self._closed:
+                    self._wake.wait()
+                if self._closed:
+                    return
+                path = self._pending.pop(0)
+                generation = self._generation
+            try:
+                key = file_key(path)
+                factor = reduction_for(path, self.fit_size)
+            except OSError:
+                continue
+            with self._lock:
+                cached = self._entries.get(key)
+                if cached is not None and cached.reduction <= factor:
+                    continue
+            pyramid = self._decode(path, factor)
+            if pyramid is not None and not self._store(key, pyramid):
+                # The budget is spent on nearer images; the rest of this window would not fit either.
+                with self._wake:
+                    if self._generation == generation:
+                        self._pending = []
@@ -0,0 +1,156 @@
+import os
+import queue
+import threading
+import time
+import cv2
+
+#####################
+# Encoding Helpers
+#####################
+
+DEFAULT_JPEG_QUALITY = 95
+DEFAULT_PNG_COMPRESSION = 3
+
+def imwrite_params(filename, jpeg_quality=DEFAULT_JPEG_QUALITY, png_compression=DEFAULT_PNG_COMPRESSION):
+    """Return the cv2.imwrite flags for a filename (or a bare extension such as ".png")."""
+    ext = (os.path.splitext(filename)[1] or filename).lower()
+    if ext in (".jpg", ".jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    if ext == ".png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    return []
+
+def load_output_settings(config):
+    """Read the writer options from the "output_settings" section of maintenance.json."""
+    settings = config.get("output_settings", {})
+    return {
+        "image_format": str(settings.get("image_format", "jpg")).lower().lstrip("."),
+        "jpeg_quality": int(settings.get("jpeg_quality", DEFAULT_JPEG_QUALITY)),
+        "png_compression": int(settings.get("png_compression", DEFAULT_PNG_COMPRESSION)),
+        "writer_threads": max(1, int(settings.get("writer_threads", 2))),
+        "writer_queue_size": max(1, int(settings.get("writer_queue_size", 64))),
+    }
+
+#####################
+# Asynchronous Image Writer
+#####################
+
+class ImageWriter:
+    """Encodes and writes images on background threads.
+
+    Images are handed over through a bounded queue, so the capture loop only
+    pays for encoding and disk latency when the queue is full. cv2.imwrite
+    releases the GIL while encoding, so several threads encode in parallel.
+    Time spent waiting on a full queue is accounted as back-pressure.
+    Work submitted after close() is dropped and counted, so a capture thread
+    that outlives the window does not fail during shutdown.
+    """
+
+    def __init__(self, num_threads=2, queue_size=64, jpeg_quality=DEFAULT_JPEG_QUALITY,
+                 png_compression=DEFAULT_PNG_COMPRESSION):
+        self.jpeg_quality = jpeg_quality
+        self.png_compression = png_compression
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.blocked_submits = 0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+        self._threads = []
+        for _ in range(max(1, num_threads)):
+            thread = threading.Thread(target=self._write_loop, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @classmethod
+    def from_config(cls, config):
+        settings = load_output_settings(config)
+        return cls(num_threads=settings["writer_threads"], queue_size=settings["writer_queue_size"],
+                   jpeg_quality=settings["jpeg_quality"], png_compression=settings["png_compression"])
+
+    def submit(self, filename, image):
+        """Queue `image` for writing to `filename`.
+
+        The writer keeps a reference to the array, so the caller must not
+        modify it afterwards. Blocks only while the queue is full.
+        """
+        self._put((filename, image))
+
+    def submit_text(self, filename, text):
+        """Queue a small text file (e.g. a YOLO label) so it is written in order with the images."""
+        self._put((filename, text))
+
+    def _put(self, item):
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            start = time.time()
+            self._queue.put(item)
+            with self._lock:
+                self.blocked_submits += 1
+                self.blocked_seconds += time.time() - start
+        with self._lock:
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            filename, data = item
+            is_image = not isinstance(data, str)
+            try:
+                if is_image:
+                    ok = cv2.imwrite(filename, data, imwrite_params(filename, self.jpeg_quality, self.png_compression))
+                else:
+                    with open(filename, "w") as f:
+                        f.write(data)
+                    ok = True
+            except Exception as e:
+                print(f"Error writing {filename}: {e}")
+                ok = False
+            with self._lock:
+                if not ok:
+                    self.failed += 1
+                elif is_image:
+                    self.written += 1
+            self._queue.task_done()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Block until every queued image has been written."""
+        self._queue.join()
+
+    def close(self):
+        """Flush outstanding images and stop the writer threads."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "written": self.written,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "pending": self._queue.qsize(),
+                "blocked_submits": self.blocked_submits,
+                "blocked_seconds": self.blocked_seconds,
+                "max_depth": self.max_depth,
+            }
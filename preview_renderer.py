@@ -0,0 +1,94 @@
+import threading
+import cv2
+from PIL import Image, ImageTk
+
+#####################
+# Rate-Limited Preview Renderer
+#####################
+
+class PreviewRenderer:
+    """Shows BGR frames in a Tk label at a capped frame rate.
+
+    submit() may be called from any thread; it only records the newest
+    frame. The actual resize and PhotoImage update happen on the Tk thread
+    at most `max_fps` times per second, and only when a new frame arrived.
+    The fitted display size is computed once per source shape or container
+    resize, and the PhotoImage is reused via paste() while its size holds.
+    """
+
+    def __init__(self, label, max_size, max_fps=30, interpolation=cv2.INTER_LINEAR):
+        self.label = label
+        self.max_size = max_size
+        self.interpolation = interpolation
+        self.interval_ms = max(1, int(1000 / max(1, max_fps)))
+        self._lock = threading.Lock()
+        self._pending = None
+        self._bounds = max_size
+        self._fit_key = None
+        self._fit_size = None
+        self._photo = None
+        self._running = True
+        label.master.bind("<Configure>", self._on_resize, add="+")
+        label.after(self.interval_ms, self._tick)
+
+    def submit(self, frame):
+        """Hand over a BGR frame for display; the renderer takes ownership of it."""
+        with self._lock:
+            self._pending = frame
+
+    def stop(self):
+        self._running = False
+
+    def to_fraction(self, x, y):
+        """Map a point on the label to (fx, fy) across the shown frame, clamped to [0, 1].
+
+        The fitted frame keeps its aspect ratio and is centered in the label,
+        so a letterboxed preview has margins that are not part of the frame.
+        Returns None until a frame has been shown.
+        """
+        if self._photo is None:
+            return None
+        shown_w, shown_h = self._photo.width(), self._photo.height()
+        offset_x = (self.label.winfo_width() - shown_w) / 2
+        offset_y = (self.label.winfo_height() - shown_h) / 2
+        fx = min(1.0, max(0.0, (x - offset_x) / shown_w))
+        fy = min(1.0, max(0.0, (y - offset_y) / shown_h))
+        return fx, fy
+
+    def _on_resize(self, event):
+        bounds = (min(self.max_size[0], max(1, event.width)), min(self.max_size[1], max(1, event.height)))
+        if bounds != self._bounds:
+            self._bounds = bounds
+            self._fit_key = None
+
+    def _tick(self):
+        if not self._running:
+            return
+        with self._lock:
+            frame, self._pending = self._pending, None
+        if frame is not None and frame.size > 0:
+            self._render(frame)
+        self.label.after(self.interval_ms, self._tick)
+
+    def _fitted_size(self, frame):
+        h, w = frame.shape[:2]
+        key = (w, h, self._bounds)
+        if key != self._fit_key:
+            # Fit within the bounds while preserving aspect ratio.
+            target_w, target_h = self._bounds
+            scale = min(target_w / w, target_h / h)
+            self._fit_size = (max(1, int(w * scale)), max(1, int(h * scale)))
+            self._fit_key = key
+        return self._fit_size
+
+    def _render(self, frame):
+        size = self._fitted_size(frame)
+        if (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size, interpolation=self.interpolation)
+        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if self._photo is not None and (self._photo.width(), self._photo.height()) == size:
+            self._photo.paste(img)
+        else:
+            self._photo = ImageTk.PhotoImage(image=img)
+            self.label.imgtk = self._photo
+            self.label.configure(image=self._photo)
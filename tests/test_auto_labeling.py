@@ -0,0 +1,17 @@
+import numpy as np
+from auto_labeling import filter_detections
+
+def test_filter_detections_thresholds_and_per_class_nms():
+    detections = [
+        [0, 0, 100, 100, 0.9, 0],
+        [5, 5, 105, 105, 0.8, 0],    # overlaps the first box of its class
+        [5, 5, 105, 105, 0.7, 1],    # same place, other class: kept
+        [200, 200, 300, 300, 0.1, 0],  # below conf_threshold
+        [400, 400, 403, 403, 0.95, 0],  # below min_area
+    ]
+    kept = filter_detections(detections, conf_threshold=0.25, iou_threshold=0.45, min_area=100)
+    assert kept[:, 4].tolist() == np.float32([0.9, 0.7]).tolist()
+    assert kept[:, 5].tolist() == [0, 1]
+
+def test_filter_detections_empty():
+    assert filter_detections(np.zeros((0, 6))).shape == (0, 6)
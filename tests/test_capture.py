@@ -0,0 +1,112 @@
+import os
+import random
+import cv2
+import numpy as np
+import pytest
+
+# image_acquisition builds its GUI on Tk at import time.
+pytest.importorskip("tkinter")
+from image_acquisition import (AugmentationManifest, FrameQualityGate, apply_flip, apply_translation,
+                               apply_zoom_centered, augmentation_ranges, build_augmentation_matrix,
+                               manifest_record, render_augmentation, replay_manifest,
+                               sample_augmentation_params, yolo_label_rows)
+
+RANGES = augmentation_ranges({
+    "min_rotation": -15, "max_rotation": 15,
+    "min_beta": -20, "max_beta": 20,
+    "min_alpha": 0.9, "max_alpha": 1.1,
+    "min_zoom": 1.0, "max_zoom": 1.3,
+    "min_hue": -0.05, "max_hue": 0.05,
+    "min_saturation": 0.9, "max_saturation": 1.1,
+    "min_translate": 0.0, "max_translate": 0.1,
+    "min_shear": 0.0, "max_shear": 5.0,
+    "flip_lr": 0.5,
+})
+
+def identity_params(**overrides):
+    params = {"zoom": 1.0, "translate": (0, 0), "shear": 0.0, "flip": False, "angle": 0.0}
+    params.update(overrides)
+    return params
+
+def test_identity_matrix():
+    M = build_augmentation_matrix((320, 240), **identity_params())
+    assert np.allclose(M, [[1, 0, 0], [0, 1, 0]])
+
+@pytest.mark.parametrize("chained, params", [
+    (lambda img: apply_zoom_centered(img, 2.0), identity_params(zoom=2.0)),
+    (lambda img: apply_flip(img, 1.0), identity_params(flip=True)),
+])
+def test_fused_geometry_matches_chained_helper(chained, params):
+    image = np.zeros((120, 160), dtype=np.uint8)
+    cv2.rectangle(image, (50, 40), (90, 70), 255, -1)
+    M = build_augmentation_matrix((160, 120), **params)
+    fused = cv2.warpAffine(image, M, (160, 120))
+    assert np.abs(fused.astype(int) - chained(image).astype(int)).mean() < 2.0
+
+def test_fused_translation_matches_apply_translation():
+    image = np.zeros((120, 160), dtype=np.uint8)
+    cv2.rectangle(image, (50, 40), (90, 70), 255, -1)
+    random.seed(3)
+    chained = apply_translation(image, (0.1, 0.1))
+    M = build_augmentation_matrix((160, 120), **identity_params(translate=(16, 12)))
+    assert np.array_equal(cv2.warpAffine(image, M, (160, 120)), chained)
+
+def test_yolo_label_rows_follow_flip():
+    rows = yolo_label_rows(identity_params(flip=True), (200, 100), (10, 20, 50, 60), 2)
+    assert len(rows) == 1
+    cls, xc, yc, w, h = rows[0]
+    assert cls == 2
+    assert xc == pytest.approx((200 - 1 - 30) / 200, abs=0.01)
+    assert (yc, w, h) == pytest.approx((0.4, 0.2, 0.4), abs=0.01)
+
+def test_yolo_label_rows_clip_and_drop_boxes_leaving_the_frame():
+    # Half the box is still visible: it is clipped to the frame edge.
+    rows = yolo_label_rows(identity_params(translate=(190, 0)), (200, 100), (0, 0, 20, 20), 0)
+    assert rows[0][1:] == pytest.approx((0.975, 0.1, 0.05, 0.2), abs=1e-4)
+    # Under MIN_VISIBLE_FRACTION of it is left: no label.
+    assert yolo_label_rows(identity_params(translate=(198, 0)), (200, 100), (0, 0, 20, 20), 0) == []
+
+def test_replay_manifest_reproduces_capture(tmp_path):
+    rng = np.random.default_rng(0)
+    raw = rng.integers(0, 255, (96, 128, 3), dtype=np.uint8)
+    os.makedirs(tmp_path / "raw")
+    cv2.imwrite(str(tmp_path / "raw" / "frame.png"), raw)
+    manifest = AugmentationManifest(str(tmp_path), {"seed": 7, "label_box": (20, 20, 100, 80),
+                                                    "class_idx": 0, "replayable": True})
+    session_rng = random.Random(7)
+    expected = {}
+    for i in range(4):
+        seed = session_rng.getrandbits(32)
+        params = sample_augmentation_params((128, 96), RANGES, random.Random(seed))
+        name = f"img{i}.png"
+        expected[name] = render_augmentation(raw, params)
+        manifest.append(manifest_record(name, seed, params, os.path.join("raw", "frame.png")))
+    manifest.close()
+
+    # Manifest records round-trip through JSON, so tuples come back as lists.
+    for output in ("first", "second"):
+        assert replay_manifest(str(tmp_path / "manifest.jsonl"), str(tmp_path / output), png_compression=1) == 4
+    for name, image in expected.items():
+        assert np.array_equal(cv2.imread(str(tmp_path / "first" / name)), image)
+        assert np.array_equal(cv2.imread(str(tmp_path / "second" / name)), image)
+        labels = [(tmp_path / output / (name[:-4] + ".txt")).read_text() for output in ("first", "second")]
+        assert labels[0] == labels[1]
+
+def test_replay_refuses_manifest_without_raw_frames(tmp_path):
+    manifest = AugmentationManifest(str(tmp_path), {"seed": 1, "replayable": False})
+    manifest.append(manifest_record("img.png", 1, {}))
+    manifest.close()
+    assert replay_manifest(str(tmp_path / "manifest.jsonl")) == 0
+    assert os.listdir(tmp_path) == ["manifest.jsonl"]
+
+def test_quality_gate_rejects_blur_and_duplicates():
+    rng = np.random.default_rng(1)
+    sharp = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    other = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    gate = FrameQualityGate(min_sharpness=100.0, max_hash_distance=5)
+    assert gate.check(sharp) == (True, None)
+    assert gate.check(sharp.copy())[1].startswith("near-duplicate")
+    assert gate.check(np.full_like(sharp, 128))[1].startswith("blurry")
+    assert gate.check(None) == (False, "empty frame")
+    assert gate.check(other) == (True, None)
+    assert gate.counts == {"kept": 2, "blurry": 1, "duplicate": 1}
@@ -0,0 +1,106 @@
+import os
+import pytest
+import dataset_index
+from dataset_index import DatasetIndex, file_sha1
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+@pytest.fixture
+def index(tmp_path):
+    index = DatasetIndex(str(tmp_path / "index.db"), str(tmp_path))
+    yield index
+    index.close()
+
+def test_sync_folder_adds_changes_and_removes(tmp_path, index):
+    images = tmp_path / "images"
+    labels = tmp_path / "labels"
+    write(str(images / "a.jpg"), b"aaaa")
+    write(str(images / "b.jpg"), b"bbbb")
+    write(str(images / "notes.txt"), b"not an image")
+    write(str(labels / "a.txt"), b"0 0.5 0.5 0.2 0.2\n")
+    assert index.sync_folder(str(images), str(labels)) == (2, 0)
+    assert index.is_labeled(str(images / "a.jpg"))
+    assert index.unlabeled() == ["images/b.jpg"]
+    assert index.class_counts() == {0: (1, 1)}
+
+    # Unchanged files are skipped.
+    assert index.sync_folder(str(images), str(labels)) == (0, 0)
+
+    # A changed image and a new label file are picked up; a deleted image is dropped.
+    write(str(images / "b.jpg"), b"bbbbbb")
+    write(str(labels / "b.txt"), b"1 0.5 0.5 0.1 0.1\n1 0.2 0.2 0.1 0.1\n")
+    os.remove(str(images / "a.jpg"))
+    assert index.sync_folder(str(images), str(labels)) == (1, 1)
+    entry = index.lookup(str(images / "b.jpg"))
+    assert entry["sha1"] == file_sha1(str(images / "b.jpg"))
+    assert entry["num_boxes"] == 2
+    assert index.lookup(str(images / "a.jpg")) is None
+    assert index.class_counts() == {1: (1, 2)}
+
+def test_sync_folder_escapes_like_wildcards(tmp_path, index):
+    # Unescaped, "a_b/%" would also match "axb/..." and "a%/%" would match "ab/...".
+    for folder in ("a_b", "axb", "a%", "ab"):
+        write(str(tmp_path / folder / "img.jpg"), folder.encode())
+        index.sync_folder(str(tmp_path / folder))
+    os.remove(str(tmp_path / "a_b" / "img.jpg"))
+    os.remove(str(tmp_path / "a%" / "img.jpg"))
+    assert index.sync_folder(str(tmp_path / "a_b")) == (0, 1)
+    assert index.sync_folder(str(tmp_path / "a%")) == (0, 1)
+    assert index.has_image(str(tmp_path / "axb" / "img.jpg"))
+    assert index.has_image(str(tmp_path / "ab" / "img.jpg"))
+    assert index.summary()["images"] == 2
+
+def test_sync_folder_only_reconciles_direct_children(tmp_path, index):
+    write(str(tmp_path / "top" / "a.jpg"), b"a")
+    write(str(tmp_path / "top" / "sub" / "b.jpg"), b"b")
+    index.sync_folder(str(tmp_path / "top" / "sub"))
+    assert index.sync_folder(str(tmp_path / "top")) == (1, 0)
+    assert index.has_image(str(tmp_path / "top" / "sub" / "b.jpg"))
+
+def test_record_image_reuses_hash_while_size_and_mtime_match(tmp_path, index, monkeypatch):
+    path = str(tmp_path / "images" / "a.jpg")
+    write(path, b"first")
+    calls = []
+    real_sha1 = dataset_index.file_sha1
+    monkeypatch.setattr(dataset_index, "file_sha1", lambda p: calls.append(p) or real_sha1(p))
+    index.record_image(path, session="s1")
+    index.record_image(path)
+    assert len(calls) == 1
+    # The session is kept when a later call does not give one.
+    assert index.lookup(path)["session"] == "s1"
+
+    st = os.stat(path)
+    write(path, b"second!")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    index.record_image(path)
+    assert len(calls) == 2
+    assert index.lookup(path)["sha1"] == real_sha1(path)
+    assert index.find_by_hash(real_sha1(path)) == ["images/a.jpg"]
+
+def test_dataset_copy_matches_content_not_scan_file_names(tmp_path, index):
+    # Every scan session names its captures {label}_pose{index:04d}.
+    images = str(tmp_path / "yolo_training_data" / "images")
+    first = str(tmp_path / "training_data" / "scan1" / "part_pose0001.jpg")
+    second = str(tmp_path / "training_data" / "scan2" / "part_pose0001.jpg")
+    write(first, b"first session")
+    write(second, b"second session")
+    assert index.dataset_copy(first, images) is None
+
+    saved = os.path.join(images, "part_pose0001.jpg")
+    write(saved, b"first session")
+    index.record_image(saved, session=index.rel(os.path.dirname(first)))
+    assert index.dataset_copy(first, images) == saved
+    assert index.dataset_copy(second, images) is None
+
+    # The same bytes are found under another name too.
+    renamed = str(tmp_path / "elsewhere" / "copy.jpg")
+    write(renamed, b"first session")
+    assert index.dataset_copy(renamed, images) == saved
+
+    # A copy deleted by hand is not reported, and its row is dropped.
+    os.remove(saved)
+    assert index.dataset_copy(first, images) is None
+    assert index.lookup(saved) is None
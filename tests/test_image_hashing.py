@@ -0,0 +1,39 @@
+import random
+from image_hashing import BKTree, find_duplicate_clusters, hamming, removal_flags
+
+def brute_force(hashes, value, max_distance):
+    return sorted((hamming(value, h), key) for key, h in hashes.items() if hamming(value, h) <= max_distance)
+
+def test_bktree_search_matches_linear_scan():
+    rng = random.Random(1)
+    hashes = {i: rng.getrandbits(64) for i in range(500)}
+    # Near copies so that small radii have hits.
+    for i in range(100):
+        hashes[500 + i] = hashes[i] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+    tree = BKTree()
+    for key, value in hashes.items():
+        tree.add(value, key)
+    assert tree.size == len(hashes)
+    for max_distance in (0, 2, 8, 20):
+        for _ in range(30):
+            query = rng.choice(list(hashes.values())) ^ (1 << rng.randrange(64))
+            assert sorted(tree.search(query, max_distance)) == brute_force(hashes, query, max_distance)
+
+def test_bktree_keeps_equal_hashes():
+    tree = BKTree()
+    tree.add(0b1010, "a")
+    tree.add(0b1010, "b")
+    assert sorted(tree.search(0b1010, 0)) == [(0, "a"), (0, "b")]
+    assert BKTree().search(0, 64) == []
+
+def test_clusters_are_grouped_and_ordered():
+    hashes = {"a": 0, "b": 0b1, "c": 0b11, "x": (1 << 63) - 1, "y": ((1 << 63) - 1) ^ 1, "z": 0xF0F0F0F0}
+    assert find_duplicate_clusters(hashes, max_distance=1) == [["a", "b", "c"], ["x", "y"]]
+    assert find_duplicate_clusters(hashes, max_distance=0) == []
+
+def test_removal_flags_only_near_the_kept_image():
+    # A chain 0 -> 4 -> 8 -> 12 bits apart links into one cluster at radius 4.
+    hashes = {"a": 0, "b": 0xF, "c": 0xFF, "d": 0xFFF}
+    cluster = find_duplicate_clusters(hashes, max_distance=4)[0]
+    assert cluster == ["a", "b", "c", "d"]
+    assert removal_flags(cluster, hashes, max_distance=4) == [False, True, False, False]
@@ -0,0 +1,46 @@
+import threading
+import numpy as np
+import image_writer
+from image_writer import ImageWriter
+
+def test_writes_images_and_text(tmp_path):
+    writer = ImageWriter(num_threads=2, queue_size=4)
+    for i in range(6):
+        writer.submit(str(tmp_path / f"img{i}.png"), np.full((8, 8, 3), i, dtype=np.uint8))
+    writer.submit_text(str(tmp_path / "img0.txt"), "0 0.5 0.5 1 1\n")
+    writer.close()
+    assert writer.stats()["written"] == 6
+    assert (tmp_path / "img0.txt").read_text() == "0 0.5 0.5 1 1\n"
+
+def test_full_queue_blocks_and_is_counted(tmp_path, monkeypatch):
+    release = threading.Event()
+    real_imwrite = image_writer.cv2.imwrite
+
+    def slow_imwrite(*args):
+        release.wait(5)
+        return real_imwrite(*args)
+
+    monkeypatch.setattr(image_writer.cv2, "imwrite", slow_imwrite)
+    writer = ImageWriter(num_threads=1, queue_size=1)
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    # One image is held by the writer thread and one fills the queue; the third must wait.
+    submitter = threading.Thread(target=lambda: [writer.submit(str(tmp_path / f"{i}.png"), image) for i in range(3)])
+    submitter.start()
+    submitter.join(0.3)
+    assert submitter.is_alive()
+    release.set()
+    submitter.join(5)
+    writer.close()
+    stats = writer.stats()
+    assert stats["written"] == 3
+    assert stats["blocked_submits"] >= 1
+    assert stats["max_depth"] <= 1
+
+def test_submit_after_close_is_dropped(tmp_path):
+    writer = ImageWriter(num_threads=1)
+    writer.close()
+    writer.submit(str(tmp_path / "late.png"), np.zeros((8, 8, 3), dtype=np.uint8))
+    writer.submit_text(str(tmp_path / "late.txt"), "")
+    writer.close()
+    assert writer.stats()["dropped"] == 2
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,50 @@
+import sqlite3
+import cv2
+import numpy as np
+import thumbnail_cache
+from thumbnail_cache import ThumbnailCache
+
+def make_images(folder, count):
+    paths = []
+    for i in range(count):
+        path = str(folder / f"img{i}.png")
+        cv2.imwrite(path, np.full((64, 64, 3), i, dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+def test_hits_do_not_hold_a_write_transaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnail_cache, "COMMIT_EVERY", 3)
+    cache = ThumbnailCache(str(tmp_path / "cache" / "thumbs.db"))
+    paths = make_images(tmp_path, 3)
+    for path in paths:
+        cache.thumbnail(path)
+    assert not cache._db.in_transaction
+    for path in paths[:2]:
+        found, thumb, _ = cache.get(path)
+        assert found and thumb is not None
+    # Access times are batched in memory, so another connection can write meanwhile.
+    assert not cache._db.in_transaction
+    other = sqlite3.connect(cache.path, timeout=0)
+    other.execute("UPDATE thumbnails SET meta=NULL")
+    other.commit()
+    other.close()
+    # The batch is written and committed once it reaches COMMIT_EVERY.
+    cache.get(paths[2])
+    assert not cache._db.in_transaction
+    assert cache._accessed == {}
+    cache.close()
+
+def test_eviction_follows_batched_access_times(tmp_path):
+    cache = ThumbnailCache(str(tmp_path / "cache" / "thumbs.db"))
+    paths = make_images(tmp_path, 3)
+    for path in paths:
+        cache.thumbnail(path)
+    cache.commit()
+    cache.get(paths[0])
+    # Going just over the cap evicts one entry, the least recently used paths[1].
+    cache.max_bytes = cache._total_bytes - 1
+    cache.put(paths[2], cache.thumbnail(paths[2]))
+    assert cache.get(paths[0])[0]
+    assert not cache.get(paths[1])[0]
+    cache.close()
+    assert cache.get(paths[0]) == (False, None, None)
@@ -0,0 +1,80 @@
+import os
+import time
+import cv2
+import numpy as np
+import pytest
+import yaml
+from yolo_dataset import ClassRegistry, YamlLock, box_label_rows, transform_box
+
+def read_yaml(path):
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+def test_add_training_folder_registers_relative_path_once(tmp_path):
+    yaml_path = str(tmp_path / "data.yaml")
+    registry = ClassRegistry(yaml_path)
+    registry.index("bolt")
+    session = tmp_path / "training_data" / "parts" / "bolt" / "20260101_120000"
+    session.mkdir(parents=True)
+
+    registry.add_training_folder(str(session))
+    registry.add_training_folder(str(session))
+    data = read_yaml(yaml_path)
+    expected = ["yolo_training_data/images", "training_data/parts/bolt/20260101_120000"]
+    assert data["train"] == expected
+    assert data["val"] == expected
+    assert data["names"] == ["bolt"]
+    assert not os.path.exists(yaml_path + ".lock")
+
+def test_box_label_rows_normalizes_pixel_box():
+    assert box_label_rows((10, 20, 30, 60), (100, 200), 3) == [(3, 0.2, 0.2, 0.2, 0.2)]
+
+def test_transform_box_identity_rotation_and_clipping():
+    identity = np.float32([[1, 0, 0], [0, 1, 0]])
+    assert transform_box((20, 10, 60, 30), identity, (100, 50)) == pytest.approx((0.4, 0.4, 0.4, 0.4))
+    # A 90 degree turn about the center swaps the box's width and height.
+    rotate = cv2.getRotationMatrix2D((50, 50), 90, 1.0)
+    assert transform_box((40, 30, 60, 70), rotate, (100, 100)) == pytest.approx((0.5, 0.5, 0.4, 0.2), abs=1e-4)
+    # Partly outside: clipped to the image; mostly outside: dropped.
+    shift = np.float32([[1, 0, 90], [0, 1, 0]])
+    assert transform_box((0, 0, 20, 20), shift, (100, 100)) == pytest.approx((0.95, 0.1, 0.1, 0.2))
+    assert transform_box((0, 0, 20, 20), np.float32([[1, 0, 97], [0, 1, 0]]), (100, 100)) is None
+
+def test_class_registry_indices_are_shared_through_the_file(tmp_path):
+    yaml_path = str(tmp_path / "data.yaml")
+    first = ClassRegistry(yaml_path)
+    assert first.index("bolt") == 0
+    second = ClassRegistry(yaml_path)
+    # The second tool adds a class; the first picks it up on its next write.
+    assert second.index("nut") == 1
+    assert first.index("washer") == 2
+    assert first.index("nut") == 1
+    data = read_yaml(yaml_path)
+    assert data["names"] == ["bolt", "nut", "washer"]
+    assert data["nc"] == 3
+
+def test_class_registry_keeps_names_when_the_write_fails(tmp_path, monkeypatch):
+    registry = ClassRegistry(str(tmp_path / "data.yaml"))
+    registry.index("bolt")
+
+    def fail(data):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(registry, "_write", fail)
+    with pytest.raises(OSError):
+        registry.index("nut")
+    assert registry.names == ["bolt"]
+    assert not os.path.exists(registry.yaml_path + ".lock")
+
+def test_yaml_lock_times_out_and_breaks_stale_locks(tmp_path):
+    yaml_path = str(tmp_path / "data.yaml")
+    with YamlLock(yaml_path):
+        with pytest.raises(TimeoutError):
+            with YamlLock(yaml_path, timeout=0.1):
+                pass
+    open(yaml_path + ".lock", "w").close()
+    old = time.time() - 60
+    os.utime(yaml_path + ".lock", (old, old))
+    with YamlLock(yaml_path, timeout=0.1, stale_after=30):
+        pass
+    assert not os.path.exists(yaml_path + ".lock")
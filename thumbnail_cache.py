@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import cv2
+import numpy as np
+from yolo_dataset import PROJECT_ROOT
+
+DEFAULT_CACHE_PATH = os.path.join(PROJECT_ROOT, "cache", "thumbnails.db")
+DEFAULT_CACHE_MB = 256
+THUMBNAIL_SIZE = 200
+THUMBNAIL_JPEG_QUALITY = 85
+COMMIT_EVERY = 50
+
+#####################
+# Thumbnail Helpers
+#####################
+
+def fit_thumbnail(img, size=THUMBNAIL_SIZE):
+    """Resize an image to fit inside size x size, keeping its aspect ratio."""
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    if scale >= 1.0:
+        return img
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+def file_key(path):
+    """(absolute path, mtime in ns, size) - changes whenever the file is replaced or edited."""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+#####################
+# SQLite Thumbnail Cache
+#####################
+
+class ThumbnailCache:
+    """Persistent thumbnail store shared by the gallery and the image browser.
+
+    Thumbnails are JPEG blobs in a single SQLite file, keyed by file path,
+    mtime and size plus a `variant` string (e.g. "plain" or the Canny
+    thresholds used to draw an overlay), so an edited image or changed
+    setting simply misses. Each entry may carry a small JSON `meta` dict,
+    and an entry with no image records "nothing to show" for that variant.
+    When the blobs exceed `max_bytes`, the least recently used entries are
+    evicted. All methods are thread-safe, and after close() they do nothing
+    (get() misses), so background loaders still running at shutdown are harmless.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS thumbnails (
+                                path TEXT, mtime_ns INTEGER, size INTEGER, variant TEXT,
+                                image BLOB, meta TEXT, nbytes INTEGER, last_access REAL,
+                                PRIMARY KEY (path, variant))""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS thumbnails_lru ON thumbnails (last_access)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM thumbnails").fetchone()[0]
+        self._uncommitted = 0
+        # Hits only record their access time here; it is written with the next commit.
+        self._accessed = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls, labeling_settings):
+        megabytes = labeling_settings.get("thumbnail_cache_mb", DEFAULT_CACHE_MB)
+        return cls(max_bytes=int(megabytes) * 1024 * 1024)
+
+    def get(self, path, variant="plain"):
+        """Return (found, rgb_thumbnail_or_None, meta) for an up-to-date entry."""
+        try:
+            abs_path, mtime_ns, size = file_key(path)
+        except OSError:
+            return False, None, None
+        with self._lock:
+            if self._db is None:
+                return False, None, None
+            row = self._db.execute("SELECT image, meta FROM thumbnails WHERE path=? AND variant=? "
+                                   "AND mtime_ns=? AND size=?", (abs_path, variant, mtime_ns, size)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None, None
+            self.hits += 1
+            self._accessed[(abs_path, variant)] = time.time()
+            if len(self._accessed) >= COMMIT_EVERY:
+                self._commit()
+        blob, meta = row
+        thumb = None
+        if blob is not None:
+            thumb = cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR)
+            thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB) if thumb is not None else None
+        return True, thumb, json.loads(meta) if meta else None
+
+    def put(self, path, thumb_rgb, variant="plain", meta=None):
+        """Store an RGB thumbnail (or None for "no result") for the file's current version."""
+        try:
+            abs_path, mtime_ns, size = file_key(path)
+        except OSError:
+            return
+        blob = None
+        if thumb_rgb is not None:
+            ok, encoded = cv2.imencode(".jpg", cv2.cvtColor(thumb_rgb, cv2.COLOR_RGB2BGR),
+                                       [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+            if not ok:
+                return
+            blob = encoded.tobytes()
+        nbytes = len(blob) if blob is not None else 0
+        with self._lock:
+            if self._db is None:
+                return
+            old = self._db.execute("SELECT nbytes FROM thumbnails WHERE path=? AND variant=?",
+                                   (abs_path, variant)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (abs_path, mtime_ns, size, variant, blob,
+                              json.dumps(meta) if meta is not None else None, nbytes, time.time()))
+            self._accessed.pop((abs_path, variant), None)
+            self._total_bytes += nbytes - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            # Commit in groups; a commit per thumbnail would dominate a large folder.
+            self._uncommitted += 1
+            if self._uncommitted >= COMMIT_EVERY:
+                self._commit()
+
+    def _flush_access_times(self):
+        if self._accessed:
+            self._db.executemany("UPDATE thumbnails SET last_access=? WHERE path=? AND variant=?",
+                                 [(t, path, variant) for (path, variant), t in self._accessed.items()])
+            self._accessed.clear()
+
+    def _commit(self):
+        self._flush_access_times()
+        self._db.commit()
+        self._uncommitted = 0
+
+    def _evict(self):
+        # Drop least recently used entries down to 90% of the cap so eviction is not run on every put.
+        target = int(self.max_bytes * 0.9)
+        self._flush_access_times()
+        rows = self._db.execute("SELECT path, variant, nbytes FROM thumbnails ORDER BY last_access").fetchall()
+        victims = []
+        for path, variant, nbytes in rows:
+            if self._total_bytes <= target:
+                break
+            victims.append((path, variant))
+            self._total_bytes -= nbytes
+        self._db.executemany("DELETE FROM thumbnails WHERE path=? AND variant=?", victims)
+        self._commit()
+
+    def thumbnail(self, path, size=THUMBNAIL_SIZE):
+        """A plain RGB thumbnail of `path`, from the cache or decoded and cached now."""
+        variant = "plain" if size == THUMBNAIL_SIZE else f"plain:{size}"
+        found, thumb, _ = self.get(path, variant)
+        if found and thumb is not None:
+            return thumb
+        img = cv2.imread(path)
+        if img is None:
+            return None
+        thumb = cv2.cvtColor(fit_thumbnail(img, size), cv2.COLOR_BGR2RGB)
+        self.put(path, thumb, variant)
+        return thumb
+
+    def commit(self):
+        with self._lock:
+            if self._db is not None:
+                self._commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._commit()
+                self._db.close()
+                self._db = None
@@ -344,8 +344,49 @@ def report_endstop_signals():
     else:
         messagebox.showwarning("Not Connected", "Serial connection not available.")
 
+######################################
+# Scripted Motion (Scan Capture)
+######################################
+def open_gantry(port, baud_rate=115200, timeout=1):
+    """Open a dedicated serial connection for scripted moves."""
+    connection = serial.Serial(port, int(baud_rate), timeout=timeout)
+    time.sleep(2)  # The board resets when the port is opened.
+    connection.reset_input_buffer()
+    return connection
+
+def send_and_wait(connection, command, timeout=30.0):
+    """Send one G-code line and block until the firmware acknowledges it with "ok"."""
+    connection.write((command.strip() + '\n').encode())
+    connection.flush()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        line = connection.readline().decode(errors='ignore').strip().lower()
+        if line.startswith("ok"):
+            return
+        if line.startswith("error"):
+            raise RuntimeError(f"{command} failed: {line}")
+    raise TimeoutError(f"No acknowledgement for {command} within {timeout} sec")
+
+def move_to_pose(connection, pose, feed=None, timeout=60.0, axis_sign=None, axis_offset=None):
+    """Move to an absolute X/Y/Z pose and return once motion has finished.
+
+    M400 is only acknowledged after the planner queue is empty, so when this
+    returns the gantry is at rest. Pose coordinates go to G90 as machine
+    coordinates, sign * pose + offset per axis (identity by default; see
+    scan_settings.axis_sign / axis_offset). axis_inversion is not applied:
+    it only flips the jog direction of the manual G91 moves.
+    """
+    axis_sign = axis_sign or {}
+    axis_offset = axis_offset or {}
+    targets = {axis: float(axis_sign.get(axis, 1)) * float(pose[axis]) + float(axis_offset.get(axis, 0))
+               for axis in ("X", "Y", "Z") if pose.get(axis) is not None}
+    axes = " ".join(f"{axis}{value + 0.0:.3f}" for axis, value in targets.items())
+    send_and_wait(connection, f"G1 {axes} F{feed or feed_rate}")
+    send_and_wait(connection, "M400", timeout)
+
 ######################################
 # Main Execution
 ######################################
-TrainingHardwareController_instance = TrainingHardwareController()
-TrainingHardwareController_instance.mainloop()
+if __name__ == "__main__":
+    TrainingHardwareController_instance = TrainingHardwareController()
+    TrainingHardwareController_instance.mainloop()
@@ -6,6 +6,9 @@ from tkinter import messagebox
 from PIL import Image, ImageTk
 import cv2
 import torch
+import time
+import argparse
+from frame_sources import open_configured_source
 
 # --------------------------
 # Utility: Load configuration from JSON
@@ -38,7 +41,7 @@ def load_class_names(data_yaml_path):
 # Model Tester Class
 # --------------------------
 class ModelTester(tk.Toplevel):
-    def __init__(self, master=None):
+    def __init__(self, master=None, source=None):
         super().__init__(master)
         self.title("Live Model Tester")
         self.geometry("1000x800")
@@ -65,7 +68,10 @@ class ModelTester(tk.Toplevel):
 
         self.model = None
         self.cap = None
+        self.source = source
         self.delay = 15  # ms delay between frames
+        self.frames_processed = 0
+        self.start_time = None
         
         self.create_widgets()
         self.load_model()
@@ -102,16 +108,25 @@ class ModelTester(tk.Toplevel):
             messagebox.showerror("Model Load Error", f"Failed to load model: {e}")
 
     def start_video(self):
-        # Open default webcam
-        self.cap = cv2.VideoCapture(0)
+        # Open the configured camera, or a video file, image folder or "synthetic" source
+        self.cap = open_configured_source(self.config_data, self.source)
         if not self.cap.isOpened():
             messagebox.showerror("Video Error", "Unable to access video capture device.")
             return
+        if not isinstance(self.cap, cv2.VideoCapture):
+            # Recorded sources are paced by the source itself (or run flat out).
+            self.delay = 1
+        self.start_time = time.time()
         self.update_frame()
 
     def update_frame(self):
         ret, frame = self.cap.read()
+        if not ret and not self.cap.isOpened():
+            elapsed = time.time() - self.start_time
+            print(f"Source finished: {self.frames_processed} frames in {elapsed:.1f} sec")
+            return
         if ret:
+            self.frames_processed += 1
             # Convert frame from BGR to RGB
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             annotated_frame = rgb_frame.copy()
@@ -146,8 +161,11 @@ class ModelTester(tk.Toplevel):
 # Main: Run Model Tester
 # --------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live Model Tester")
+    parser.add_argument("--source", help="camera index, video file, image folder or 'synthetic[:WxH]'")
+    args = parser.parse_args()
     root = tk.Tk()
     root.withdraw()  # Hide the main window
-    tester = ModelTester(root)
+    tester = ModelTester(root, source=args.source)
     tester.protocol("WM_DELETE_WINDOW", tester.on_close)
     root.mainloop()
@@ -7,6 +7,9 @@ import threading
 from PIL import Image, ImageTk
 import torch
 import json
+import time
+import argparse
+from frame_sources import configured_source_fps, open_frame_source
 
 # Utility: Load maintenance config if available
 def load_config(config_file="maintenance.json"):
@@ -29,7 +32,7 @@ def load_custom_font(font_path):
             print(f"Could not load font: {e}")
 
 class VisionTestingApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, source=None):
         super().__init__()
         self.title("Vision Testing")
         self.configure(bg="#1e1e1e")
@@ -53,6 +56,8 @@ class VisionTestingApp(tk.Tk):
         res_str = self.config_data.get("camera_settings", {}).get("resolution", "640x480")
         self.resolution = tk.StringVar(value=res_str)
         self.model_weights = tk.StringVar(value=self.config_data.get("training_settings", {}).get("model_weights", "yolov5s.pt"))
+        # A video file, image folder or "synthetic" replaces the camera when given.
+        self.source = source if source is not None else self.config_data.get("camera_settings", {}).get("source")
         self.running = False
         self.cap = None
         self.video_thread = None
@@ -119,12 +124,15 @@ class VisionTestingApp(tk.Tk):
         except Exception:
             width, height = 640, 480
 
-        # Open camera capture
-        self.cap = cv2.VideoCapture(self.camera_index.get())
+        # Open camera capture (or the recorded/synthetic source)
+        source = self.source if self.source is not None else self.camera_index.get()
+        camera_settings = self.config_data.get("camera_settings", {})
+        self.cap = open_frame_source(source, fps=configured_source_fps(camera_settings),
+                                     loop=camera_settings.get("source_loop", False))
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         if not self.cap.isOpened():
-            messagebox.showerror("Error", "Unable to open camera.")
+            messagebox.showerror("Error", f"Unable to open frame source: {source}")
             return
 
         self.running = True
@@ -134,10 +142,13 @@ class VisionTestingApp(tk.Tk):
         self.video_thread.start()
 
     def video_loop(self):
+        frames = 0
+        start_time = time.time()
         while self.running and self.cap.isOpened():
             ret, frame = self.cap.read()
             if not ret:
                 continue
+            frames += 1
 
             # Run inference on the frame
             try:
@@ -158,6 +169,12 @@ class VisionTestingApp(tk.Tk):
             self.video_panel.configure(image=imgtk)
 
         self.cap.release()
+        elapsed = time.time() - start_time
+        if frames and elapsed > 0:
+            print(f"Processed {frames} frames in {elapsed:.1f} sec ({frames / elapsed:.1f} fps)")
+        if self.running:
+            # A recorded source ran out of frames.
+            self.after(0, self.stop_test)
 
     def stop_test(self):
         self.running = False
@@ -169,6 +186,9 @@ class VisionTestingApp(tk.Tk):
         self.destroy()
 
 if __name__ == "__main__":
-    app = VisionTestingApp()
+    parser = argparse.ArgumentParser(description="Vision Testing")
+    parser.add_argument("--source", help="camera index, video file, image folder or 'synthetic[:WxH]'")
+    args = parser.parse_args()
+    app = VisionTestingApp(source=args.source)
     app.protocol("WM_DELETE_WINDOW", app.on_closing)
     app.mainloop()
@@ -0,0 +1,225 @@
+import os
+import time
+import tempfile
+import threading
+import yaml
+import numpy as np
+import cv2
+
+# Determine the project root directory (where this script is located)
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_YAML = os.path.join(PROJECT_ROOT, "data.yaml")
+
+# Boxes that keep less than this fraction of their area inside the image are dropped.
+MIN_VISIBLE_FRACTION = 0.25
+
+#####################
+# data.yaml Class Registry
+#####################
+
+def default_data_yaml():
+    # Default data structure with relative paths
+    return {
+        "train": "yolo_training_data/images",
+        "val": "yolo_training_data/images",
+        "nc": 0,
+        "names": []
+    }
+
+class YamlLock:
+    """Cross-process lock on data.yaml, held as an exclusively created `<yaml>.lock` file.
+
+    A lock file older than `stale_after` seconds is assumed to belong to a
+    tool that crashed and is removed.
+    """
+
+    def __init__(self, yaml_path, timeout=10.0, stale_after=30.0):
+        self.path = yaml_path + ".lock"
+        self.timeout = timeout
+        self.stale_after = stale_after
+
+    def __enter__(self):
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    raise TimeoutError(f"Timed out waiting for {self.path}")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class ClassRegistry:
+    """In-memory label -> class index map backed by data.yaml.
+
+    Labels already in data.yaml resolve without touching the disk. A new
+    label takes the lock, re-reads data.yaml (another tool may have added
+    classes meanwhile), appends the label and writes the file through a
+    temporary file and os.replace, so readers never see a partial file and
+    every tool agrees on the indices. data.yaml is append-only here, so an
+    index once handed out stays valid.
+    """
+
+    def __init__(self, yaml_path=DEFAULT_DATA_YAML):
+        self.yaml_path = yaml_path
+        self.names = self._read()["names"]
+        self._indices = {name: i for i, name in enumerate(self.names)}
+        self._lock = threading.Lock()
+
+    def _read(self):
+        data = default_data_yaml()
+        if os.path.exists(self.yaml_path):
+            try:
+                with open(self.yaml_path, "r") as f:
+                    loaded_data = yaml.safe_load(f)
+                    if loaded_data:  # Check if data was actually loaded
+                        data = loaded_data
+            except Exception as e:
+                print(f"Error loading YAML file: {e}")
+        # Ensure names list exists
+        data["names"] = list(data.get("names") or [])
+        return data
+
+    def _write(self, data):
+        folder = os.path.dirname(os.path.abspath(self.yaml_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".data.", suffix=".yaml", dir=folder)
+        try:
+            with os.fdopen(fd, "w") as f:
+                yaml.dump(data, f, default_flow_style=False)
+            os.replace(tmp_path, self.yaml_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def index(self, label):
+        """Return the class index of `label`, adding it to data.yaml if it is new."""
+        index = self._indices.get(label)
+        if index is not None:
+            return index
+        with self._lock:
+            if label not in self._indices:
+                self.add([label])
+            return self._indices[label]
+
+    def add(self, labels):
+        """Append any of `labels` missing from data.yaml in one locked read-merge-write.
+
+        If data.yaml cannot be written the error propagates and the known
+        names are left as they were, so no index is handed out that is not on disk.
+        """
+        with YamlLock(self.yaml_path):
+            data = self._read()
+            added = [label for label in dict.fromkeys(labels) if label not in data["names"]]
+            if added:
+                data["names"].extend(added)
+                # Update number of classes
+                data["nc"] = len(data["names"])
+                self._write(data)
+                print(f"Updated YAML file with labels: {', '.join(added)}")
+        self.names = data["names"]
+        self._indices = {name: i for i, name in enumerate(self.names)}
+
+    def add_training_folder(self, folder):
+        """Add `folder` to the train and val image folders of data.yaml, if it is not there yet.
+
+        The folder is stored relative to data.yaml when it lies below it,
+        as the default "yolo_training_data/images" entry is. Labels are
+        expected next to the images, which is where YOLO looks when the
+        path has no "images" component.
+        """
+        yaml_dir = os.path.dirname(os.path.abspath(self.yaml_path))
+        folder = os.path.abspath(folder)
+        if os.path.commonpath([yaml_dir, folder]) == yaml_dir:
+            folder = os.path.relpath(folder, yaml_dir)
+        folder = folder.replace(os.sep, "/")
+        with YamlLock(self.yaml_path):
+            data = self._read()
+            changed = False
+            for split in ("train", "val"):
+                entries = data.get(split) or []
+                entries = [entries] if isinstance(entries, str) else list(entries)
+                if folder not in entries:
+                    entries.append(folder)
+                    data[split] = entries
+                    changed = True
+            if changed:
+                self._write(data)
+                print(f"Added {folder} to the train and val folders in {self.yaml_path}")
+        self.names = data["names"]
+        self._indices = {name: i for i, name in enumerate(self.names)}
+
+_registries = {}
+
+def class_registry(yaml_path=DEFAULT_DATA_YAML):
+    """The session-wide ClassRegistry for a data.yaml, loaded on first use."""
+    key = os.path.abspath(yaml_path)
+    if key not in _registries:
+        _registries[key] = ClassRegistry(yaml_path)
+    return _registries[key]
+
+def update_yaml_file(new_label, yaml_path="data.yaml"):
+    """Update YAML file with new label and return label index.
+    Creates the file if it doesn't exist.
+    """
+    return class_registry(yaml_path).index(new_label)
+
+def register_training_folder(folder, yaml_path="data.yaml"):
+    """Make the images (and side-by-side labels) in `folder` part of the dataset."""
+    class_registry(yaml_path).add_training_folder(folder)
+
+#####################
+# YOLO Label Helpers
+#####################
+
+def format_yolo_rows(rows):
+    """Format (class_idx, x_center, y_center, w, h) rows as YOLO label text."""
+    return "".join(f"{int(c)} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}\n" for c, xc, yc, w, h in rows)
+
+def write_yolo_label(path, rows):
+    with open(path, "w") as f:
+        f.write(format_yolo_rows(rows))
+
+def box_label_rows(box, size, class_idx):
+    """YOLO label rows for a pixel box (x1, y1, x2, y2) in an image of `size`, untransformed."""
+    w, h = size
+    x1, y1, x2, y2 = box
+    return [(class_idx, (x1 + x2) / 2 / w, (y1 + y2) / 2 / h, (x2 - x1) / w, (y2 - y1) / h)]
+
+def transform_box(box, M, size):
+    """Carry an axis-aligned box (x1, y1, x2, y2) through a 2x3 affine matrix.
+
+    The four corners are transformed as a polygon and clipped against the
+    output image, so rotation and shear give the tight enclosing box of
+    what is actually visible. Returns normalized YOLO (x_center, y_center,
+    w, h), or None if too little of the box is left inside the image.
+    """
+    w, h = size
+    x1, y1, x2, y2 = box
+    corners = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32)
+    polygon = cv2.transform(corners[None], np.asarray(M, dtype=np.float32))[0]
+    full_area = abs(cv2.contourArea(polygon))
+    if full_area <= 0:
+        return None
+    image_rect = np.array([[0, 0], [w, 0], [w, h], [0, h]], dtype=np.float32)
+    visible_area, visible = cv2.intersectConvexConvex(polygon, image_rect)
+    if visible is None or visible_area < MIN_VISIBLE_FRACTION * full_area:
+        return None
+    points = visible.reshape(-1, 2)
+    vx1, vy1 = points.min(axis=0)
+    vx2, vy2 = points.max(axis=0)
+    return ((vx1 + vx2) / 2 / w, (vy1 + vy2) / 2 / h, (vx2 - vx1) / w, (vy2 - vy1) / h)